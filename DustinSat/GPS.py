@@ -5,12 +5,39 @@ Created on Thu Apr 23 11:34:15 2020
 """
 import serial
 from tuppersat.sensor import SensorBase
+from nmea import NMEAParser
+from samples import gps_epoch
+from ubx import UBXParser
+import ubx
+import time
 import logging
 LOG = logging.getLogger(__name__)
+"""
+Seconds between attempts to open the serial port if it isn't there (e.g. the dongle is still enumerating)
+"""
+REOPEN_INTERVAL = 2.0
+"""
+Seconds a read of the serial port waits for data before giving up, the receiver sends at least once a second
+"""
+SERIAL_TIMEOUT = 2.0
 
 class GPS(SensorBase):
-    def __init__(self, path):
+    def __init__(self, path, protocol='nmea', rate_hz=1, messages='pvt', anchor=None):
+        """
+        protocol is 'nmea' (the default ASCII output) or 'ubx', in which case the receiver 
+        is switched to binary NAV-PVT (or NAV-POSLLH + NAV-SOL) output at rate_hz.
+        If a TimeAnchor is given it is corrected from the GPS time.
+        """
+        if protocol not in ('nmea', 'ubx'):
+            raise ValueError("protocol must be 'nmea' or 'ubx'")
         self.path=path
+        self.protocol=protocol
+        self.rate_hz=rate_hz
+        self.messages=messages
+        self.anchor=anchor
+        self.ser=None
+        self._nextOpen=0.0
+        self._lastTime=None
         """
         Variables that are required are redefined as None
         """
@@ -18,100 +45,141 @@ class GPS(SensorBase):
         self.lon=None
         self.hzdil=None
         self.alt=None
+        """
+        The parser keeps the full fix in self.parser.fix
+        """
+        self.parser=UBXParser() if protocol=='ubx' else NMEAParser()
         super().__init__()
         
     def setup(self):
         """
-        The setup function open the serial port for the U-Blox7 GPS dongle
+        The setup function open the serial port for the U-Blox7 GPS dongle. If it isn't
+        there yet, read() keeps trying every REOPEN_INTERVAL seconds.
+        """
+        self.open_port()
+
+    def open_port(self):
+        """
+        Opens the serial port (and configures UBX output), returns False if it couldn't
         """
+        self._nextOpen = time.monotonic() + REOPEN_INTERVAL
         try:
-            self.ser = serial.Serial(self.path)
+            self.ser = serial.Serial(self.path, timeout=SERIAL_TIMEOUT)
         except Exception:
             logging.exception("Serial Error")
+            self.ser = None
+            return False
+        LOG.info("GPS serial port %s open", self.path)
+        if self.protocol=='ubx':
+            try:
+                self.send_ubx(ubx.configure(self.rate_hz, self.messages))
+            except Exception:
+                logging.exception("UBX Configuration Error")
+        return True
+
+    def send_ubx(self, messages):
+        """
+        Writes a list of UBX messages to the receiver
+        """
+        for msg in messages:
+            self.ser.write(msg)
+        self.ser.flush()
                 
-    def convert(self, LatLon):
+    def set_rate(self, rate_hz):
         """
-        Converts dd:mm:ss.sss to dd.ddddd
+        Changes the navigation rate while running. Only the UBX mode has a rate to change,
+        NMEA output stays at 1Hz.
         """
-        degrees=int(LatLon)//100.00
-        minutes=LatLon-100*degrees
-        decdegrees=degrees+minutes/60
-        return decdegrees
-        
-    def parseGGA(self, sentence):
-        """ The GGA string is split into the various variables
-         and the necessary ones are then processed and returned"""
-        nmeaID, time, lat, latd, lon,lond, gpsQual, satNum, hzdil, alt, altu, geosep,geosepu, agegps, refstat=sentence.split(',')
+        if self.protocol!='ubx' or rate_hz==self.rate_hz:
+            return
+        self.rate_hz=rate_hz
+        if self.ser is None:
+            return
         try:
-            if lat=="":
-                lat=self.lat
-            else:
-                """
-                latitude data is converted to float and sent to the convert()
-                """
-                if latd=="N":
-                    self.lat=self.convert(float(lat))
-                else:
-                    """
-                    If the latitude is 'S', the latitude will be prefixed with '-'
-                    """
-                    self.lat=self.convert(float(lat))*-1
-            if lon=="":
-                lon=self.lon
-            else:
-                """
-                longitude data is converted to float and sent to the convert()
-                """
-                if lond=="E":
-                    self.lon=self.convert(float(lon))
-                else:
-                    """
-                    If the latitude is 'W', the latitude will be prefixed with '-'
-                    """
-                    self.lon=self.convert(float(lon))*-1
-            
-            if hzdil=="":
-                """
-                If there is no data available, it falls back to the preset value from __init__(), 
-                or to the last known value. This occurs for all four variables.
-                """
-                hzdil=self.hzdil
-            else:
-                self.hzdil=float(hzdil)
-            
-            if alt=="":
-                self.alt=self.alt
-            else:
-                self.alt=float(alt)
-                       
+            self.send_ubx([ubx.cfg_rate(rate_hz)])
         except Exception:
-            logging.exception("Exception at parseGGA()")
-            pass
-    
+            logging.exception("UBX Rate Error")
+
     def readGPS(self):
         """
-        Reads the lines of data from the GPS module, 
-        and sends any containing GGA to the parseGGA() method
+        Reads everything that is waiting on the serial port (blocking for the first byte) 
+        and feeds it to the NMEA/UBX parser until that completes a new fix. The port is 
+        drained every time so the fix is always the newest one and we never fall behind 
+        the receiver. Returns False if there was no new fix within SERIAL_TIMEOUT, whether
+        the receiver has gone quiet or is still sending without a fix.
+        """
+        deadline = time.monotonic() + SERIAL_TIMEOUT
+        while True:
+            data = self.ser.read(max(1, self.ser.in_waiting))
+            if not data:
+                return False
+            received = time.monotonic()
+            waiting = self.ser.in_waiting
+            if waiting:
+                data += self.ser.read(waiting)
+            if self.feed(data, received):
+                return True
+            if received > deadline:
+                return False
+
+    def feed(self, data, received):
+        """
+        Passes bytes read from the receiver (the first of them at monotonic time received) to
+        the parser, returns True if they completed a new fix
         """
-        lines=self.ser.readline().decode()
-        if 'GGA' in lines:
-            self.parseGGA(lines)
+        if self.parser.feed(data):
+            fix = self.parser.fix
+            self.lat = fix.lat
+            self.lon = fix.lon
+            self.hzdil = fix.hzdil
+            self.alt = fix.alt
+            if self.anchor is not None and fix.time != self._lastTime:
+                self._lastTime = fix.time
+                utc = gps_epoch(fix.date, fix.time)
+                if utc is not None:
+                    self.anchor.from_gps(utc, received)
+            return True
+        return False
                              
         
     def read(self):
         """
         This is the loop function. It continually calls for data from the readGPS() 
-        method and return the relevant data
+        method and return the relevant data, or None if there was no new fix
         """
-        self.readGPS()
+        if self.ser is None:
+            delay = self._nextOpen - time.monotonic()
+            if delay > 0:
+                time.sleep(min(delay, REOPEN_INTERVAL))
+                return None
+            if not self.open_port():
+                return None
+        if not self.readGPS():
+            return None
         return (self.lat,self.lon,self.hzdil,self.alt)
         
                 
     def teardown(self):
         """
-        The teardown function closes the serial port 
+        The teardown function closes the serial port. In UBX mode NMEA output is turned back on first.
         """
+        if self.ser is None:
+            return
+        try:
+            if self.protocol=='ubx':
+                self.send_ubx(ubx.restore_nmea())
+        except Exception:
+            logging.exception("UBX Restore Error")
         try:
             self.ser.close()
         except Exception:
-            logging.exception("Serial Disconnection Error")
\ No newline at end of file
+            logging.exception("Serial Disconnection Error")
+        self.ser = None
+
+    def interrupt(self):
+        """
+        Makes a read that is stuck waiting on the serial port return (called from another thread)
+        """
+        ser = self.ser
+        if ser is not None and hasattr(ser, 'cancel_read'):
+            ser.cancel_read()
\ No newline at end of file
@@ -10,68 +10,267 @@ Created on Tue Feb 28 2020 12:26:54
 This is an initial code to extract the pressure and temperature data.
 
 """
-import smbus 
+import struct
+import threading
 import time 
+from collections import namedtuple
 from tuppersat.sensor import SensorBase
+from i2cbus import get_bus
 import logging
 LOG = logging.getLogger(__name__)
       
+"""
+The MS5611 factory PROM: word 0 is factory data, C1-C6 are the calibration 
+coefficients and the low 4 bits of the last word hold the CRC.
+"""
+PROM = namedtuple('PROM', 'factory C1 C2 C3 C4 C5 C6 crc')
+PROM_READ_ATTEMPTS = 3
+_PROM_CACHE = struct.Struct('>B8H')
+
+"""
+Conversion commands. The oversampling ratio is added to the command and sets 
+how long the conversion takes (max conversion times from the datasheet, in seconds)
+"""
+CMD_ADC_READ = 0x00
+CONVERT_D1 = 0x40
+CONVERT_D2 = 0x50
+OSR = {256: (0x00, 0.00060),
+       512: (0x02, 0.00117),
+       1024: (0x04, 0.00228),
+       2048: (0x06, 0.00454),
+       4096: (0x08, 0.00904)}
+
+def prom_crc4(prom):
+    """
+    CRC4 of the PROM as described in the MS5611 application note AN520
+    """
+    words = list(prom)
+    words[7] &= 0xFF00
+    rem = 0
+    for cnt in range(16):
+        if cnt % 2:
+            rem ^= words[cnt >> 1] & 0x00FF
+        else:
+            rem ^= words[cnt >> 1] >> 8
+        for _ in range(8):
+            if rem & 0x8000:
+                rem = ((rem << 1) ^ 0x3000) & 0xFFFF
+            else:
+                rem = (rem << 1) & 0xFFFF
+    return (rem >> 12) & 0x0F
+
+def load_prom_cache(path, addr):
+    """
+    Returns the cached PROM for this address, or None if the cache is missing, 
+    for another address or fails its CRC
+    """
+    try:
+        with open(path, 'rb') as file:
+            cached = _PROM_CACHE.unpack(file.read(_PROM_CACHE.size))
+    except (OSError, struct.error):
+        return None
+    if cached[0] != addr:
+        return None
+    prom = PROM(*cached[1:])
+    if prom_crc4(prom) != prom.crc & 0x0F:
+        return None
+    return prom
+
+def save_prom_cache(path, addr, prom):
+    try:
+        with open(path, 'wb') as file:
+            file.write(_PROM_CACHE.pack(addr, *prom))
+    except OSError:
+        logging.exception("Could not write PROM cache")
+
 class PressureSensor(SensorBase):
     """
     This class is designed to extract the raw pressure/temperature & coefficient data and calculate 
     the actual pressure and temperature using from them. 
     """
-    def __init__(self, addr):
+    def __init__(self, addr, prom_cache=None, osr=4096, temp_osr=None, temp_every=10, busnum=1):
+        if osr not in OSR or (temp_osr is not None and temp_osr not in OSR):
+            raise ValueError("Oversampling ratio must be one of {}".format(sorted(OSR)))
+        self._busnum = busnum
         self._bus = None
         self._addr =addr
+        self._prom_cache = prom_cache
+        self.prom = None
+        """
+        Oversampling ratio for pressure and temperature, and how many pressure 
+        readings are taken per temperature reading
+        """
+        self.osr = osr
+        self.temp_osr = osr if temp_osr is None else temp_osr
+        self.temp_every = max(1, temp_every)
+        self.tempadc = None
+        self.presadc = None
+        self._pending = None
+        self._ready_at = 0.0
+        self._since_temp = 0
+        """
+        Minimum time between readings, None reads back to back. set_period() changes it while running.
+        """
+        self.period = None
+        self._nextRead = 0.0
+        self._wake = threading.Event()
+        self._stopping = False
         super().__init__(log=LOG)  
         
     def setup(self):
-        self._bus=smbus.SMBus(1)
+        """
+        The I2C bus is shared with the UV sensor, so it comes from the bus manager
+        """
+        self._bus=get_bus(self._busnum).open()
+        try:
+            self.load_prom()
+        except Exception:
+            logging.exception("Pressure Sensor PROM Error")
+    
+    def read_prom(self):
+        """
+        Reads the 8 PROM words (0xA0-0xAE) from the sensor. Only 2 bytes are read per word.
+        """
+        words = []
+        with self._bus.transaction(self._addr) as bus:
+            for reg in range(0xA0, 0xB0, 2):
+                wordbytes = bus.read_i2c_block_data(self._addr, reg, 2)
+                words.append((wordbytes[0] << 8) + wordbytes[1])
+        return PROM(*words)
+    
+    def load_prom(self):
+        """
+        Loads the calibration PROM, from the cache file if there is a valid one, 
+        otherwise from the sensor itself. The PROM never changes so this only happens once.
+        """
+        if self._prom_cache is not None:
+            prom = load_prom_cache(self._prom_cache, self._addr)
+            if prom is not None:
+                self.prom = prom
+                LOG.info("MS5611 PROM loaded from %s", self._prom_cache)
+                return prom
+        for attempt in range(PROM_READ_ATTEMPTS):
+            prom = self.read_prom()
+            if prom_crc4(prom) == prom.crc & 0x0F:
+                break
+            LOG.warning("MS5611 PROM CRC mismatch (attempt %d)", attempt + 1)
+        else:
+            raise ValueError("MS5611 PROM failed CRC check")
+        self.prom = prom
+        if self._prom_cache is not None:
+            save_prom_cache(self._prom_cache, self._addr, prom)
+        return prom
     
     def calibration_constants(self):
         """
-        This method extracts the calibration constants used to calcuate the temperature and pressure
+        Returns the calibration constants used to calcuate the temperature and pressure
         """
-        C1bytes = self._bus.read_i2c_block_data(self._addr, 0xA2) 
-        C_1 = (C1bytes[0] << 8) + C1bytes[1] 
-
-        C2bytes = self._bus.read_i2c_block_data(self._addr, 0xA4) 
-        C_2 = (C2bytes[0] << 8) + C2bytes[1]
-
-        C3bytes = self._bus.read_i2c_block_data(self._addr, 0xA6) 
-        C_3 = (C3bytes[0] << 8) + C3bytes[1]
+        prom = self.prom
+        if prom is None:
+            prom = self.load_prom()
+        return prom.C1, prom.C2, prom.C3, prom.C4, prom.C5, prom.C6
+     
 
-        C4bytes = self._bus.read_i2c_block_data(self._addr, 0xA8) 
-        C_4 = (C4bytes[0] << 8) + C4bytes[1]
+    def conversion_time(self, kind):
+        """
+        Seconds the ADC needs for a conversion at the chosen oversampling ratio
+        """
+        osr = self.osr if kind == CONVERT_D1 else self.temp_osr
+        return OSR[osr][1]
+    
+    def start_conversion(self, kind):
+        """
+        Sends a D1 (pressure) or D2 (temperature) conversion command and notes when it will be ready
+        """
+        osr = self.osr if kind == CONVERT_D1 else self.temp_osr
+        self._bus.write_byte(self._addr, kind + OSR[osr][0])
+        self._pending = kind
+        self._ready_at = time.perf_counter() + OSR[osr][1]
+    
+    def read_adc(self):
+        """
+        Reads the 24 bit result of the last conversion
+        """
+        adcbytes = self._bus.read_i2c_block_data(self._addr, CMD_ADC_READ, 3)
+        return (adcbytes[0] << 16) + (adcbytes[1] << 8) + adcbytes[2]
+    
+    def ready_in(self):
+        """
+        Seconds until the pending conversion is finished, 0 if there isn't one
+        """
+        if self._pending is None:
+            return 0.0
+        return max(0.0, self._ready_at - time.perf_counter())
 
-        C5bytes = self._bus.read_i2c_block_data(self._addr, 0xAA) 
-        C_5 = (C5bytes[0] << 8) + C5bytes[1]
+    def drop_conversion(self):
+        """
+        Forgets the pending conversion, e.g. when it has been waiting too long to be current
+        """
+        self._pending = None
 
-        C6bytes = self._bus.read_i2c_block_data(self._addr, 0xAC) 
-        C_6 = (C6bytes[0] << 8) + C6bytes[1]
-        return C_1, C_2, C_3, C_4, C_5, C_6
-     
+    def step(self):
+        """
+        Advances the conversion state machine without blocking. If the pending conversion
+        is finished it is read out and the next one is started straight away, so the ADC is 
+        converting while the maths is done. Temperature is only converted every temp_every 
+        pressure readings. Returns (pressure, temperature) when a new pressure reading is 
+        ready, otherwise None.
+        """
+        newpressure = False
+        if self._pending is not None:
+            if time.perf_counter() < self._ready_at:
+                return None
+            raw = self.read_adc()
+            kind, self._pending = self._pending, None
+            if raw == 0:
+                """
+                The ADC reads 0 if the conversion was interrupted, so it is just dropped
+                """
+                LOG.warning("MS5611 conversion returned 0, discarding")
+            elif kind == CONVERT_D2:
+                self.tempadc = raw
+                self._since_temp = 0
+            else:
+                self.presadc = raw
+                self._since_temp += 1
+                newpressure = True
+        if self.tempadc is None or self._since_temp >= self.temp_every:
+            self.start_conversion(CONVERT_D2)
+        else:
+            self.start_conversion(CONVERT_D1)
+        if newpressure:
+            return self.compensate()
+        return None
+    
+    def compensate(self):
+        """
+        Turns the latest raw pressure and temperature values into mbar and degrees celsius
+        """
+        C_1, C_2, C_3, C_4, C_5, C_6=self.calibration_constants()
+        dT = self.tempadc-(C_5*(2**8))
+        temperature=(2000+(dT*(C_6/(2**23))))/100
+        OFF = ((C_2 * (2**16)) + ((C_4 * dT)/2**7))
+        SENS = (C_1 * (2**15)) + ((C_3 * dT)/(2**8))
+        pressure=(((self.presadc*(SENS/(2**21)))-OFF)/(2**15))/100
+        return pressure, temperature
 
     def digital_temp_data(self):  # This function will give the initial digital format for temperature data
         """
-        Extracts the digital temperature value as bytes
+        Extracts the digital temperature value as bytes (blocking)
         """        
-        self._bus.write_byte(self._addr, 0x58) 
-        time.sleep(0.05) 
-        tempadcbytes = self._bus.read_i2c_block_data(self._addr, 0x00) 
-        time.sleep(0.05) 
-        self.tempadc=tempadcbytes[0]*65536.0+tempadcbytes[1]*256.0+tempadcbytes[2] 
+        self.start_conversion(CONVERT_D2)
+        time.sleep(self.conversion_time(CONVERT_D2)) 
+        self._pending = None
+        self.tempadc=self.read_adc()
 
     def digital_pressure_data(self): # This function will give the initial digital format for pressure data
         """
-        Extracts the digital pressure value as bytes
+        Extracts the digital pressure value as bytes (blocking)
         """
-        self._bus.write_byte(self._addr,0x48) 
-        time.sleep(0.05) 
-        presadcbytes=self._bus.read_i2c_block_data(self._addr,0x00) 
-        time.sleep(0.05) 
-        self.presadc=(presadcbytes[0]<<16)+(presadcbytes[1]<<8)+presadcbytes[2]
+        self.start_conversion(CONVERT_D1)
+        time.sleep(self.conversion_time(CONVERT_D1)) 
+        self._pending = None
+        self.presadc=self.read_adc()
 
     def get_temperature(self): # This function implements the equations needed to convert the digital data to degrees celsius
         """
@@ -86,25 +285,64 @@ class PressureSensor(SensorBase):
         
     def get_pressure(self): # This function implements the equations needed to convert the digital data into mbars    
         """
-        calulates and returns the actual pressure 
-        using the pressure and calibration constants from above
+        Blocking one-off reading of pressure and temperature
         """
         self.digital_pressure_data()
-        C_1, C_2, C_3, C_4, C_5, C_6=self.calibration_constants()
-        temperature, dT=self.get_temperature()
-        OFF = ((C_2 * (2**16)) + ((C_4 * dT)/2**7))
-        SENS = (C_1 * (2**15)) + ((C_3 * dT)/(2**8))
-        pressure=(((self.presadc*(SENS/(2**21)))-OFF)/(2**15))/100
-        return pressure, temperature     
+        self.digital_temp_data()
+        return self.compensate()
     
     def read(self):
         """
-        The loop function, which calls the get pressure method and returns temperature and pressure
+        The loop function. It steps the conversion state machine, sleeping only until the 
+        pending conversion is due, and returns pressure and temperature
         """
+        period = self.period
+        if period is not None:
+            delay = self._nextRead - time.perf_counter()
+            if delay > 0:
+                if self._wake.wait(delay):
+                    self._wake.clear()
+                    if self._stopping:
+                        return None
+                """
+                The conversion started after the last reading is too old by now, start a fresh one
+                """
+                self.drop_conversion()
+            self._nextRead = max(self._nextRead + period, time.perf_counter())
         try:
-            pressure, temperature=self.get_pressure()
-            return pressure,temperature
+            while True:
+                result = self.step()
+                if result is not None:
+                    return result
+                delay = self.ready_in()
+                if delay > 0:
+                    time.sleep(delay)
         except Exception:
+            self._pending = None
             logging.exception("Pressure Sensor Error")
-            
-    
\ No newline at end of file
+
+    def set_period(self, period):
+        """
+        Changes the minimum time between readings (None for back to back), 
+        taking effect straight away even if the sensor thread is waiting
+        """
+        self.period = period
+        self._nextRead = time.perf_counter()
+        self._wake.set()
+
+    def stop(self):
+        """
+        Wakes the sensor thread so stopping doesn't wait for the next reading
+        """
+        self._stopping = True
+        self._wake.set()
+        super().stop()
+
+    def teardown(self):
+        """
+        Lets go of the shared I2C bus
+        """
+        self._pending = None
+        if self._bus is not None:
+            self._bus.close()
+            self._bus = None
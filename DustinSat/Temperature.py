@@ -12,27 +12,69 @@ class TemperatureSensor(SensorBase):
     """
     This class takes in a port address and outputs the temperature in celcius
     """
-    def __init__(self,path):
+    def __init__(self,path,bus=None):
         """
-        The path and temperature is defined 
+        The path and temperature is defined. If a OneWireBus is given the sensors 
+        on it share one bulk conversion instead of converting one after the other.
         """
         self.path=path
+        self.bus=bus
         self.temperature=None
+        self.crc_errors=0
+        self._generation=0
+        self._stopping=False
         super().__init__(log=LOG)        
         
+    def setup(self):
+        self._stopping=False
+        if self.bus is not None:
+            self.bus.setup()
+
     def read_temperature(self):
-        """Read temperature from 1-wire file as a float in celsius."""
+        """
+        Read temperature from 1-wire file as a float in celsius. 
+        The reading is only used if the CRC check on the first line says YES, 
+        otherwise (or if the sensor is stopping) there is no reading and None is returned.
+        """
+        if self.bus is not None:
+            generation=self.bus.wait_for_conversion(self._generation, stopping=lambda: self._stopping)
+            if generation is None:
+                return None
+            self._generation=generation
         with open(self.path, 'r') as file:
             lines = file.readlines()            
-            line=lines[1].find('t=')
-            t_string=lines[1][line+2:]
-            self.temperature=(float(t_string)/(1000.0)) 
+        if len(lines) < 2 or not lines[0].strip().endswith('YES'):
+            self.crc_errors+=1
+            LOG.warning("CRC error reading %s", self.path)
+            self.temperature=None
+            return None
+        line=lines[1].find('t=')
+        t_string=lines[1][line+2:]
+        self.temperature=(float(t_string)/(1000.0)) 
+        return self.temperature
+
+    def ready_in(self):
+        """
+        Seconds the next read_temperature() would spend waiting for the 1-wire period or
+        another sensor's conversion, 0 if it wouldn't
+        """
+        if self.bus is None:
+            return 0
+        return self.bus.wait_time(self._generation)
 
     def read(self):
         """
         The loop function, which repeatedly reads data from the 
         read_temperature() and returns the temperature to __main__.py
         """
-        self.read_temperature()        
-        return (self.temperature)
+        return self.read_temperature()
+
+    def stop(self):
+        """
+        Wakes the sensor thread so stopping doesn't wait for the 1-wire period
+        """
+        self._stopping=True
+        if self.bus is not None:
+            self.bus.wake()
+        super().stop()
 
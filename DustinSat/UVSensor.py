@@ -1,21 +1,47 @@
-from time import sleep
-from smbus import SMBus
+import threading
+import time
+from collections import namedtuple
 from tuppersat.sensor import SensorBase
+from i2cbus import get_bus
 import logging
 LOG = logging.getLogger(__name__)
             
+"""
+Integration time (ms) to UV_IT config bits (VEML6075 datasheet)
+"""
+INTEG_TIMES = {50: 0x00, 100: 0x10, 200: 0x20, 400: 0x30, 800: 0x40}
+"""
+A reading carries the integration time it was taken with and when it was read (time.time())
+"""
+UVReading = namedtuple('UVReading', 'uva uvb integration_ms timestamp')
+
 class UVSensor(SensorBase):
-    
-    def __init__(self, address):
+    """
+    VEML6075 UV sensor. By default it is left powered in continuous mode and read
+    once per integration period. With active_force=True each reading is triggered
+    individually (UV_AF mode) instead.
+    """
+    def __init__(self, address, busnum=1, integration_ms=800, active_force=False):
+        if integration_ms not in INTEG_TIMES:
+            raise ValueError("Integration time must be one of {} ms".format(sorted(INTEG_TIMES)))
         self.address = address
+        self.busnum = busnum
+        self.bus = None
+        self.integration_ms = integration_ms
+        self.active_force = active_force
         self.integTimeSelect = 0x00
         self.dynamicSelect = 0x00
         self.waitTime = 0.0
         self.divisor = 0
+        self._wake = threading.Event()
+        self._stopping = False
+        self._reconfigure = False
+        self._nextReady = 0.0
+        self.last = None
         super().__init__(log=LOG)
         
     def setup(self):
-        self.bus = SMBus(1)
+        self.bus = get_bus(self.busnum).open()  # shared with the pressure sensor
         self.regUVConf = 0x00
         self.regUVA = 0x07
         self.regUVB = 0x09
@@ -24,10 +50,10 @@ class UVSensor(SensorBase):
      
         self.powerOn = 0x00
         self.powerOff = 0x01
+        self.activeForce = 0x02
+        self.trigger = 0x04
      
         self.highDynamic = 0x08
-        
-        self.integTime800 = 0x40
         """
         Calibration constants from Calibration report provided to us from Robert.
         
@@ -45,25 +71,88 @@ class UVSensor(SensorBase):
         self.UVACountsPeruWcm = 0.93
         self.UVBCountsPeruWcm = 2.10
         
-        self.integTimeSelect = self.integTime800  
-        
         self.dynamicSelect = self.highDynamic
-        self.waitTime = 1.920
-        self.divisor = 16
+        self._stopping = False
+        self.configure()
+
+    def configure(self):
+        """
+        Writes the integration time and mode to the sensor and powers it on. The counts
+        are scaled back to the 50ms integration time, hence the divisor (16 at 800ms).
+        """
+        self._reconfigure = False
+        self.integTimeSelect = INTEG_TIMES[self.integration_ms]
+        self.waitTime = self.integration_ms / 1000.0
+        self.divisor = self.integration_ms // 50
+        mode = self.activeForce if self.active_force else 0x00
+        self.bus.write_byte_data(self.address, self.regUVConf, self.integTimeSelect|self.dynamicSelect|mode|self.powerOn)
+        """
+        The first conversion after a change is discarded, so wait two periods
+        """
+        self._nextReady = time.monotonic() + 2 * self.waitTime * 1.05
+
+    def set_integration_time(self, integration_ms):
+        """
+        Changes the integration time while running. It is applied by the sensor thread on its next read.
+        """
+        if integration_ms not in INTEG_TIMES:
+            raise ValueError("Integration time must be one of {} ms".format(sorted(INTEG_TIMES)))
+        if integration_ms != self.integration_ms:
+            self.integration_ms = integration_ms
+            self._reconfigure = True
+            self._wake.set()
+
+    def _wait_until(self, deadline):
+        """
+        Sleeps until the deadline, returns False if woken early (stop or reconfigure)
+        """
+        if self._stopping:
+            return False
+        delay = deadline - time.monotonic()
+        if delay > 0 and self._wake.wait(delay):
+            self._wake.clear()
+            return False
+        return True
         
     def readUV(self):
         """
         This method calculates the UVA and UVB levels detectoed by the sensors, 
         using calibration constants and other data from the setup(). 
+        If the integration time is changed while waiting a new integration is started,
+        if the sensor is stopped there is no reading and None is returned.
         """
-        self.bus.write_byte_data(self.address, self.regUVConf, self.integTimeSelect|self.dynamicSelect|self.powerOn)  # Write Dynamic and Integration Time Settings to Sensor
-        sleep(self.waitTime)  # Wait for ADC to finish first and second conversions, discarding the first
-        self.bus.write_byte_data(self.address, self.regUVConf, self.powerOff)  # Power OFF
+        while not self._wait_until(self.prepare()):
+            if self._stopping:
+                return None
+        return self.measure()
         
-        rawDataUVA = self.bus.read_word_data(self.address,self.regUVA)
-        rawDataUVB = self.bus.read_word_data(self.address,self.regUVB)
-        rawDataUVComp1 = self.bus.read_word_data(self.address,self.regUVComp1)  # visible noise
-        rawDataUVComp2 = self.bus.read_word_data(self.address,self.regUVComp2)  # infrared noise
+    def prepare(self):
+        """
+        Applies a new integration time and in active force mode triggers a measurement.
+        Returns the monotonic time the next reading is ready.
+        """
+        if self._reconfigure:
+            self.configure()
+        if self.active_force:
+            self.bus.write_byte_data(self.address, self.regUVConf,
+                                     self.integTimeSelect|self.dynamicSelect|self.activeForce|self.trigger|self.powerOn)  # trigger one measurement
+            self._nextReady = time.monotonic() + self.waitTime * 1.05
+        return self._nextReady
+
+    def measure(self):
+        """
+        Reads the four registers and works out the UV levels, once prepare() says the reading is ready
+        """
+        with self.bus.transaction(self.address) as bus:  # all four registers in one go
+            rawDataUVA = bus.read_word_data(self.address,self.regUVA)
+            rawDataUVB = bus.read_word_data(self.address,self.regUVB)
+            rawDataUVComp1 = bus.read_word_data(self.address,self.regUVComp1)  # visible noise
+            rawDataUVComp2 = bus.read_word_data(self.address,self.regUVComp2)  # infrared noise
+        timestamp = time.time()
+        """
+        Stay in step with the integration period, unless we've fallen behind
+        """
+        self._nextReady = max(self._nextReady + self.waitTime, time.monotonic())
         
         scaledDataUVA = rawDataUVA / self.divisor
         scaledDataUVB = rawDataUVB / self.divisor
@@ -85,7 +174,25 @@ class UVSensor(SensorBase):
         UVAuWcm = compensatedUVA/ self.UVACountsPeruWcm  
         UVBuWcm = compensatedUVB / self.UVBCountsPeruWcm        
     
-        return UVAuWcm,UVBuWcm
+        self.last = UVReading(UVAuWcm, UVBuWcm, self.integration_ms, timestamp)
+        return self.last
         
     def read(self):
         return(self.readUV())
+
+    def stop(self):
+        """
+        Wakes the sensor thread so stopping doesn't wait for an integration period
+        """
+        self._stopping = True
+        self._wake.set()
+        super().stop()
+
+    def teardown(self):
+        if self.bus is not None:
+            try:
+                self.bus.write_byte_data(self.address, self.regUVConf, self.powerOff)  # Power OFF
+            except Exception:
+                logging.exception("UV Sensor power off error")
+            self.bus.close()
+            self.bus = None
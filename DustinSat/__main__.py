@@ -2,12 +2,29 @@
 from airborne import set_airborne
 from Temperature import TemperatureSensor
 from Pressure import PressureSensor
-from UVSensor import UVSensor
-from GPS import GPS
+from UVSensor import UVSensor, UVReading
+from GPS import GPS, SERIAL_TIMEOUT
+from scheduler import Scheduler
+from i2cbus import get_bus
+from onewire import OneWireBus
+from recorder import FlightRecorder
+from logsetup import setup_logging, stop_logging
+from downlink import Downlink, SCIENCE
+from packet import PacketEncoder
+from instrument import Instruments, StatusServer, write_status
+from samples import TimeAnchor, Sample, sampled
+from ringbuffer import RingBuffer, buffered
+from flightphase import PhaseDetector, PHASES
+from checkpoint import Checkpoint, State, READINGS, CLEAN_SHUTDOWN, resumable
+from startup import Startup
+from supervisor import Supervisor
+from aioengine import Engine, ExecutorDriver, GPSDriver, PressureDriver, TemperatureDriver, UVDriver
+from workers import WorkerPool, SharedRing
 from tuppersat.sensor import SensorBase
 from datetime import datetime as dt 
 from satradio import SatRadio
 import logging
+import os
 import time
 
 """ 
@@ -15,24 +32,169 @@ Setting the logging, including file name format, the type of data collected etc
 """
 LOG = logging.getLogger(__name__)
 """
-File directory where data is saved
+File directory where data is saved (DUSTINSAT_DIR can point it somewhere else, e.g. for the simulator)
 """
-LOGDIR="/home/pi/MyTupperSatCode/"
+LOGDIR=os.environ.get("DUSTINSAT_DIR","/home/pi/MyTupperSatCode/")
 filename=LOGDIR+'logs/DUSTNSAT_{now:%Y-%m-%d_%H-%M-%S}.log'.format(now=dt.now())
-logging.basicConfig(filename=filename,level=logging.DEBUG,format='%(asctime)s %(name)s %(levelname)s : %(message)s')
+"""
+Logging goes through a queue to a background thread, so writing the log never holds up the loop
+or the sensors. The log rotates at 5MB and repeated exceptions are only logged once every 10 s.
+"""
+LOG_LISTENER=setup_logging(filename,level=logging.DEBUG,format='%(asctime)s %(name)s %(levelname)s : %(message)s',
+                           max_bytes=5*1024*1024,backup_count=10,queue_size=10000,window=10)
 gps_path=r'/dev/ttyACM0'
-set_airborne(gps_path)
+"""
+GPS output: 'nmea' (the receiver's default) or 'ubx', binary NAV-PVT ('pvt', or 'posllh_sol' for receivers
+without NAV-PVT) with the position accuracy. Only UBX has a navigation rate, the gps_hz of PHASE_RATES
+"""
+GPS_PROTOCOL='nmea'
+GPS_MESSAGES='pvt'
+radio_path=r'/dev/ttyAMA0'
+w1_devices=os.environ.get("DUSTINSAT_W1",r'/sys/bus/w1/devices')
+
+"""
+How often (in seconds) the data is saved, the logs are written, the telemetry is sent
+and the science packets are sent
+"""
+DATA_PERIOD=2
+LOG_PERIOD=5
+TELEMETRY_PERIOD=17
+SCIENCE_PERIOD=27
+REPORT_PERIOD=60
+
+"""
+Columns of the flight recording, one record is written every DATA_PERIOD. The age_ columns are how
+old (seconds) each sensor's reading was when the record was taken, so the sensors can be lined up in time.
+h_acc and v_acc are the GPS horizontal and vertical accuracy estimates (metres, UBX only)
+"""
+FLIGHT_COLUMNS=[('lat','d'),('lon','d'),('hzdil','f'),('alt','f'),('h_acc','f'),('v_acc','f'),
+                ('temp1','f'),('temp2','f'),('temp3','f'),('pressure','f'),
+                ('altitude2','f'),('uva','f'),('uvb','f'),
+                ('age_gps','f'),('age_temp1','f'),('age_temp2','f'),('age_pressure','f'),('age_uv','f')]
+"""
+Every reading a sensor makes goes into a ring buffer of RING_CAPACITY readings and into that save window's
+min/max/mean/std/count. The recording and science packets get the mean of the window (the columns above),
+plus the min/max/std of WINDOW_STATS and the number of readings from each sensor
+"""
+RING_CAPACITY=4096
+WINDOW_STATS=['alt','temp1','temp2','temp3','pressure','uva','uvb']
+RING_COUNTS={'gps':'n_gps','temperature_internal':'n_temp1','temperature_external':'n_temp2',
+             'pressure':'n_pressure','uv_sensor':'n_uv'}
+FLIGHT_COLUMNS+=[(name+stat,'f') for name in WINDOW_STATS for stat in ('_min','_max','_std')]
+FLIGHT_COLUMNS+=[(name,'f') for name in RING_COUNTS.values()]
+FLIGHT_COLUMNS+=[('phase','f')]
+"""
+Sampling and save rates for each flight phase: data/log/science are the job periods (seconds),
+pressure the minimum time between pressure readings (None for as fast as it goes), uv_ms the UV
+integration time, w1 the minimum time between 1-wire conversions and gps_hz the UBX navigation rate.
+Fast where things change quickly, slow on the ground to save power and storage. The periods above
+are the ones used until the first phase is applied. Telemetry keeps its period in every phase.
+"""
+PHASE_RATES={'pre_launch':{'data':10,'log':30,'science':54,'pressure':1.0, 'uv_ms':800,'w1':10,  'gps_hz':1},
+             'ascent':    {'data':2, 'log':5, 'science':27,'pressure':None,'uv_ms':200,'w1':None,'gps_hz':5},
+             'float':     {'data':5, 'log':10,'science':27,'pressure':0.5, 'uv_ms':800,'w1':5,   'gps_hz':1},
+             'descent':   {'data':1, 'log':5, 'science':27,'pressure':None,'uv_ms':100,'w1':None,'gps_hz':5},
+             'landed':    {'data':30,'log':60,'science':60,'pressure':5.0, 'uv_ms':800,'w1':30,  'gps_hz':1}}
+"""
+The recording is written in batches every FLUSH_PERIOD seconds (or sooner once FLUSH_BYTES are waiting)
+and fsynced every FSYNC_PERIOD seconds, so a power cut loses at most about FSYNC_PERIOD seconds of data
+"""
+FLUSH_PERIOD=5
+FLUSH_BYTES=4096
+FSYNC_PERIOD=20
+"""
+Minimum gap (in seconds) the radio needs between two packets
+"""
+RADIO_SPACING=3
+"""
+The radio, GPS airborne mode, 1-wire bus and I2C sensors are brought up at the same time. Each step has
+a timeout (seconds) after which it is reported late and anything waiting on it carries on without it.
+A step that fails is tried again after STARTUP_RETRY seconds, doubling up to STARTUP_MAX_RETRY
+"""
+STARTUP_TIMEOUTS={'radio':10,'airborne':10,'gps':5,'onewire':5,'i2c':5}
+STARTUP_RETRY=2
+STARTUP_MAX_RETRY=60
+"""
+Instrumentation: the status file is rewritten every STATUS_PERIOD seconds, STATUS_SOCKET serves
+the same snapshot on a Unix socket (None turns it off) and TELEMETRY_HEALTH adds the one character
+per sensor health field (TELEMETRY_PHASE the flight phase) to the telemetry packet. A sensor whose last good reading is older than
+STALE_AFTER seconds shows up as stale.
+"""
+STATUS_PERIOD=10
+STATUS_FILE=LOGDIR+"logs/status.json"
+STATUS_SOCKET=None
+TELEMETRY_HEALTH=False
+TELEMETRY_PHASE=False
+STALE_AFTER={'gps':5,'temperature_internal':5,'temperature_external':5,'pressure':2,'uv_sensor':5}
+"""
+Sensor supervision: a read that fails (raises or returns None) is retried after a backoff doubling from
+SUPERVISE_BACKOFF, and after SUPERVISE_FAILURES failures in a row the device is shut down for a cool-down
+doubling from SUPERVISE_COOLDOWN (both up to SUPERVISE_MAX_BACKOFF seconds), then set up again. A read
+that takes READ_DEADLINE seconds longer than the sensor's own waiting for the flight phase counts as hung,
+the watchdog checks every SUPERVISE_PERIOD seconds
+"""
+SUPERVISE_PERIOD=1
+SUPERVISE_FAILURES=5
+SUPERVISE_BACKOFF=0.1
+SUPERVISE_COOLDOWN=2
+SUPERVISE_MAX_BACKOFF=30
+READ_DEADLINE={'gps':3,'temperature_internal':3,'temperature_external':3,'pressure':1,'uv_sensor':1}
+"""
+Acquisition engine: 'threads' runs every sensor in its own SensorBase thread, 'asyncio' runs them all as
+drivers on one event loop thread, with ENGINE_WORKERS threads for the 1-wire conversions, setup() and teardown(),
+and 'processes' runs each of WORKER_GROUPS in its own process, publishing into shared memory rings of
+SHARED_CAPACITY readings per sensor. A worker that dies or sends no heartbeat for WORKER_TIMEOUT seconds is restarted
+"""
+ENGINE='threads'
+ENGINE_WORKERS=2
+WORKER_GROUPS={'gps':['gps'],'i2c':['pressure','uv_sensor'],'w1':['temperature_internal','temperature_external']}
+WORKER_TIMEOUT=5
+SHARED_CAPACITY=1024
+"""
+Warm restart: every data tick the last good readings, sequence counters, flight phase and open flight recording
+are written to the memory-mapped CHECKPOINT_FILE, which is flushed to the card every CHECKPOINT_SYNC seconds.
+After a restart that wasn't a clean shutdown RUN carries on from it if the checkpoint is less than
+RESUME_MAX_AGE seconds old, or RESUME_MAX_FLIGHT_AGE if it was in the air (or the clock is behind it).
+Until a sensor has a new reading the telemetry carries its checkpointed one (RESUMED_TELEMETRY)
+"""
+CHECKPOINT_FILE=LOGDIR+"data/checkpoint.bin"
+CHECKPOINT_SYNC=10
+RESUME_MAX_AGE=600
+RESUME_MAX_FLIGHT_AGE=1800
+RESUMED_TELEMETRY={"lat_dec_deg":'lat',"lon_dec_deg":'lon',"lat_dil":'hzdil',"alt":'alt',"temp1":'temp1',"temp2":'temp2',"pressure":'pressure'}
+
+def pressure_altitude(pressure, temp3):
+    """
+    Altitude data can be calculated from pressure and temperature data.
+    It is less accurate than from the GPS module,
+    but can be of use if the GPS module fails.
+    """
+    return abs(((((1021/pressure)**(1.0/5.257))-1.0)*(temp3+273.15))/0.0065)
+
+
+def gps_fields(gps):
+    """
+    Ring buffer fields of the GPS, the reading plus the accuracy estimates of the fix.
+    GPS.read() only returns a reading for a new fix, so there are no repeats to leave out.
+    """
+    def extract(value):
+        fix=gps.parser.fix
+        return tuple(value)+(fix.h_acc,fix.v_acc)
+    return ('lat','lon','hzdil','alt','h_acc','v_acc'), extract
+
 
 class RUN(SensorBase):
     def __init__(self):
         super().__init__(log=LOG)         
         
     def run(self):
-        """Loops a function indefinitely with optional setup and teardown step."""
+        """
+        Runs setup, then hands over to the scheduler which sleeps until the next job is due,
+        and finally the teardown step.
+        """
         self.setup()
         try:
-            while True:
-                self.loop()
+            self.scheduler.run()
         finally:
                 self.teardown()    
     """
@@ -40,58 +202,337 @@ class RUN(SensorBase):
     """ 
     def setup(self):
         """ 
-        Initialising satellite radio
+        Everything that doesn't touch hardware is set up here. The devices are brought up 
+        in parallel by the startup orchestrator and each one starts acquiring as soon as it 
+        is ready, so the loop starts straight away with whatever is there.
         """
-        self.myradio=SatRadio(r"/dev/ttyAMA0", 0x53,'DUSTNSAT1') 
-        self.myradio.start() 
-        print("Starting SatRadio")
-        
-        """ 
-        Starting all of the sensors
+        self.startup=Startup(retry=STARTUP_RETRY, max_retry=STARTUP_MAX_RETRY)
+        self.myradio=None
+        self.started=[]
+        """
+        Packets are queued on the downlink, which sends them from its own thread once the radio is up
+        """
+        self.downlink=Downlink(None,min_spacing=RADIO_SPACING)
+        self.downlink.start()
+
+        """
+        The sensors. Both temperature sensors share one bulk conversion on the 1-wire bus
+        """
+        self.instruments=Instruments()
         """
-        self.sensors = {'gps'  :GPS(gps_path),
-        'temperature_internal' : TemperatureSensor(r'/sys/bus/w1/devices/28-0300a2796d64/w1_slave'),
-        'temperature_external' : TemperatureSensor(r'/sys/bus/w1/devices/28-0517c41b75ff/w1_slave'),
-        'pressure'             : PressureSensor(0x77),
-        'uv_sensor'             :UVSensor(0x10)    
+        All UTC times come from one anchor, corrected from GPS time once there is a fix
+        """
+        self.anchor=TimeAnchor()
+        self.onewire=OneWireBus(w1_devices,resolution=12)
+        self.sensors = {'gps'  :GPS(gps_path, protocol=GPS_PROTOCOL, messages=GPS_MESSAGES, anchor=self.anchor),
+        'temperature_internal' : TemperatureSensor(os.path.join(w1_devices,'28-0300a2796d64','w1_slave'), bus=self.onewire),
+        'temperature_external' : TemperatureSensor(os.path.join(w1_devices,'28-0517c41b75ff','w1_slave'), bus=self.onewire),
+        'pressure'             : PressureSensor(0x77, prom_cache=LOGDIR+"data/MS5611_PROM.bin"),
+        'uv_sensor'             :UVSensor(0x10)
         }
+        self.first_sample=set(self.sensors)
+        """
+        Every reading from each sensor also goes into its ring buffer
+        """
+        ring_fields={'gps'                  :gps_fields(self.sensors['gps']),
+                     'temperature_internal' :(('temp1',),lambda value:(value,)),
+                     'temperature_external' :(('temp2',),lambda value:(value,)),
+                     'pressure'             :(('pressure','temp3'),lambda value:value),
+                     'uv_sensor'            :(('uva','uvb'),lambda value:(value.uva,value.uvb))}
+        self.rings={}
+        for sensor, (fields, extract) in ring_fields.items():
+            self.rings[sensor]=RingBuffer(fields, capacity=RING_CAPACITY)
+        self.supervisors={}
+        self.engine=None
+        self.workers=None
+        if ENGINE=='asyncio':
+            self.setup_engine({sensor:extract for sensor, (fields, extract) in ring_fields.items()})
+        elif ENGINE=='processes':
+            self.setup_workers(ring_fields)
+        else:
+            for sensor, (fields, extract) in ring_fields.items():
+                buffered(self.sensors[sensor], self.rings[sensor], extract)
+            """
+            Every sensor's read() result is kept as a Sample with the time it was captured and a 
+            sequence number, and every read() is timed, counted and its data age tracked
+            """
+            for sensor in self.sensors:
+                sampled(self.sensors[sensor])
+                self.instruments.instrument_sensor(sensor, self.sensors[sensor], stale_after=STALE_AFTER.get(sensor))
+            """
+            Each sensor is supervised, so a failing device backs off and gets re-initialised and a hung read
+            is caught. The I2C sensors reset the shared bus when they are re-initialised
+            """
+            for sensor in self.sensors:
+                reset=get_bus(1).reset if sensor in ('pressure','uv_sensor') else None
+                self.supervisors[sensor]=Supervisor(sensor, self.sensors[sensor], threshold=SUPERVISE_FAILURES,
+                                                    backoff=SUPERVISE_BACKOFF, cooldown=SUPERVISE_COOLDOWN,
+                                                    max_backoff=SUPERVISE_MAX_BACKOFF, reset=reset)
+
+        """
+        The scheduler replaces the old perf_counter timers. Each job has its own deadline
+        and the readings are refreshed every time the scheduler wakes up.
+        """
+        self.scheduler=Scheduler()
+        timed=self.instruments.timed
+        self.scheduler.on_wake(timed('loop', self.loop))
+        self.scheduler.add_job('data', DATA_PERIOD, timed('save_data', self.save_data))
+        self.scheduler.add_job('log', LOG_PERIOD, timed('save_log', self.save_log))
+        self.scheduler.add_job('telemetry', TELEMETRY_PERIOD, timed('send_telemetry', self.send_telemetry))
+        self.scheduler.add_job('science', SCIENCE_PERIOD, timed('send_science', self.send_science))
+        self.scheduler.add_job('report', REPORT_PERIOD, timed('report', self.report))
+        self.scheduler.add_job('status', STATUS_PERIOD, self.write_status)
+        self.scheduler.add_job('supervise', SUPERVISE_PERIOD, self.supervise)
+        self.status_server=None
+        if STATUS_SOCKET is not None:
+            try:
+                self.status_server=StatusServer(STATUS_SOCKET, self.instruments)
+                self.status_server.start()
+            except Exception:
+                logging.exception("Could not start the status socket")
+                self.status_server=None
+
+        """
+        All of the sensor data goes into one binary flight recording per flight, kept in the 
+        folder ~/home/pi/MyTupperSatCode/data while the logs are kept in ~/home/pi/MyTupperSatCode/logs
+        """
+        resume=self.load_checkpoint()
+        self.recorder=None
+        if resume is not None:
+            try:
+                self.recorder=self.open_recorder(resume.recorder, resume=True)
+            except Exception:
+                logging.exception("Could not resume {}".format(resume.recorder))
+                resume=None
+        if self.recorder is None:
+            self.recorder=self.open_recorder(LOGDIR+"data/FLIGHT_{now:%Y-%m-%d_%H-%M-%S}.dsr".format(now=dt.now()))
+        self.values={}
+        self.last_good={}
+        self.resumed={}
+        self.tick=time.monotonic()
+        """
+        Science packets are binary, holding a short time series of the samples saved since the last packet
+        """
+        self.packer=PacketEncoder()
+        """
+        The flight phase sets the sampling and save rates
+        """
+        self.phase=PhaseDetector()
+        if resume is not None:
+            self.resume(resume)
+        self.apply_rates(self.phase.phase)
+        self.scheduler.add_job('checkpoint', CHECKPOINT_SYNC, self.sync_checkpoint)
+
+        """
+        Bring the devices up. The GPS is put into airborne mode before its sensor thread opens the port,
+        unless that takes longer than its timeout.
+        """
+        self.startup.add('radio', self.start_radio, timeout=STARTUP_TIMEOUTS['radio'])
+        self.startup.add('airborne', lambda: set_airborne(gps_path), timeout=STARTUP_TIMEOUTS['airborne'])
+        self.startup.add('gps', lambda: self.start_sensor('gps'), timeout=STARTUP_TIMEOUTS['gps'], after=['airborne'])
+        self.startup.add('onewire', self.start_onewire, timeout=STARTUP_TIMEOUTS['onewire'])
+        self.startup.add('i2c', self.start_i2c, timeout=STARTUP_TIMEOUTS['i2c'])
+        self.startup.start()
+
+    def setup_engine(self, extracts):
+        """
+        Runs the sensors as drivers on one asyncio event loop instead of a thread each. self.sensors
+        then holds their stand-ins. Every reading goes through two stages: 'latest' keeps the Sample
+        the loop picks up and counts it on the sensor's probe, 'rings' adds it to the ring buffer.
+        The engine does its own backoff and re-initialisation of failing sensors.
+        """
+        self.engine=Engine(workers=ENGINE_WORKERS, threshold=SUPERVISE_FAILURES,
+                           backoff=SUPERVISE_BACKOFF, max_backoff=SUPERVISE_MAX_BACKOFF)
+        drivers={'gps':GPSDriver,'pressure':PressureDriver,'uv_sensor':UVDriver,
+                 'temperature_internal':TemperatureDriver,'temperature_external':TemperatureDriver}
+        probes={}
+        for sensor in self.sensors:
+            probes[sensor]=self.instruments.add_sensor(sensor, stale_after=STALE_AFTER.get(sensor))
+            self.sensors[sensor]=self.engine.attach(sensor, self.sensors[sensor], drivers.get(sensor, ExecutorDriver))
+        seq=dict.fromkeys(self.sensors, 0)
+
+        def latest(reading):
+            probe=probes[reading.name]
+            if reading.error is not None:
+                probe.latency.add(reading.end-reading.start)
+                probe.error(reading.end)
+                return
+            probe.add(reading.start, reading.end, reading.value)
+            if reading.value is not None:
+                seq[reading.name]+=1
+                self.sensors[reading.name].data=Sample(reading.value, reading.end, seq[reading.name])
+
+        def rings(reading):
+            if reading.value is not None:
+                values=extracts[reading.name](reading.value)
+                if values is not None:
+                    self.rings[reading.name].append(reading.end, values)
+
+        self.engine.add_stage('latest', latest)
+        self.engine.add_stage('rings', rings)
+        self.engine.start()
+
+    def setup_workers(self, ring_fields):
+        """
+        Runs the sensor groups in worker processes. The workers publish the readings into shared
+        memory rings (the GPS only when there is a new fix, as its ring values) and supervise their own
+        sensors, self.sensors then holds the stand-ins. Every loop tick drain_workers() picks the readings up.
+        """
+        gps_ring, gps_extract=ring_fields['gps']
+        shared={'gps'                  :(len(gps_ring),gps_extract,lambda values:values[:4]),
+                'temperature_internal' :(1,lambda value:(value,),lambda values:values[0]),
+                'temperature_external' :(1,lambda value:(value,),lambda values:values[0]),
+                'pressure'             :(2,tuple,tuple),
+                'uv_sensor'            :(len(UVReading._fields),tuple,lambda values:UVReading(*values))}
+        self.decoders={sensor:decode for sensor, (width, encode, decode) in shared.items()}
+        self.extracts={sensor:extract for sensor, (fields, extract) in ring_fields.items()}
+        self.extracts['gps']=None
+        self.probes={sensor:self.instruments.add_sensor(sensor, stale_after=STALE_AFTER.get(sensor)) for sensor in self.sensors}
+        self.samples=dict.fromkeys(self.sensors, 0)
+
+        def supervise(sensor, device):
+            reset=get_bus(1).reset if sensor in ('pressure','uv_sensor') else None
+            return Supervisor(sensor, device, threshold=SUPERVISE_FAILURES, backoff=SUPERVISE_BACKOFF,
+                              cooldown=SUPERVISE_COOLDOWN, max_backoff=SUPERVISE_MAX_BACKOFF, reset=reset)
+
+        rings={sensor:SharedRing(width, capacity=SHARED_CAPACITY) for sensor, (width, encode, decode) in shared.items()}
+        self.workers=WorkerPool(WORKER_GROUPS, dict(self.sensors), rings,
+                                {sensor:encode for sensor, (width, encode, decode) in shared.items()},
+                                wrap=supervise, timeout=WORKER_TIMEOUT, backoff=SUPERVISE_COOLDOWN,
+                                max_backoff=SUPERVISE_MAX_BACKOFF)
+        for sensor in self.sensors:
+            self.sensors[sensor]=self.workers.stand_in(sensor)
+
+    def drain_workers(self):
+        """
+        Takes the new readings out of the workers' shared rings: each one is counted on its probe,
+        goes into the ring buffer and the newest becomes the sensor's Sample
+        """
+        readings, errors=self.workers.drain()
+        for sensor, (count, last) in errors.items():
+            self.probes[sensor].errors+=count
+            self.probes[sensor].last_error=last
+        for sensor, new in readings.items():
+            for start, end, values in new:
+                value=self.decoders[sensor](values)
+                self.probes[sensor].add(start, end, value)
+                extract=self.extracts[sensor]
+                self.rings[sensor].append(end, values if extract is None else extract(value))
+                self.samples[sensor]+=1
+                self.sensors[sensor].data=Sample(value, end, self.samples[sensor])
+
+    def open_recorder(self, path, resume=False):
+        return FlightRecorder(path,FLIGHT_COLUMNS,flush_interval=FLUSH_PERIOD,flush_bytes=FLUSH_BYTES,
+                              fsync_interval=FSYNC_PERIOD,resume=resume)
+
+    def load_checkpoint(self):
+        """
+        Opens the checkpoint and returns its state if RUN should carry on from it, otherwise None
+        """
+        self.checkpoint=None
+        try:
+            self.checkpoint=Checkpoint(CHECKPOINT_FILE)
+            state=self.checkpoint.load()
+            if resumable(state, time.time(), RESUME_MAX_AGE, RESUME_MAX_FLIGHT_AGE) and os.path.exists(state.recorder):
+                return state
+        except Exception:
+            logging.exception("Checkpoint error")
+        return None
+
+    def resume(self, state):
+        """
+        Carries on from the checkpoint: the flight phase and its ground levels, the science packet
+        numbering (starting with a keyframe, the ground station lost the reference), the last readings
+        for the telemetry and, if the system clock is behind the checkpoint (no real time clock), the
+        time until the GPS corrects it
+        """
+        started=time.monotonic()
+        if state.phase < len(PHASES):
+            self.phase.phase=PHASES[state.phase]
+        self.phase.ground.update({source:level for source, level in state.ground.items() if level==level})
+        self.packer.seq=state.packet_seq
+        self.packer.force_keyframe()
+        if time.time() < state.time:
+            self.anchor.set(state.time, started, 'checkpoint')
+        self.last_good={name:value for name, value in state.readings.items() if value==value}
+        self.resumed={key:self.last_good[name] for key, name in RESUMED_TELEMETRY.items() if name in self.last_good}
+        logging.info("Resumed {} at record {} in {} phase in {:.1f} ms, last readings {}".format(
+            state.recorder, self.recorder.seq, self.phase.phase, 1000*(time.monotonic()-started), self.last_good))
+
+    def save_checkpoint(self, now, flags=0):
+        """
+        Updates the checkpoint in place with the last good readings and the counters
+        """
+        if self.checkpoint is None:
+            return
+        for name in READINGS:
+            value=self.values.get(name)
+            if value is not None and value==value:
+                self.last_good[name]=value
+        self.checkpoint.save(State(0, flags, self.phase.code, now, self.anchor.source, self.packer.seq,
+                                   self.recorder.seq, self.phase.ground, self.last_good, self.recorder.path))
+
+    def sync_checkpoint(self):
+        """
+        Every 10 seconds flush the checkpoint to the card
+        """
+        try:
+            if self.checkpoint is not None:
+                self.checkpoint.sync()
+        except Exception:
+            logging.exception("Checkpoint sync error")
+
+    def start_radio(self):
+        """
+        Starting the SatRadio, the downlink starts sending once it is up
+        """
+        radio=SatRadio(radio_path, 0x53,'DUSTNSAT1')
+        radio.start()
+        self.myradio=radio
+        self.downlink.set_radio(radio)
+        print("Starting SatRadio")
         
+    def start_sensor(self, sensor):
+        """
+        Starts a sensor, unless a startup step that is being tried again already did
+        """
+        if sensor in self.started:
+            return
+        self.sensors[sensor].start()
+        self.started.append(sensor)
+        print("{} is starting....".format(sensor))
+
+    def start_onewire(self):
         """ 
-        Start timers to save data, save logs, send telemetry, send data packets  
+        Sets the resolution on the 1-wire bus, then starts both temperature sensors
         """
-        self.sensorDataStartTime=time.perf_counter()
-        self.logStartTime=time.perf_counter()        
-        self.telemetryStartTime=time.perf_counter()        
-        self.dataStartTime=time.perf_counter()
+        self.onewire.setup()
+        self.start_sensor('temperature_internal')
+        self.start_sensor('temperature_external')
         
+    def start_i2c(self):
         """ 
-        Opening the new files to be written. A seperate file is created for every sensor. On the tuppersat
-        the sensor data is kept in the folder ~/home/pi/MyTupperSatCode/data while the logs are kept in 
-        ~/home/pi/MyTupperSatCode/logs
-        NB. There has to be a more eloquent way to do this.....
-        """        
-        self.temp1_data=open(LOGDIR+"data/TEMP1_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.temp2_data=open(LOGDIR+"data/TEMP2_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.temp3_data=open(LOGDIR+"data/TEMP3_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.pressure_data=open(LOGDIR+"data/PRESSURE_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.altitude1_data=open(LOGDIR+"data/ALTITUDE1_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.altitude2_data=open(LOGDIR+"data/ALTITUDE2_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.latitude_data=open(LOGDIR+"data/LATITUDE_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.longitude_data=open(LOGDIR+"data/LONGITUDE_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.latdilution_data=open(LOGDIR+"data/latdilution_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.uva_data=open(LOGDIR+"data/UVA_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        self.uvb_data=open(LOGDIR+"data/UVB_{now:%Y-%m-%d_%H-%M-%S}.log".format(now=dt.now()),"wb")
-        
-        for sensor in self.sensors:
-            self.sensors[sensor].start()
-            print("{} is starting....".format(sensor))
-        
+        The pressure and UV sensors share the I2C bus, their setup runs in their own threads
+        """
+        self.start_sensor('pressure')
+        self.start_sensor('uv_sensor')
         
     def loop(self):
         """ 
-        The inital telemetry_dict is declared so that if sensors are not outputting data, it defaults to the initial values
+        Called every time the scheduler wakes up, it collects the latest data from all of the sensors.
+        The clock is read once per tick and each sensor's Sample says how old its value is.
+        The telemetry_dict is declared so that if sensors are not outputting data, it defaults to the initial values
         """
-        telemetry_dict={"hhmmss":dt.now(),"lat_dec_deg":None,"lon_dec_deg":None,"lat_dil":None,"alt":None,"temp1":None,"temp2":None,"pressure":None}
+        now=time.monotonic()
+        if self.workers is not None:
+            self.drain_workers()
+        if self.first_sample:
+            self.startup_progress()
+        telemetry_dict={"hhmmss":self.anchor.datetime(now),"lat_dec_deg":None,"lon_dec_deg":None,"lat_dil":None,"alt":None,"temp1":None,"temp2":None,"pressure":None}
+        values={}
+        lat=lon=hzdil=alt=None
+        temp1=temp2=temp3=pressure=altitude2=None
+        uva=uvb=None
         try:
             """
             The following code retrieves the GPS/GLASNOSS location data
@@ -105,7 +546,8 @@ class RUN(SensorBase):
                 if gpsdata==None:
                    pass
                 else:
-                    lat, lon, hzdil, alt=gpsdata  
+                    lat, lon, hzdil, alt=gpsdata.value
+                    values.update(lat=lat,lon=lon,hzdil=hzdil,alt=alt,age_gps=gpsdata.age(now))
                     telemetry_dict["lat_dec_deg"]=lat
                     if lat==None:
                         pass
@@ -137,11 +579,13 @@ class RUN(SensorBase):
                 Retrieve external temperature sensor data. IF data type is None, pass. 
                 This allow for the pre-defined telemetry_dict to keep values as None. 
                 """
-                temp1=self.sensors['temperature_internal'].data
-                if temp1==None:
+                sample=self.sensors['temperature_internal'].data
+                if sample==None:
                     pass    
                 else:
-                    telemetry_dict["temp2"]=temp1
+                    temp1=sample.value
+                    values['age_temp1']=sample.age(now)
+                    telemetry_dict["temp1"]=values['temp1']=temp1
                     temp1="{:7.3f}".format(temp1)
                     
             except Exception:
@@ -153,11 +597,13 @@ class RUN(SensorBase):
                 """
                 Retrieve external temperature sensor data. Same as above
                 """
-                temp2=self.sensors['temperature_external'].data
-                if temp2==None:
+                sample=self.sensors['temperature_external'].data
+                if sample==None:
                    pass    
                 else:
-                    telemetry_dict["temp2"]=temp2 
+                    temp2=sample.value
+                    values['age_temp2']=sample.age(now)
+                    telemetry_dict["temp2"]=values['temp2']=temp2
                     temp2="{:7.3f}".format(temp2)
                     
             except Exception:
@@ -171,20 +617,17 @@ class RUN(SensorBase):
                 """
                 pressureData=self.sensors['pressure'].data
                 if pressureData==None:
-                    altitude2=None
                     pass                       
                 else:
-                    pressure, temp3=pressureData
+                    pressure, temp3=pressureData.value
                     if pressure==None:
                         pass
                     else:
-                        """
-                        Altitude data can be calculated from pressure and temperature data. 
-                        It is less accurate than from the GPS module, 
-                        but can be of use if the GPS module fails.
-                        """
-                        altitude2=((((1021/pressure)**(1.0/5.257))-1.0)*(temp3+273.15))/0.0065
-                        altitude2="{:5.2f}".format(abs(altitude2))                        
+                        telemetry_dict["pressure"]=values['pressure']=pressure
+                        values['age_pressure']=pressureData.age(now)
+                        values['temp3']=temp3
+                        values['altitude2']=altitude2=pressure_altitude(pressure, temp3)
+                        altitude2="{:5.2f}".format(altitude2)
                        
                         temp3="{:7.3f}".format(temp3)
                         
@@ -204,7 +647,8 @@ class RUN(SensorBase):
                     uva=None
                     uvb=None
                 else:
-                     uva, uvb=uvdata
+                     uva, uvb=uvdata.value.uva, uvdata.value.uvb
+                     values.update(uva=uva,uvb=uvb,age_uv=uvdata.age(now))
                      if uva==None:
                          pass
                      else:
@@ -217,182 +661,261 @@ class RUN(SensorBase):
                          
             except Exception:
                 logging.exception("Error reading UV Sensor")
+        except Exception:
+            logging.exception("Exception in loop()")
+        """
+        After a warm restart the checkpointed readings fill in until each sensor has a new one
+        """
+        for key in list(self.resumed):
+            if telemetry_dict[key] is None:
+                telemetry_dict[key]=self.resumed[key]
+            else:
+                del self.resumed[key]
+        """
+        The raw values and formatted readings are kept for the scheduled jobs below
+        """
+        self.tick=now
+        self.telemetry_dict=telemetry_dict
+        self.values=values
+        self.readings={'lat':lat,'lon':lon,'hzdil':hzdil,'alt':alt,'temp1':temp1,'temp2':temp2,
+                       'temp3':temp3,'pressure':pressure,'altitude2':altitude2,'uva':uva,'uvb':uvb}
+
+    def apply_rates(self, phase):
+        """
+        Changes the job periods and sensor rates to the ones for the flight phase,
+        without restarting anything
+        """
+        rates=PHASE_RATES[phase]
+        logging.info("Rates for {}: {}".format(phase, rates))
+        try:
+            deadlines=self.read_deadlines(rates)
+            for sensor, supervisor in self.supervisors.items():
+                supervisor.set_deadline(deadlines[sensor])
+            if self.workers is not None:
+                for sensor in self.sensors:
+                    self.workers.call(sensor, 'supervisor.set_deadline', deadlines[sensor])
+            self.scheduler.set_period('data', rates['data'])
+            self.scheduler.set_period('log', rates['log'])
+            self.scheduler.set_period('science', rates['science'])
+            self.sensors['pressure'].set_period(rates['pressure'])
+            self.sensors['uv_sensor'].set_integration_time(rates['uv_ms'])
+            self.onewire.set_period(rates['w1'])
+            if self.workers is not None:
+                self.workers.call('temperature_internal', 'bus.set_period', rates['w1'])
+            self.sensors['gps'].set_rate(rates['gps_hz'])
+        except Exception:
+            logging.exception("Error changing rates for {}".format(phase))
+
+    def read_deadlines(self, rates):
+        """
+        How long each sensor's read may take with the phase's rates: the time it waits on purpose
+        (the GPS serial timeout, the pressure period, two UV integrations after a change, and for the
+        temperature sensors the 1-wire period and conversion twice over, as the other sensor can get in
+        first) plus READ_DEADLINE
+        """
+        w1=2*((rates['w1'] or 0)+self.onewire.conversion_time)
+        waits={'gps':SERIAL_TIMEOUT,
+               'temperature_internal':w1,
+               'temperature_external':w1,
+               'pressure':rates['pressure'] or 0,
+               'uv_sensor':2.1*rates['uv_ms']/1000}
+        return {sensor:waits[sensor]+READ_DEADLINE[sensor] for sensor in waits}
+
+    def supervise(self):
+        """
+        Every second check for sensor reads that have hung, or worker processes that have died
+        """
+        now=time.monotonic()
+        for supervisor in self.supervisors.values():
+            supervisor.check(now)
+        if self.workers is not None:
+            self.workers.check(now)
+
+    def startup_progress(self):
+        """
+        Notes the time of each sensor's first reading, and logs the startup timing once they all have one
+        """
+        for sensor in list(self.first_sample):
+            first=self.instruments.sensors[sensor].first_sample
+            if first is not None:
+                self.startup.mark('first_'+sensor, first)
+                self.first_sample.discard(sensor)
+        if not self.first_sample:
+            logging.info("Startup complete: {}".format(self.startup.report()))
+
+    def save_data(self):
+        """
+        Every 2 seconds, save one record of all the sensor data to the flight recording
+        and add it to the next science packet, stamped with the UTC time of the tick it was collected in.
+        Sensors with readings in the last window are saved as the window's mean (with min/max/std),
+        the others keep their last value
+        """
+        now=self.anchor.utc(self.tick)
+        values=dict(self.values)
+        try:
+            for sensor, ring in self.rings.items():
+                window=ring.take_window()
+                values.update(window.as_values())
+                values[RING_COUNTS[sensor]]=window.samples
+            if values.get('pressure') is not None and values.get('temp3') is not None:
+                values['altitude2']=pressure_altitude(values['pressure'], values['temp3'])
+        except Exception:
+            logging.exception("Error aggregating the save window")
+        try:
+            changed=self.phase.update(self.tick, gps_alt=values.get('alt'), gps_age=values.get('age_gps'),
+                                      baro_alt=values.get('altitude2'))
+            values['phase']=self.phase.code
+            if changed is not None:
+                self.apply_rates(changed)
+        except Exception:
+            logging.exception("Flight phase error")
+        try:
+            self.recorder.record(now, values)
+        except Exception:
+            logging.exception("data logging error")
+        try:
+            self.save_checkpoint(now)
+        except Exception:
+            logging.exception("Checkpoint error")
+        try:
+            self.packer.add(now, values)
+        except Exception:
+            logging.exception("science packet error")
+
+    def telemetry_strings(self):
+        """
+        Creates the strings that are saved in the logfiles and sent over the radio
+        """
+        r=self.readings
+        telemetry='Latitude: {}|Longitude: {}|Lat Dilution: {}|Altitude: {}|Internal Temperature: {}|External Temperature: {}|Pressure: {}'.format(
+            r['lat'],r['lon'],r['hzdil'],r['alt'],r['temp1'],r['temp2'],r['pressure'])
+        sciencetelem='Altitude: {}|Altitude2: {}|External Temperature: {}|Auxiliary Temperature: {}|Pressure: {}|UVA: {}|UVB: {}'.format(
+            r['alt'],r['altitude2'],r['temp2'],r['temp3'],r['pressure'],r['uva'],r['uvb'])
+        return telemetry, sciencetelem
+
+    def save_log(self):
+        """
+        Every 5 seconds save all relevant data to the logs
+        """
+        try:
+            telemetry, sciencetelem=self.telemetry_strings()
             """
-            The code now specifies if 2 seconds or more has passed since the timer started, 
-            format & save the sensor data in their respective folders
+            The D added to the string makes it easier for the reader to descern telemetry from data packets.
             """
-            try:
-                if (time.perf_counter()-self.sensorDataStartTime)>=2:
-                    try:
-                        """
-                        Save temp1 data to 
-                        """
-                        logtemp1="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), temp1)
-                        self.temp1_data.write(logtemp1.encode())
-                        
-                        """ 
-                        Save temp2 data to file
-                        """
-                        logtemp2="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), temp2)
-                        self.temp2_data.write(logtemp2.encode())
-                        
-                        """
-                        Save altitude data to file
-                        """
-                        logalt1="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), alt)
-                        self.altitude1_data.write(logalt1.encode())
-                        
-                        """
-                        Save latitude data to file
-                        """
-                        loglat="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), lat)
-                        self.latitude_data.write(loglat.encode())
-                        
-                        """
-                        Save longitude data to file
-                        """
-                        loglon="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), lon)
-                        self.longitude_data.write(loglon.encode())
-                        
-                        """
-                        Save latitude dilution data to file
-                        """
-                        loghzdil="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), hzdil)
-                        self.latdilution_data.write(loghzdil.encode())
-                        
-                        """
-                        Save altitude (calculated from pressure sensor) data to file
-                        """
-                        logalt2="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), altitude2)
-                        self.altitude2_data.write(logalt2.encode())
-                        
-                        """
-                        Save temperature 3 (from pressure sensor) data to file
-                        """
-                        logtemp3="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), temp3)
-                        self.temp3_data.write(logtemp3.encode())
-                        
-                        """
-                        Save pressure data to file
-                        """
-                        logpressure="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), pressure)
-                        self.pressure_data.write(logpressure.encode())
-                        
-                        """
-                        Save uva data to file
-                        """
-                        loguva="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), uva)
-                        self.uva_data.write(loguva.encode())
-                        
-                        """
-                        Save uvb data to file
-                        """
-                        loguvb="{}|{}\n".format(dt.now().strftime("%H:%M:%S.%fZ"), uvb)
-                        self.uvb_data.write(loguvb.encode())
-                        
-                        """
-                        Reset data timer
-                        """
-                        self.sensorDataStartTime=time.perf_counter()
-                        
-                        """
-                        The following code specifies if 5 seconds or more have passed 
-                        since the timer was started/reset save all relevant data to the logs
-                        """
-                        if (time.perf_counter()-self.logStartTime)>=5:
-                            try:
-                                """
-                                The following few lines create the strings that will be saved in the logfiles, 
-                                and then writes them to file.
-                                """
-                                telemetry='Latitude: {}|Longitude: {}|Lat Dilution: {}|Altitude: {}|Internal Temperature: {}|External Temperature: {}|Pressure: {}'.format(lat,lon,hzdil,alt,temp1,temp2,pressure)
-                                sciencetelem='Altitude: {}|Altitude2: {}|External Temperature: {}|Auxiliary Temperature: {}|Pressure: {}|UVA: {}|UVB: {}'.format(alt,altitude2,temp2,temp3,pressure,uva,uvb)
-                                """
-                                The D & T added to the strings make it easier for the reader to descern telemetry from data packets.
-                                """
-                                science='D|'+sciencetelem
-                                telemlog="T|"+telemetry
-                                logging.info(telemetry.encode("ascii"))
-                                logging.info(science.encode("ascii"))
-                                # Reset log timer
-                                self.logStartTime=time.perf_counter()
-                                """
-                                The following script specifies that if 17 or more seconds have passed since the timer was started/reset, 
-                                it will attempt to transmit the telemetry using the satellite radio
-                                """
-                                if (time.perf_counter()-self.telemetryStartTime)>=17:
-                                    try:
-                                        telemetry_dict["hhmmss"]=dt.now()
-                                        self.myradio.send_telemetry(**telemetry_dict)
-                                        print(telemlog.encode("ascii"))
-                                        """
-                                        Reset timer
-                                        """
-                                        self.telemetryStartTime=time.perf_counter()
-                                        """
-                                        The following script specifies that if 27 or more seconds have passed since the timer was started/reset, 
-                                        it will attempt to transmit the science data packet using the satellite radio
-                                        """
-                                        if (time.perf_counter()-self.dataStartTime)>=27:
-                                            time.sleep(3)
-                                            try:                    
-                                                self.myradio.send_data_packet(sciencetelem.encode("ascii"))
-                                                print(science.encode("ascii"))
-                                                """
-                                                Reset  data timer
-                                                """
-                                                self.dataStartTime=time.perf_counter()
-                                                
-                                            except Exception:
-                                                logging.exception("Error sending science data")
-                                        else:
-                                            pass
-                                    except Exception:
-                                        logging.exception("Error sending telemtry")                                
-                                else:
-                                    pass
-                            except Exception:
-                                logging.exception("Log start time issue")
-                        else:
-                            pass
-                    except Exception:
-                        logging.exception("data logging error")
-                else:
-                    pass
-            except Exception:
-                logging.exception("Not sure of the issue")
-            else:
-                pass
+            science='D|'+sciencetelem
+            logging.info((telemetry+'|Phase: '+self.phase.phase+'|Health: '+self.instruments.health()).encode("ascii"))
+            logging.info(science.encode("ascii"))
         except Exception:
-            logging.exception("Exception in loop()")
+            logging.exception("Log start time issue")
+
+    def send_telemetry(self):
+        """
+        Every 17 seconds queue the telemetry to be sent by the satellite radio
+        """
+        try:
+            telemetry, sciencetelem=self.telemetry_strings()
+            telemlog="T|"+telemetry
+            self.telemetry_dict["hhmmss"]=self.anchor.datetime(time.monotonic())
+            if TELEMETRY_HEALTH:
+                self.telemetry_dict["health"]=self.instruments.health()
+            if TELEMETRY_PHASE:
+                self.telemetry_dict["phase"]=self.phase.phase
+            self.downlink.send_telemetry(**self.telemetry_dict)
+            print(telemlog.encode("ascii"))
+        except Exception:
+            logging.exception("Error sending telemtry")
+
+    def send_science(self):
+        """
+        Every 27 seconds queue the science data packet to be sent by the satellite radio.
+        The downlink keeps the gap the radio needs after a telemetry packet. If the last packet
+        is still waiting (e.g. the radio isn't up yet) this one replaces it, so it is made a keyframe
+        the ground can decode without it.
+        """
+        try:
+            telemetry, sciencetelem=self.telemetry_strings()
+            science='D|'+sciencetelem
+            if self.downlink.pending(SCIENCE):
+                self.packer.force_keyframe()
+            packet=self.packer.encode()
+            if packet is not None:
+                self.downlink.send_data_packet(packet)
+                print(science.encode("ascii"))
+        except Exception:
+            logging.exception("Error sending science data")
+
+    def report(self):
+        """
+        Logs the scheduler, I2C bus, recorder and downlink figures so missed deadlines, drift, 
+        bus load, disk writes and radio queueing show up in the logs
+        """
+        logging.info("Scheduler: wakeups={} jobs={}".format(self.scheduler.wakeups, self.scheduler.stats()))
+        logging.info("I2C bus: {}".format(get_bus(1).stats()))
+        logging.info("Flight recorder: {}".format(self.recorder.stats()))
+        logging.info("Downlink: {}".format(self.downlink.stats()))
+        logging.info("Startup: {}".format(self.startup.report()))
+        logging.info("Supervisors: {}".format({sensor:supervisor.stats() for sensor, supervisor in self.supervisors.items()}))
+        if self.engine is not None:
+            logging.info("Engine: {}".format(self.engine.stats()))
+        if self.workers is not None:
+            logging.info("Workers: {}".format(self.workers.stats()))
+
+    def write_status(self):
+        """
+        Every 10 seconds write the instrumentation snapshot (latency histograms, counts,
+        data age and health of every sensor and tick phase) to the status file
+        """
+        try:
+            snapshot=self.instruments.snapshot()
+            snapshot['scheduler']=self.scheduler.stats()
+            snapshot['downlink']=self.downlink.stats()
+            snapshot['startup']=self.startup.report()
+            snapshot['supervisors']={sensor:supervisor.stats() for sensor, supervisor in self.supervisors.items()}
+            if self.engine is not None:
+                snapshot['engine']=self.engine.stats()
+            if self.workers is not None:
+                snapshot['workers']=self.workers.stats()
+            write_status(STATUS_FILE, snapshot)
+        except Exception:
+            logging.exception("Error writing status file")
         
     def teardown(self):
         """ 
         shutdown sensors
         """
-        for sensor in self.sensors:
+        self.scheduler.stop()
+        self.startup.stop()
+        if self.status_server is not None:
+            self.status_server.stop()
+        for sensor in list(self.started):
             self.sensors[sensor].stop()
             print("{} is shutting down....".format(sensor))
+        if self.engine is not None:
+            self.engine.stop()
+        if self.workers is not None:
+            self.workers.stop()
         """ 
-        Close all files.
-        """
-        self.temp1_data.close()
-        self.temp2_data.close()
-        self.temp3_data.close()
-        self.pressure_data.close()
-        self.altitude1_data.close()
-        self.altitude2_data.close()
-        self.latitude_data.close()
-        self.longitude_data.close()
-        self.latdilution_data.close()
-        self.uva_data.close()
-        self.uvb_data.close()
+        Close the flight recording
+        """
+        self.recorder.close()
+        """
+        A clean shutdown, so the next start is a new flight
+        """
+        try:
+            if self.checkpoint is not None:
+                self.save_checkpoint(self.anchor.utc(time.monotonic()), flags=CLEAN_SHUTDOWN)
+                self.checkpoint.close()
+        except Exception:
+            logging.exception("Checkpoint error")
         
         """ 
         shutdown radio
         """
-        self.myradio.stop()   
-        print("myradio is shutting down....")
+        self.downlink.stop()
+        if self.myradio is not None:
+            self.myradio.stop()
+            print("myradio is shutting down....")
+        stop_logging(LOG_LISTENER)
                  
         
 if __name__=="__main__":
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Single-threaded asyncio acquisition engine, the alternative to a SensorBase
+thread per sensor (ENGINE in __main__). One event loop thread runs a driver
+for each sensor: the pressure and UV conversion waits are asyncio sleeps, the
+GPS serial port is read when the loop says it is readable (polled if the port
+has no file descriptor) and the 1-wire sensors wait for the 1-wire period on
+the loop, so only the conversion and the w1_slave read, which block in the
+kernel, take up a thread of the small pool that also runs setup() and
+teardown(). Any other SensorBase sensor runs through its own blocking read()
+in that pool, so the existing classes keep working.
+
+Every reading (or error) goes onto one asyncio.Queue per stage, e.g. the
+latest values RUN polls and the ring buffers the recorder and downlink are fed
+from. A stage that falls behind drops readings instead of holding up the drivers.
+"""
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from GPS import REOPEN_INTERVAL, SERIAL_TIMEOUT
+import logging
+LOG = logging.getLogger(__name__)
+
+"""
+How often a serial port without a file descriptor is polled, the longest a driver sleeps
+before looking at its settings again and how many readings a stage can fall behind by
+"""
+POLL_INTERVAL = 0.05
+MAX_SLEEP = 0.5
+QUEUE_SIZE = 1024
+
+"""
+One read: value is None if there was nothing, error is set (and value None) if it failed.
+start and end are monotonic times.
+"""
+Reading = namedtuple('Reading', 'name value start end error')
+
+
+class Driver:
+    """
+    Runs one sensor. The engine awaits read() over and over, it returns a reading
+    or None. failed() is called after read() raised.
+    """
+    def __init__(self, name, sensor):
+        self.name = name
+        self.sensor = sensor
+        self.failures = 0
+        self.errors = 0
+        self.reinits = 0
+        self.readings = 0
+        self.last_error = None
+
+    async def read(self, engine):
+        raise NotImplementedError
+
+    def failed(self):
+        pass
+
+
+class ExecutorDriver(Driver):
+    """
+    Any SensorBase sensor without a driver of its own: its blocking read() runs in the
+    engine's thread pool
+    """
+    async def read(self, engine):
+        return await engine.in_executor(self.sensor.read)
+
+
+class TemperatureDriver(Driver):
+    """
+    Waits on the loop for the 1-wire period (and for a conversion the other sensor
+    started), so the thread pool only runs the conversion and the w1_slave read
+    """
+    async def read(self, engine):
+        sensor = self.sensor
+        while True:
+            delay = sensor.ready_in()
+            if delay <= 0:
+                return await engine.in_executor(sensor.read)
+            await asyncio.sleep(min(delay, MAX_SLEEP))
+
+
+class PressureDriver(Driver):
+    """
+    Steps the MS5611 conversion state machine, sleeping on the loop while the ADC converts
+    and between readings if the sensor has a period
+    """
+    def __init__(self, name, sensor):
+        super().__init__(name, sensor)
+        self._nextRead = 0.0
+
+    async def read(self, engine):
+        sensor = self.sensor
+        period = sensor.period
+        waited = False
+        while period is not None:
+            delay = self._nextRead - time.perf_counter()
+            if delay <= 0:
+                break
+            await asyncio.sleep(min(delay, MAX_SLEEP))
+            waited = True
+            if sensor.period != period:
+                period = sensor.period
+                self._nextRead = time.perf_counter()
+        if waited:
+            """
+            The conversion started after the last reading is too old by now, start a fresh one
+            """
+            sensor.drop_conversion()
+        if period is not None:
+            self._nextRead = max(self._nextRead + period, time.perf_counter())
+        while True:
+            result = sensor.step()
+            if result is not None:
+                return result
+            await asyncio.sleep(sensor.ready_in())
+
+    def failed(self):
+        self.sensor.drop_conversion()
+
+
+class UVDriver(Driver):
+    """
+    Sleeps on the loop for the VEML6075 integration period, starting again if the
+    integration time is changed meanwhile
+    """
+    async def read(self, engine):
+        sensor = self.sensor
+        while True:
+            integration = sensor.integration_ms
+            ready = sensor.prepare()
+            while sensor.integration_ms == integration:
+                delay = ready - time.monotonic()
+                if delay <= 0:
+                    return sensor.measure()
+                await asyncio.sleep(min(delay, MAX_SLEEP))
+
+
+class GPSDriver(Driver):
+    """
+    Reads whatever the receiver has sent once the serial port is readable and returns
+    the fix when the parser has a new one. No new fix for SERIAL_TIMEOUT counts as a failure.
+    """
+    async def read(self, engine):
+        gps = self.sensor
+        if gps.ser is None:
+            await asyncio.sleep(REOPEN_INTERVAL)
+            if not await engine.in_executor(gps.open_port):
+                return None
+        deadline = time.monotonic() + SERIAL_TIMEOUT
+        heard = False
+        while True:
+            waiting = gps.ser.in_waiting
+            if waiting:
+                received = time.monotonic()
+                if gps.feed(gps.ser.read(waiting), received):
+                    return (gps.lat, gps.lon, gps.hzdil, gps.alt)
+                heard = True
+                continue
+            now = time.monotonic()
+            if now > deadline:
+                if heard:
+                    return None
+                raise IOError("Nothing from the GPS for {:g} s".format(SERIAL_TIMEOUT))
+            await self._readable(gps.ser, deadline - now)
+
+    async def _readable(self, ser, timeout):
+        try:
+            fd = ser.fileno()
+        except (AttributeError, OSError, ValueError):
+            await asyncio.sleep(POLL_INTERVAL)
+            return
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        loop.add_reader(fd, ready.set)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fd)
+
+
+class AsyncSensor:
+    """
+    What RUN sees of a sensor run by the engine: start() and stop() start and stop its
+    driver, data is the last reading (set by one of RUN's stages) and everything else
+    is the sensor's own, so set_period() etc. work as before.
+    """
+    def __init__(self, engine, name, sensor):
+        self.engine = engine
+        self.name = name
+        self.sensor = sensor
+        self.data = None
+
+    def start(self):
+        self.engine.start_driver(self.name)
+
+    def stop(self):
+        self.engine.stop_driver(self.name)
+
+    def __getattr__(self, attr):
+        return getattr(self.__dict__['sensor'], attr)
+
+    def __setattr__(self, attr, value):
+        if attr in ('engine', 'name', 'sensor', 'data'):
+            self.__dict__[attr] = value
+        else:
+            setattr(self.sensor, attr, value)
+
+
+class Engine:
+    """
+    attach() the sensors and add_stage() the consumers, then start() the loop thread.
+    Sensors are started and stopped through their AsyncSensor. workers threads run the
+    blocking reads, setup() and teardown(). A read that raises is
+    retried after a backoff doubling from backoff up to max_backoff, and after threshold
+    failures in a row the sensor is torn down and set up again.
+    """
+    def __init__(self, workers=2, threshold=5, backoff=0.1, max_backoff=30.0):
+        self.workers = workers
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.loop = None
+        self.drivers = {}
+        self.dropped = 0
+        self._stages = {}
+        self._queues = []
+        self._tasks = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='engine')
+        self._thread = None
+        self._ready = threading.Event()
+
+    def attach(self, name, sensor, driver=ExecutorDriver):
+        """Returns the AsyncSensor standing in for sensor"""
+        self.drivers[name] = driver(name, sensor)
+        return AsyncSensor(self, name, sensor)
+
+    def add_stage(self, name, func, maxsize=QUEUE_SIZE):
+        """func(reading) is called from the loop thread for every Reading, in order"""
+        self._stages[name] = (func, maxsize)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='engine', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        for name, (func, maxsize) in self._stages.items():
+            queue = asyncio.Queue(maxsize)
+            self._queues.append(queue)
+            self.loop.create_task(self._stage(name, func, queue))
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    def _call(self, coroutine, timeout=None):
+        """Runs a coroutine on the loop from another thread and waits for it"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def start_driver(self, name):
+        self._call(self._start(name))
+
+    def stop_driver(self, name, timeout=10.0):
+        try:
+            self._call(self._stop(name), timeout)
+        except Exception:
+            logging.exception("Error stopping {}".format(name))
+
+    async def _start(self, name):
+        if name not in self._tasks:
+            self._tasks[name] = self.loop.create_task(self._drive(self.drivers[name]))
+
+    async def _stop(self, name):
+        task = self._tasks.pop(name, None)
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await self.in_executor(self.drivers[name].sensor.teardown)
+
+    def stop(self):
+        """Stops any drivers still running, then the loop and the thread pool"""
+        if self.loop is None:
+            return
+        for name in list(self._tasks):
+            self.stop_driver(name)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+        self._executor.shutdown(wait=False)
+
+    async def in_executor(self, func, *args):
+        """Runs a blocking read, setup(), teardown() or the like in the thread pool"""
+        return await self.loop.run_in_executor(self._executor, func, *args)
+
+    async def _stage(self, name, func, queue):
+        while True:
+            reading = await queue.get()
+            try:
+                func(reading)
+            except Exception:
+                logging.exception("Error in the {} stage".format(name))
+
+    def _publish(self, reading):
+        for queue in self._queues:
+            try:
+                queue.put_nowait(reading)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def _drive(self, driver):
+        needs_setup = True
+        while True:
+            start = time.monotonic()
+            try:
+                if needs_setup:
+                    await self.in_executor(driver.sensor.setup)
+                    needs_setup = False
+                value = await driver.read(self)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                driver.failures += 1
+                driver.errors += 1
+                driver.last_error = repr(error)
+                self._publish(Reading(driver.name, None, start, time.monotonic(), driver.last_error))
+                try:
+                    driver.failed()
+                except Exception:
+                    logging.exception("Error resetting {}".format(driver.name))
+                if driver.failures == 1:
+                    LOG.warning("%s read failed, backing off", driver.name, exc_info=True)
+                if driver.failures % self.threshold == 0:
+                    LOG.warning("%s failing (%d in a row), re-initialising", driver.name, driver.failures)
+                    try:
+                        await self.in_executor(driver.sensor.teardown)
+                    except Exception:
+                        logging.exception("Error shutting down {}".format(driver.name))
+                    driver.reinits += 1
+                    needs_setup = True
+                await asyncio.sleep(min(self.backoff * 2 ** (driver.failures - 1), self.max_backoff))
+                continue
+            if value is not None:
+                if driver.failures >= self.threshold:
+                    LOG.info("%s recovered after %d failures", driver.name, driver.failures)
+                driver.failures = 0
+                driver.readings += 1
+            self._publish(Reading(driver.name, value, start, time.monotonic(), None))
+
+    def stats(self):
+        return {'threads': 1 + self.workers,
+                'dropped': self.dropped,
+                'drivers': {name: {'running': name in self._tasks,
+                                   'readings': driver.readings,
+                                   'errors': driver.errors,
+                                   'failures': driver.failures,
+                                   'reinits': driver.reinits,
+                                   'last_error': driver.last_error}
+                            for name, driver in self.drivers.items()}}
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+State checkpoint for a warm restart. A small fixed-layout file is memory
+mapped and updated in place every data tick with the last good readings, the
+sequence counters, the flight phase and the flight recording that is open.
+After a brown-out RUN reads it back and carries on with the same recording
+instead of starting a new flight from nothing.
+
+The file holds two slots which are written in turn, each with a generation
+number and a CRC, so a power cut halfway through an update leaves the other
+slot intact. load() returns the newest slot with a good CRC.
+
+Slot layout (little endian):
+    4s   magic b'DSCK'
+    H    version
+    B    flags (CLEAN_SHUTDOWN)
+    B    flight phase code
+    I    generation
+    d    UTC time of the update
+    B    time anchor source (index in SOURCES)
+    3x   padding
+    I    next science packet sequence number
+    I    next flight record sequence number
+    d    ground level from GPS, then from pressure (NaN if unknown)
+    d    each of READINGS (NaN if there wasn't one)
+    128s path of the flight recording
+    I    crc32 of everything before it
+"""
+import mmap
+import os
+import struct
+import zlib
+from collections import namedtuple
+from flightphase import PHASES, ASCENT, FLOAT, DESCENT
+import logging
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'DSCK'
+VERSION = 1
+NAN = float('nan')
+CLEAN_SHUTDOWN = 0x01
+"""
+Where the time anchor came from, the last known good readings and the flight phases that count as being in the air
+"""
+SOURCES = ('system', 'gps', 'checkpoint')
+READINGS = ('lat', 'lon', 'hzdil', 'alt', 'temp1', 'temp2', 'temp3', 'pressure', 'uva', 'uvb')
+IN_FLIGHT = (ASCENT, FLOAT, DESCENT)
+_SLOT = struct.Struct('<4sHBBId B3x II dd ' + 'd' * len(READINGS) + ' 128s')
+_CRC = struct.Struct('<I')
+SLOT_SIZE = _SLOT.size + _CRC.size
+
+State = namedtuple('State', 'generation flags phase time source packet_seq record_seq '
+                            'ground readings recorder')
+
+
+class Checkpoint:
+    """
+    The mapped checkpoint file. save() writes a State into the older slot, sync()
+    flushes the mapping to the SD card (the page cache survives a crash of the
+    program but not a power cut).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.generation = 0
+        self.saves = 0
+        self.syncs = 0
+        self._dirty = False
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 2 * SLOT_SIZE:
+                os.ftruncate(fd, 2 * SLOT_SIZE)
+            self._map = mmap.mmap(fd, 2 * SLOT_SIZE)
+        finally:
+            os.close(fd)
+
+    def _read_slot(self, slot):
+        offset = slot * SLOT_SIZE
+        raw = self._map[offset:offset + SLOT_SIZE]
+        if zlib.crc32(raw[:_SLOT.size]) != _CRC.unpack_from(raw, _SLOT.size)[0]:
+            return None
+        fields = _SLOT.unpack_from(raw)
+        magic, version, flags, phase, generation, written, source, packet_seq, record_seq = fields[:9]
+        if magic != MAGIC or version != VERSION:
+            return None
+        ground = {'gps': fields[9], 'baro': fields[10]}
+        readings = dict(zip(READINGS, fields[11:11 + len(READINGS)]))
+        recorder = fields[-1].rstrip(b'\0').decode()
+        return State(generation, flags, phase, written, SOURCES[source] if source < len(SOURCES) else 'system',
+                     packet_seq, record_seq, ground, readings, recorder)
+
+    def load(self):
+        """The newest good State in the file, None if there isn't one"""
+        states = [state for state in (self._read_slot(0), self._read_slot(1)) if state is not None]
+        if not states:
+            return None
+        state = max(states, key=lambda s: s.generation)
+        self.generation = state.generation
+        return state
+
+    def save(self, state):
+        """
+        Writes state (its generation is ignored) into the slot not holding the newest one.
+        NaN and None are both stored as NaN.
+        """
+        self.generation = (self.generation + 1) & 0xFFFFFFFF
+        readings = [NAN if state.readings.get(name) is None else state.readings[name] for name in READINGS]
+        ground = [NAN if state.ground.get(name) is None else state.ground[name] for name in ('gps', 'baro')]
+        source = SOURCES.index(state.source) if state.source in SOURCES else 0
+        offset = (self.generation % 2) * SLOT_SIZE
+        _SLOT.pack_into(self._map, offset, MAGIC, VERSION, state.flags, state.phase, self.generation,
+                        state.time, source, state.packet_seq & 0xFFFFFFFF, state.record_seq & 0xFFFFFFFF,
+                        *ground, *readings, state.recorder.encode()[:128])
+        _CRC.pack_into(self._map, offset + _SLOT.size, zlib.crc32(self._map[offset:offset + _SLOT.size]))
+        self.saves += 1
+        self._dirty = True
+
+    def sync(self):
+        if self._dirty:
+            self._map.flush()
+            self._dirty = False
+            self.syncs += 1
+
+    def close(self):
+        if self._map is not None:
+            self.sync()
+            self._map.close()
+            self._map = None
+
+
+def resumable(state, now, max_age, flight_max_age):
+    """
+    Whether a restart should carry on from state: not after a clean shutdown, and only if
+    the checkpoint is less than max_age seconds old, or flight_max_age if it was in the air.
+    Without a real time clock the system time comes back behind after a reboot, never ahead,
+    so a checkpoint from the future still resumes in the air but one that is really old (e.g.
+    a power cut at touchdown and a ground test days later) doesn't.
+    """
+    if state is None or state.flags & CLEAN_SHUTDOWN:
+        return False
+    age = now - state.time
+    if state.phase < len(PHASES) and PHASES[state.phase] in IN_FLIGHT:
+        return age < flight_max_age
+    return 0 <= age < max_age
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Radio downlink. Packets are handed to a sender thread so the loop never waits
+on the radio. Telemetry goes before science packets, the radio's minimum gap
+between packets is kept here (it used to be a time.sleep(3) in the loop), and
+if a newer packet of the same type arrives before the old one went out the
+old one is dropped, so the newest data is always what gets sent.
+"""
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+"""
+Packet types, in priority order (lowest goes first)
+"""
+TELEMETRY = 0
+SCIENCE = 1
+NAMES = {TELEMETRY: 'telemetry', SCIENCE: 'science'}
+
+
+class KindStats:
+    __slots__ = ('queued', 'sent', 'coalesced', 'errors', 'latency_total', 'latency_max')
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def as_dict(self):
+        return {'queued': self.queued, 'sent': self.sent, 'coalesced': self.coalesced,
+                'errors': self.errors,
+                'mean_latency': self.latency_total / self.sent if self.sent else 0.0,
+                'max_latency': self.latency_max}
+
+
+class Downlink:
+    """
+    Sends telemetry and science packets through a SatRadio from its own thread.
+    send_telemetry()/send_data_packet() take the same arguments as the radio's and return straight away.
+    The radio can be None to begin with (still starting up), packets are held until set_radio().
+    """
+    def __init__(self, radio, min_spacing=3.0):
+        self.radio = radio
+        self.min_spacing = min_spacing
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._lastSend = None
+        self._thread = None
+        self._stats = {kind: KindStats() for kind in NAMES}
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='downlink', daemon=True)
+        self._thread.start()
+
+    def set_radio(self, radio):
+        self.radio = radio
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _put(self, kind, payload):
+        with self._lock:
+            stats = self._stats[kind]
+            if kind in self._pending:
+                stats.coalesced += 1
+            stats.queued += 1
+            self._pending[kind] = (time.monotonic(), payload)
+        self._wake.set()
+
+    def send_telemetry(self, **telemetry):
+        """Queues a telemetry packet (keyword arguments for SatRadio.send_telemetry)"""
+        self._put(TELEMETRY, telemetry)
+
+    def send_data_packet(self, data):
+        """Queues a science data packet (bytes for SatRadio.send_data_packet)"""
+        self._put(SCIENCE, data)
+
+    def pending(self, kind):
+        """Whether a packet of kind is waiting to be sent"""
+        with self._lock:
+            return kind in self._pending
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def _take(self):
+        with self._lock:
+            if not self._pending:
+                return None, None, None
+            kind = min(self._pending)
+            queued, payload = self._pending.pop(kind)
+            return kind, queued, payload
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if not self._pending or self.radio is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            """
+            Keep the gap the radio needs since the last packet. A packet arriving in
+            the meantime can still jump the queue since the choice is made afterwards.
+            """
+            if self._lastSend is not None:
+                delay = self._lastSend + self.min_spacing - time.monotonic()
+                if delay > 0:
+                    self._stopped.wait(delay)
+                    continue
+            kind, queued, payload = self._take()
+            if kind is None:
+                continue
+            self._send(kind, queued, payload)
+
+    def _send(self, kind, queued, payload):
+        stats = self._stats[kind]
+        try:
+            if kind == TELEMETRY:
+                self.radio.send_telemetry(**payload)
+            else:
+                self.radio.send_data_packet(payload)
+            latency = time.monotonic() - queued
+            stats.sent += 1
+            stats.latency_total += latency
+            stats.latency_max = max(stats.latency_max, latency)
+        except Exception:
+            stats.errors += 1
+            logging.exception("Error sending {}".format(NAMES[kind]))
+        self._lastSend = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            out = {NAMES[kind]: stats.as_dict() for kind, stats in self._stats.items()}
+            out['depth'] = len(self._pending)
+        return out
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Flight phase detector. The vertical speed is the slope of a straight line
+fitted through the last WINDOW seconds of altitude, using the GPS altitude
+while it is fresh and the pressure altitude otherwise, and the phase only
+changes once the new one's condition has held for HOLD seconds:
+
+    pre_launch -> ascent -> float -> descent -> landed
+
+RUN uses the phase to pick the sampling and save rates in PHASE_RATES.
+"""
+import time
+from collections import deque
+import logging
+LOG = logging.getLogger(__name__)
+
+PRE_LAUNCH = 'pre_launch'
+ASCENT = 'ascent'
+FLOAT = 'float'
+DESCENT = 'descent'
+LANDED = 'landed'
+"""
+Numeric codes for the flight recording
+"""
+PHASES = (PRE_LAUNCH, ASCENT, FLOAT, DESCENT, LANDED)
+
+WINDOW = 60.0
+HOLD = 20.0
+"""
+Vertical speeds (m/s) and heights (m) the phases are told apart by
+"""
+CLIMB_RATE = 1.5
+SINK_RATE = -2.0
+STILL_RATE = 0.5
+LAUNCH_HEIGHT = 100.0
+FLOAT_HEIGHT = 5000.0
+GPS_MAX_AGE = 5.0
+
+
+def vertical_speed(points):
+    """Least squares slope (m/s) of (time, altitude) points, None if there aren't enough"""
+    n = len(points)
+    if n < 3:
+        return None
+    mt = sum(t for t, a in points) / n
+    ma = sum(a for t, a in points) / n
+    stt = sum((t - mt) ** 2 for t, a in points)
+    if stt <= 0:
+        return None
+    return sum((t - mt) * (a - ma) for t, a in points) / stt
+
+
+class PhaseDetector:
+    def __init__(self, phase=PRE_LAUNCH, window=WINDOW, hold=HOLD):
+        self.phase = phase
+        self.window = window
+        self.hold = hold
+        self.changed = time.monotonic()
+        self.ground = {}
+        self.speed = None
+        self.altitude = None
+        self._gps = deque()
+        self._baro = deque()
+        self._candidate = None
+        self._since = None
+
+    def _add(self, points, now, altitude):
+        points.append((now, altitude))
+        while points and points[0][0] < now - self.window:
+            points.popleft()
+
+    def _next(self, speed, height):
+        """The phase the current trend points to (may be the current one)"""
+        phase = self.phase
+        if phase == PRE_LAUNCH:
+            if speed > CLIMB_RATE or height > LAUNCH_HEIGHT:
+                return ASCENT
+        elif phase == ASCENT:
+            if speed < SINK_RATE:
+                return DESCENT
+            if abs(speed) < STILL_RATE and height > FLOAT_HEIGHT:
+                return FLOAT
+        elif phase == FLOAT:
+            if speed < SINK_RATE:
+                return DESCENT
+            if speed > CLIMB_RATE:
+                return ASCENT
+        elif phase == DESCENT:
+            if abs(speed) < STILL_RATE:
+                return LANDED
+        return phase
+
+    def update(self, now, gps_alt=None, gps_age=None, baro_alt=None):
+        """
+        Adds the latest altitudes and returns the new phase if it changed, otherwise None
+        """
+        if gps_alt is not None and (gps_age is None or gps_age < GPS_MAX_AGE):
+            self._add(self._gps, now, gps_alt)
+        if baro_alt is not None:
+            self._add(self._baro, now, baro_alt)
+        source = 'gps' if len(self._gps) >= 3 and self._gps[-1][0] >= now - GPS_MAX_AGE else 'baro'
+        points = self._gps if source == 'gps' else self._baro
+        if not points:
+            return None
+        self.altitude = points[-1][1]
+        self.speed = vertical_speed(points)
+        """
+        Ground level (for each source, they don't agree) follows the altitude until launch
+        """
+        if source not in self.ground or (self.phase == PRE_LAUNCH and self.speed is not None
+                                         and abs(self.speed) < STILL_RATE):
+            self.ground[source] = self.altitude
+        if self.speed is None:
+            return None
+        candidate = self._next(self.speed, self.altitude - self.ground[source])
+        if candidate == self.phase:
+            self._candidate = None
+            return None
+        if candidate != self._candidate:
+            self._candidate = candidate
+            self._since = now
+        if now - self._since < self.hold:
+            return None
+        LOG.info("Flight phase %s -> %s (%.1f m, %.2f m/s)", self.phase, candidate, self.altitude, self.speed)
+        self.phase = candidate
+        self.changed = now
+        self._candidate = None
+        return candidate
+
+    @property
+    def code(self):
+        return PHASES.index(self.phase)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Shared I2C bus. The pressure and UV sensors used to open their own SMBus(1)
+from separate threads, so one sensor's transfers could land in the middle of
+another's. Now there is one I2CBus per bus number which owns the SMBus, does
+every transaction under a lock and keeps per-device counts, latency and errors.
+"""
+import smbus
+import threading
+import time
+from contextlib import contextmanager
+import logging
+LOG = logging.getLogger(__name__)
+
+
+class DeviceStats:
+    """
+    Transaction figures for one device address
+    """
+    __slots__ = ('count', 'errors', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency, error):
+        self.count += 1
+        self.total += latency
+        if latency > self.max:
+            self.max = latency
+        if error:
+            self.errors += 1
+
+    def as_dict(self):
+        return {'count': self.count,
+                'errors': self.errors,
+                'error_rate': self.errors / self.count if self.count else 0.0,
+                'mean_ms': 1000 * self.total / self.count if self.count else 0.0,
+                'max_ms': 1000 * self.max}
+
+
+class I2CBus:
+    """
+    Owns one SMBus. The usual smbus calls are available and each one is a
+    single locked transaction. Use transaction() to do several calls to one
+    device without another sensor getting in between.
+    """
+    def __init__(self, busnum=1):
+        self.busnum = busnum
+        self._bus = None
+        self._users = 0
+        self._lock = threading.RLock()
+        self._stats = {}
+
+    def open(self):
+        with self._lock:
+            if self._bus is None:
+                self._bus = smbus.SMBus(self.busnum)
+            self._users += 1
+        return self
+
+    def close(self):
+        """The SMBus is only closed once the last sensor using it lets go"""
+        with self._lock:
+            self._users = max(0, self._users - 1)
+            if self._users == 0 and self._bus is not None:
+                try:
+                    self._bus.close()
+                finally:
+                    self._bus = None
+
+    def reset(self):
+        """Closes and reopens the SMBus, e.g. after the bus has wedged"""
+        with self._lock:
+            if self._bus is not None:
+                try:
+                    self._bus.close()
+                except Exception:
+                    LOG.exception("Error closing I2C bus %d", self.busnum)
+            self._bus = smbus.SMBus(self.busnum)
+
+    def _record(self, addr, latency, error):
+        stats = self._stats.get(addr)
+        if stats is None:
+            stats = self._stats[addr] = DeviceStats()
+        stats.add(latency, error)
+
+    @contextmanager
+    def transaction(self, addr):
+        """
+        Holds the bus for a batch of calls to one device and counts it as one transaction.
+        Yields the raw SMBus.
+        """
+        with self._lock:
+            if self._bus is None:
+                raise IOError("I2C bus {} is not open".format(self.busnum))
+            start = time.perf_counter()
+            error = True
+            try:
+                yield self._bus
+                error = False
+            finally:
+                self._record(addr, time.perf_counter() - start, error)
+
+    def _call(self, name, addr, *args):
+        with self.transaction(addr) as bus:
+            return getattr(bus, name)(addr, *args)
+
+    def read_byte(self, addr):
+        return self._call('read_byte', addr)
+
+    def write_byte(self, addr, value):
+        return self._call('write_byte', addr, value)
+
+    def read_byte_data(self, addr, register):
+        return self._call('read_byte_data', addr, register)
+
+    def write_byte_data(self, addr, register, value):
+        return self._call('write_byte_data', addr, register, value)
+
+    def read_word_data(self, addr, register):
+        return self._call('read_word_data', addr, register)
+
+    def write_word_data(self, addr, register, value):
+        return self._call('write_word_data', addr, register, value)
+
+    def read_i2c_block_data(self, addr, register, length=32):
+        return self._call('read_i2c_block_data', addr, register, length)
+
+    def write_i2c_block_data(self, addr, register, data):
+        return self._call('write_i2c_block_data', addr, register, data)
+
+    def stats(self):
+        """Per device transaction figures, keyed by hex address"""
+        with self._lock:
+            return {hex(addr): stats.as_dict() for addr, stats in self._stats.items()}
+
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+def get_bus(busnum=1):
+    """
+    Returns the shared I2CBus for a bus number. It still has to be open()ed.
+    """
+    with _buses_lock:
+        bus = _buses.get(busnum)
+        if bus is None:
+            bus = _buses[busnum] = I2CBus(busnum)
+        return bus
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Live instrumentation of the hot path. Every sensor's read() and every phase of
+the RUN tick is timed into a fixed-bucket latency histogram along with sample
+and error counts and the age of the last good sample, so a None in the
+telemetry can be told apart as slow, hung (stale) or failing. The snapshot is
+written to a status file and can also be served on a Unix socket.
+"""
+import bisect
+import json
+import os
+import socketserver
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+"""
+Upper bounds of the latency buckets in seconds, the last bucket is everything above
+"""
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+"""
+Health codes, one character per sensor in the telemetry health field
+"""
+OK = '.'
+STALE = 's'
+FAILING = 'e'
+NO_DATA = '-'
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper bound of the bucket the q-th percentile falls in"""
+        count = sum(self.counts)
+        if not count:
+            return None
+        rank = q / 100.0 * count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def as_dict(self):
+        count = sum(self.counts)
+        return {'count': count,
+                'mean': self.total / count if count else None,
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'max': self.max,
+                'buckets': list(self.counts)}
+
+
+class Probe:
+    """
+    Latency, counts and staleness of one sensor or tick phase. stale_after is
+    how old (seconds) the last good sample can get before it counts as stale.
+    """
+    __slots__ = ('name', 'stale_after', 'latency', 'samples', 'empty', 'errors',
+                 'first_sample', 'last_sample', 'last_error', 'in_call')
+
+    def __init__(self, name, stale_after=None):
+        self.name = name
+        self.stale_after = stale_after
+        self.latency = Histogram()
+        self.samples = 0
+        self.empty = 0
+        self.errors = 0
+        self.first_sample = None
+        self.last_sample = None
+        self.last_error = None
+        self.in_call = None
+
+    def age(self, now=None):
+        if self.last_sample is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.last_sample
+
+    def add(self, start, end, result):
+        """Counts one read() that ran from start to end and returned result"""
+        self.latency.add(end - start)
+        if result is None:
+            self.empty += 1
+        else:
+            self.samples += 1
+            self.last_sample = end
+            if self.first_sample is None:
+                self.first_sample = end
+
+    def error(self, when):
+        self.errors += 1
+        self.last_error = when
+
+    def health(self, now=None):
+        if self.last_sample is None:
+            return FAILING if self.errors else NO_DATA
+        if self.stale_after is not None and self.age(now) > self.stale_after:
+            return FAILING if self.last_error is not None and self.last_error > self.last_sample else STALE
+        return OK
+
+    def as_dict(self, now=None):
+        now = time.monotonic() if now is None else now
+        return {'latency': self.latency.as_dict(),
+                'samples': self.samples,
+                'empty': self.empty,
+                'errors': self.errors,
+                'age': self.age(now),
+                'busy_for': None if self.in_call is None else now - self.in_call,
+                'health': self.health(now)}
+
+
+class Instruments:
+    """
+    The registry of probes. instrument_sensor() wraps one sensor instance's read(),
+    timed() wraps any other function (the loop and the scheduled jobs).
+    """
+    def __init__(self):
+        self.sensors = {}
+        self.phases = {}
+        self.started = time.monotonic()
+
+    def _wrap(self, probe, func):
+        def timed(*args, **kwargs):
+            start = time.monotonic()
+            probe.in_call = start
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                end = time.monotonic()
+                probe.in_call = None
+                probe.latency.add(end - start)
+                probe.error(end)
+                raise
+            probe.in_call = None
+            probe.add(start, time.monotonic(), result)
+            return result
+        timed.__wrapped__ = func
+        return timed
+
+    def add_sensor(self, name, stale_after=None):
+        """A probe for a sensor whose readings are counted with probe.add() by the caller"""
+        probe = self.sensors[name] = Probe(name, stale_after)
+        return probe
+
+    def instrument_sensor(self, name, sensor, stale_after=None):
+        """Replaces sensor.read with a timed version, returns the sensor"""
+        probe = self.add_sensor(name, stale_after)
+        sensor.read = self._wrap(probe, sensor.read)
+        return sensor
+
+    def timed(self, name, func):
+        """Returns func timed as the tick phase name"""
+        probe = self.phases[name] = Probe(name)
+        return self._wrap(probe, func)
+
+    def health(self):
+        """One health character per sensor, in the order they were instrumented"""
+        now = time.monotonic()
+        return ''.join(probe.health(now) for probe in self.sensors.values())
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {'time': time.time(),
+                'uptime': now - self.started,
+                'health': self.health(),
+                'sensors': {name: probe.as_dict(now) for name, probe in self.sensors.items()},
+                'phases': {name: probe.as_dict(now) for name, probe in self.phases.items()}}
+
+
+def write_status(path, snapshot):
+    """Writes the snapshot as JSON, replacing the old file in one go so readers never see half of it"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(snapshot, file, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(json.dumps(self.server.instruments.snapshot(), sort_keys=True).encode() + b'\n')
+
+
+class StatusServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Sends the current snapshot as one line of JSON to anything that connects, e.g.
+        socat - UNIX-CONNECT:/tmp/dustinsat.sock
+    """
+    daemon_threads = True
+
+    def __init__(self, path, instruments):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.path = path
+        self.instruments = instruments
+        self._thread = None
+        super().__init__(path, _Handler)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='status', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
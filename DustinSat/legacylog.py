@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Post-flight loader for the text logs written before the binary flight
+recorder: the 11 data/<CHANNEL>_YYYY-mm-dd_HH-MM-SS.log files, one
+"HH:MM:SS.ffffffZ|value" line per reading ('None' for gaps), and the
+telemetry and D| lines in the main logs/DUSTNSAT_*.log. Whole files are split
+and converted with NumPy rather than parsed line by line, the channels are
+lined up on one timebase and the result is cached as .npy files that are
+memory mapped when loaded again.
+
+    flight = load_flight('/home/pi/MyTupperSatCode', '2020-04-23_11-34-15')
+    flights = load_all('/data/flights', processes=4)
+
+The times in the old files were the Pi's local time even though they end in
+Z; pass utc_offset (seconds) if the Pi was not on UTC.
+"""
+import calendar
+import glob
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import logging
+LOG = logging.getLogger(__name__)
+import numpy as np
+
+"""
+Data file prefix -> channel name (the same names as the flight recording columns)
+"""
+CHANNELS = {'LATITUDE': 'lat', 'LONGITUDE': 'lon', 'latdilution': 'hzdil', 'ALTITUDE1': 'alt',
+            'TEMP1': 'temp1', 'TEMP2': 'temp2', 'TEMP3': 'temp3', 'PRESSURE': 'pressure',
+            'ALTITUDE2': 'altitude2', 'UVA': 'uva', 'UVB': 'uvb'}
+"""
+Labels in the main log lines -> channel name. The same label means a different
+channel in the telemetry and D| lines.
+"""
+TELEMETRY_LABELS = {'Latitude': 'lat', 'Longitude': 'lon', 'Lat Dilution': 'hzdil', 'Altitude': 'alt',
+                    'Internal Temperature': 'temp1', 'External Temperature': 'temp2', 'Pressure': 'pressure'}
+SCIENCE_LABELS = {'Altitude': 'alt', 'Altitude2': 'altitude2', 'External Temperature': 'temp2',
+                  'Auxiliary Temperature': 'temp3', 'Pressure': 'pressure', 'UVA': 'uva', 'UVB': 'uvb'}
+STAMP = re.compile(r'(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})')
+STAMP_FORMAT = '%Y-%m-%d_%H-%M-%S'
+"""
+Files of one flight were opened one after the other, so their stamps can differ
+by a second or two; the main log was opened before the sensors were set up
+"""
+GROUP_GAP = 5
+MAIN_LOG_LEAD = 600
+CACHE = 'cache'
+
+
+def stamp_epoch(stamp):
+    return calendar.timegm(time.strptime(stamp, STAMP_FORMAT))
+
+
+def _digits(strings, width):
+    """Fixed width byte strings as an (n, width) array of digit values"""
+    return (np.asarray(strings, dtype='S{}'.format(width)).view(np.uint8).reshape(-1, width)
+            .astype(np.int64) - ord('0'))
+
+
+def time_of_day(strings):
+    """Seconds since midnight of 'HH:MM:SS.ffffff' byte strings"""
+    if not len(strings):
+        return np.zeros(0)
+    d = _digits(strings, 15)
+    seconds = (d[:, 0] * 10 + d[:, 1]) * 3600 + (d[:, 3] * 10 + d[:, 4]) * 60 + d[:, 6] * 10 + d[:, 7]
+    micro = np.zeros(len(d), dtype=np.int64)
+    for i in range(9, 15):
+        micro = micro * 10 + d[:, i]
+    return seconds + micro / 1e6
+
+
+def unroll_days(start, seconds):
+    """
+    Turns times of day into epoch seconds from a start time, adding a day every
+    time the clock goes back past midnight
+    """
+    midnight = start - start % 86400
+    first = seconds[:1]
+    if len(first) and first[0] < start - midnight - 43200:
+        midnight += 86400
+    days = np.concatenate([[0], np.cumsum(np.diff(seconds) < -43200)]) if len(seconds) else seconds
+    return midnight + days * 86400 + seconds
+
+
+def to_float(values):
+    """Byte strings to float64, 'None' and anything unreadable to NaN"""
+    values = np.char.strip(np.asarray(values, dtype='S'))
+    values = np.where((values == b'None') | (values == b''), b'nan', values)
+    try:
+        return values.astype(np.float64)
+    except ValueError:
+        out = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                out[i] = float(value)
+            except ValueError:
+                pass
+        return out
+
+
+def read_channel(path, start, utc_offset=0):
+    """
+    One data/<CHANNEL>_*.log file as (times, values) arrays. Lines that aren't
+    'HH:MM:SS.ffffffZ|value' (e.g. cut off by a power cut) are skipped.
+    """
+    with open(path, 'rb') as file:
+        lines = np.array(file.read().split(b'\n'))
+    lines = lines[(np.char.str_len(lines) > 17) & (np.char.find(lines, b'|') == 16)]
+    times = np.char.ljust(lines, 15).astype('S15')
+    values = np.char.partition(lines, b'|')[:, 2] if len(lines) else lines
+    seconds = time_of_day(times)
+    return unroll_days(start, seconds) - utc_offset, to_float(values)
+
+
+def read_main_log(path, utc_offset=0):
+    """
+    The telemetry ('Latitude: ...' or 'T|...') and science ('D|...') lines of a main log,
+    as {'telemetry': {'time': ..., channel: ...}, 'science': {...}}
+    """
+    with open(path, 'rb') as file:
+        lines = np.array(file.read().split(b'\n'))
+    position = np.char.find(lines, b" : b'")
+    message = np.char.partition(lines, b" : ")[:, 2] if len(lines) else lines
+    out = {}
+    for kind, prefixes, labels in (('telemetry', (b"b'Latitude:", b"b'T|"), TELEMETRY_LABELS),
+                                   ('science', (b"b'D|",), SCIENCE_LABELS)):
+        keep = np.zeros(len(lines), dtype=bool)
+        for prefix in prefixes:
+            keep |= np.char.startswith(message, prefix)
+        keep &= position > 0
+        stamps = lines[keep].astype('S23')
+        d = _digits(stamps, 23) if len(stamps) else np.zeros((0, 23), dtype=np.int64)
+        dates = [calendar.timegm((int(s[0:4]), int(s[5:7]), int(s[8:10]), 0, 0, 0, 0, 0, 0))
+                 for s in stamps.astype('U23')]
+        times = (np.array(dates, dtype=np.float64) + (d[:, 11] * 10 + d[:, 12]) * 3600
+                 + (d[:, 14] * 10 + d[:, 15]) * 60 + d[:, 17] * 10 + d[:, 18]
+                 + (d[:, 20] * 100 + d[:, 21] * 10 + d[:, 22]) / 1000.0) - utc_offset
+        columns = {name: [] for name in labels.values()}
+        for text in message[keep]:
+            text = text[2:].rstrip(b"'")
+            if text[1:2] == b'|':
+                text = text[2:]
+            fields = dict(field.partition(b': ')[::2] for field in text.split(b'|'))
+            for label, name in labels.items():
+                columns[name].append(fields.get(label.encode(), b'None'))
+        out[kind] = {'time': times}
+        for name, column in columns.items():
+            out[kind][name] = to_float(column)
+    return out
+
+
+def align(channels, step=None, tolerance=None):
+    """
+    Lines channels ({name: (times, values)}) up on one timebase. The timebase is a
+    regular grid every step seconds, or the times of the channel with the most
+    readings. Each channel takes its nearest reading within tolerance (half the
+    step by default), NaN otherwise.
+    """
+    channels = {name: (t, v) for name, (t, v) in channels.items() if len(t)}
+    if not channels:
+        return {'time': np.zeros(0)}
+    for name, (t, v) in channels.items():
+        if np.any(np.diff(t) < 0):
+            order = np.argsort(t, kind='stable')
+            channels[name] = (t[order], v[order])
+    if step is None:
+        base = max(channels.values(), key=lambda tv: len(tv[0]))[0]
+        spacing = np.median(np.diff(base)) if len(base) > 1 else 1.0
+    else:
+        first = min(t[0] for t, v in channels.values())
+        last = max(t[-1] for t, v in channels.values())
+        base = np.arange(first, last + step / 2.0, step)
+        spacing = step
+    tolerance = spacing / 2.0 if tolerance is None else tolerance
+    out = {'time': base}
+    for name, (t, v) in channels.items():
+        right = np.clip(np.searchsorted(t, base), 0, len(t) - 1)
+        left = np.clip(right - 1, 0, len(t) - 1)
+        nearest = np.where(np.abs(t[left] - base) <= np.abs(t[right] - base), left, right)
+        column = v[nearest].astype(np.float64)
+        column[np.abs(t[nearest] - base) > tolerance] = np.nan
+        out[name] = column
+    return out
+
+
+def find_flights(root):
+    """
+    {stamp: {'data': {channel: path}, 'log': path or None}} for every flight under root
+    (either a LOGDIR with data/ and logs/ in it, or a folder with the files themselves)
+    """
+    data = glob.glob(os.path.join(root, 'data', '*.log')) + glob.glob(os.path.join(root, '*.log'))
+    logs = glob.glob(os.path.join(root, 'logs', 'DUSTNSAT_*.log')) + glob.glob(os.path.join(root, 'DUSTNSAT_*.log'))
+    files = []
+    for path in data:
+        name = os.path.basename(path)
+        prefix = name.split('_', 1)[0]
+        match = STAMP.search(name)
+        if prefix in CHANNELS and match:
+            files.append((stamp_epoch(match.group(1)), match.group(1), CHANNELS[prefix], path))
+    files.sort()
+    flights = {}
+    current = None
+    last = None
+    for epoch, stamp, channel, path in files:
+        if current is None or epoch - last > GROUP_GAP:
+            current = flights[stamp] = {'start': epoch, 'data': {}, 'log': None}
+        current['data'][channel] = path
+        last = epoch
+    for path in logs:
+        match = STAMP.search(os.path.basename(path))
+        if not match:
+            continue
+        epoch = stamp_epoch(match.group(1))
+        after = [(flight['start'], stamp) for stamp, flight in flights.items()
+                 if 0 <= flight['start'] - epoch <= MAIN_LOG_LEAD and flights[stamp]['log'] is None]
+        if after:
+            flights[min(after)[1]]['log'] = path
+    return flights
+
+
+def parse_flight(files, utc_offset=0, step=None):
+    """Reads one flight's files (an entry from find_flights) into a dict of arrays"""
+    channels = {name: read_channel(path, files['start'], utc_offset) for name, path in files['data'].items()}
+    out = align(channels, step=step)
+    out['start'] = np.array(files['start'] - utc_offset, dtype=np.float64)
+    if files.get('log'):
+        try:
+            for kind, columns in read_main_log(files['log'], utc_offset).items():
+                for name, column in columns.items():
+                    out['{}_{}'.format(kind, name)] = column
+        except (OSError, ValueError, IndexError):
+            logging.exception("Could not read main log {}".format(files['log']))
+    return out
+
+
+def _cache_dir(root, stamp):
+    return os.path.join(root, CACHE, stamp)
+
+
+def _cache_fresh(folder, files):
+    sources = list(files['data'].values()) + ([files['log']] if files.get('log') else [])
+    try:
+        built = os.path.getmtime(os.path.join(folder, 'time.npy'))
+    except OSError:
+        return False
+    return all(os.path.getmtime(path) <= built for path in sources)
+
+
+def save_cache(folder, flight):
+    """One .npy file per array, so they can be memory mapped. time.npy goes last and marks it complete."""
+    os.makedirs(folder, exist_ok=True)
+    for name, array in flight.items():
+        if name != 'time':
+            np.save(os.path.join(folder, name + '.npy'), array)
+    np.save(os.path.join(folder, 'time.npy'), flight['time'])
+
+
+def load_cache(folder, mmap=True):
+    return {os.path.basename(path)[:-4]: np.load(path, mmap_mode='r' if mmap else None)
+            for path in glob.glob(os.path.join(folder, '*.npy'))}
+
+
+def save_npz(path, flight):
+    """The whole flight in one .npz file, e.g. to send to someone"""
+    np.savez_compressed(path, **flight)
+
+
+def load_flight(root, stamp=None, cache=True, utc_offset=0, step=None, mmap=True):
+    """
+    Loads one flight (the first one under root if stamp is None), from the cache under
+    root/cache if it is newer than the logs, parsing and caching it otherwise
+    """
+    flights = find_flights(root)
+    if not flights:
+        raise FileNotFoundError("No flight logs under {}".format(root))
+    stamp = min(flights) if stamp is None else stamp
+    files = flights[stamp]
+    folder = _cache_dir(root, stamp)
+    if cache and _cache_fresh(folder, files):
+        return load_cache(folder, mmap)
+    flight = parse_flight(files, utc_offset, step)
+    if cache:
+        try:
+            save_cache(folder, flight)
+        except OSError:
+            logging.exception("Could not cache flight {}".format(stamp))
+    return flight
+
+
+def _load_one(args):
+    root, stamp, cache, utc_offset, step = args
+    return stamp, load_flight(root, stamp, cache, utc_offset, step, mmap=False)
+
+
+def load_all(roots, processes=None, cache=True, utc_offset=0, step=None):
+    """
+    Loads every flight under one or more roots with a process pool.
+    Returns {stamp: flight}.
+    """
+    if isinstance(roots, str):
+        roots = [roots]
+    jobs = [(root, stamp, cache, utc_offset, step) for root in roots for stamp in find_flights(root)]
+    if processes == 1 or len(jobs) < 2:
+        return dict(map(_load_one, jobs))
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return dict(pool.map(_load_one, jobs))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Parse and cache the text logs of old flights")
+    parser.add_argument('roots', nargs='+', help="folders with data/ and logs/ in them")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--utc-offset', type=float, default=0, help="seconds the Pi's clock was ahead of UTC")
+    parser.add_argument('--step', type=float, default=None, help="regular timebase in seconds")
+    args = parser.parse_args()
+    for stamp, flight in sorted(load_all(args.roots, args.processes, not args.no_cache,
+                                         args.utc_offset, args.step).items()):
+        print("{}: {} samples, {}".format(stamp, len(flight['time']), ', '.join(sorted(flight))))
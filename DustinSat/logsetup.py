@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Asynchronous logging. Logging calls only put the record on a bounded queue and
+a QueueListener thread writes them to a size-rotated log file, so the SD card
+never holds up the thread that logs. Repeated exceptions (same logger, message,
+exception type and place it was raised) are collapsed, so a broken sensor
+produces one traceback every 10 s with a count instead of thousands.
+"""
+import atexit
+import queue
+import time
+import logging
+import logging.handlers
+
+FORMAT = '%(asctime)s %(name)s %(levelname)s : %(message)s'
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops records when the queue is full instead of blocking or erroring
+    """
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DuplicateFilter(logging.Filter):
+    """
+    Lets the first of a repeated exception through, then suppresses identical ones
+    for window seconds. The next one after that says how many were suppressed.
+    """
+    def __init__(self, window=10.0, max_keys=256):
+        super().__init__()
+        self.window = window
+        self.max_keys = max_keys
+        self._seen = {}
+
+    @staticmethod
+    def key(record):
+        exc_type, exc, tb = record.exc_info
+        while tb is not None and tb.tb_next is not None:
+            tb = tb.tb_next
+        where = (tb.tb_frame.f_code.co_filename, tb.tb_lineno) if tb is not None else None
+        return (record.name, str(record.msg), exc_type, where)
+
+    def filter(self, record):
+        if not record.exc_info or record.exc_info[0] is None:
+            return True
+        key = self.key(record)
+        now = time.monotonic()
+        entry = self._seen.get(key)
+        if entry is not None and now - entry[0] < self.window:
+            entry[1] += 1
+            return False
+        if entry is not None and entry[1]:
+            record.msg = "{} (same traceback x{} in last {:g} s)".format(record.msg, entry[1], self.window)
+        if len(self._seen) >= self.max_keys:
+            self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+        self._seen[key] = [now, 0]
+        return True
+
+
+def setup_logging(filename, level=logging.DEBUG, format=FORMAT, max_bytes=5*1024*1024,
+                  backup_count=10, queue_size=10000, window=10.0):
+    """
+    Replaces the root logger's handlers with the queue pipeline. Returns the
+    QueueListener, which is also stopped (flushing the queue) at exit.
+    """
+    q = queue.Queue(queue_size)
+    handler = DroppingQueueHandler(q)
+    handler.addFilter(DuplicateFilter(window))
+    filehandler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count)
+    filehandler.setFormatter(logging.Formatter(format))
+    listener = logging.handlers.QueueListener(q, filehandler, respect_handler_level=True)
+    listener.handler = handler
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener.start()
+    atexit.register(stop_logging, listener)
+    return listener
+
+
+def stop_logging(listener):
+    """Writes out whatever is still queued and stops the listener thread"""
+    if listener._thread is not None:
+        if listener.handler.dropped:
+            logging.warning("%d log records were dropped, the log queue was full", listener.handler.dropped)
+        listener.stop()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Streaming NMEA parser for the U-Blox7. Raw bytes from the serial port are fed
+in as they arrive, sentences are framed, the *hh checksum is checked and
+GGA/RMC/VTG/GSA are decoded straight into one Fix record.
+"""
+import re
+import logging
+LOG = logging.getLogger(__name__)
+
+KNOTS = 0.514444  # m/s
+MAX_BUFFER = 4096
+
+
+class Fix:
+    """
+    The latest fix. Fields are only overwritten when a sentence actually has
+    a value for them, so they fall back to the last known value (None to start with).
+    The position is only overwritten by a sentence with a valid fix, updates counts
+    the new fixes.
+    """
+    __slots__ = ('time', 'date', 'lat', 'lon', 'alt', 'hzdil', 'pdop', 'vdop',
+                 'quality', 'fix_type', 'sats', 'speed', 'course', 'valid',
+                 'h_acc', 'v_acc', 'updates')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.updates = 0
+
+    def as_tuple(self):
+        """The (lat, lon, hzdil, alt) tuple that GPS.read() has always returned"""
+        return (self.lat, self.lon, self.hzdil, self.alt)
+
+
+def to_degrees(value, hemisphere):
+    """
+    Converts NMEA ddmm.mmmm (or dddmm.mmmm) to decimal degrees, negative for S and W
+    """
+    value = float(value)
+    degrees = int(value // 100)
+    decdegrees = degrees + (value - 100 * degrees) / 60
+    if hemisphere in (b'S', b'W'):
+        return -decdegrees
+    return decdegrees
+
+
+def checksum(body):
+    """
+    XOR of all the bytes between $ and *. The bytes are turned into one integer
+    and folded in half until a single byte is left, which is a lot quicker than
+    looping over them one at a time.
+    """
+    if not body:
+        return 0
+    x = int.from_bytes(body, 'little')
+    width = 8 << (len(body) - 1).bit_length()
+    while width > 8:
+        width >>= 1
+        x = (x >> width) ^ (x & ((1 << width) - 1))
+    return x
+
+
+"""
+Only the fields that are used get captured, so no list of strings is built per sentence
+"""
+_GGA = re.compile(rb'GGA,([\d.]*),([\d.]*),([NS]?),([\d.]*),([EW]?),(\d*),(\d*),([\d.]*),(-?[\d.]*),')
+_RMC = re.compile(rb'RMC,([\d.]*),([AV]?),([\d.]*),([NS]?),([\d.]*),([EW]?),([\d.]*),([\d.]*),(\d*),')
+_VTG = re.compile(rb'VTG,([\d.]*),T?,[\d.]*,M?,([\d.]*),N?,([\d.]*),K?')
+_GSA = re.compile(rb'GSA,[AM]?,(\d?),(?:\d*,){12}([\d.]*),([\d.]*),([\d.]*)')
+
+
+class NMEAParser:
+    """
+    Incremental parser. feed() takes whatever bytes came off the port, which can
+    end part way through a sentence; the remainder is kept for the next call.
+    """
+    def __init__(self, fix=None):
+        self.fix = Fix() if fix is None else fix
+        self._buffer = bytearray()
+        self._handlers = {b'GGA': self._gga, b'RMC': self._rmc,
+                          b'VTG': self._vtg, b'GSA': self._gsa}
+        self.sentences = 0
+        self.checksum_errors = 0
+        self.parse_errors = 0
+        self.ignored = 0
+
+    def feed(self, data):
+        """
+        Parses every complete sentence in data (plus anything left over from last time).
+        Returns the number of new fixes, i.e. GGA sentences with a position and altitude.
+        """
+        buf = self._buffer
+        buf += data
+        updated = 0
+        pos = 0
+        while True:
+            start = buf.find(b'$', pos)
+            if start < 0:
+                pos = len(buf)
+                break
+            end = buf.find(b'\n', start)
+            if end < 0:
+                pos = start
+                break
+            pos = end + 1
+            if self.sentence(bytes(buf[start:end]).rstrip(b'\r')):
+                updated += 1
+        del buf[:pos]
+        if len(buf) > MAX_BUFFER:
+            """
+            Nothing but garbage without a line end, throw it away
+            """
+            del buf[:]
+        return updated
+
+    def sentence(self, line):
+        """
+        Checks and decodes one '$....*hh' sentence. Returns True if it completed a new fix.
+        The handlers raise ValueError if the sentence doesn't parse.
+        """
+        star = line.rfind(b'*')
+        if star < 0 or len(line) < star + 3:
+            self.parse_errors += 1
+            return False
+        body = line[1:star]
+        try:
+            expected = int(line[star + 1:star + 3], 16)
+        except ValueError:
+            self.parse_errors += 1
+            return False
+        if checksum(body) != expected:
+            self.checksum_errors += 1
+            return False
+        self.sentences += 1
+        handler = self._handlers.get(body[2:5])
+        if handler is None:
+            self.ignored += 1
+            return False
+        try:
+            if handler(body):
+                self.fix.updates += 1
+                return True
+        except ValueError:
+            self.parse_errors += 1
+        return False
+
+    def _gga(self, body):
+        m = _GGA.match(body, 2)
+        if m is None:
+            raise ValueError("bad GGA")
+        utc, lat, latd, lon, lond, quality, sats, hzdil, alt = m.groups()
+        fix = self.fix
+        if utc:
+            fix.time = utc.decode()
+        if quality:
+            fix.quality = int(quality)
+        if sats:
+            fix.sats = int(sats)
+        """
+        Quality 0 is no fix; the receiver keeps sending GGA, with empty (or stale) fields
+        """
+        if not (quality and fix.quality and lat and lon and alt):
+            return False
+        fix.lat = to_degrees(lat, latd)
+        fix.lon = to_degrees(lon, lond)
+        fix.alt = float(alt)
+        if hzdil:
+            fix.hzdil = float(hzdil)
+        return True
+
+    def _rmc(self, body):
+        m = _RMC.match(body, 2)
+        if m is None:
+            raise ValueError("bad RMC")
+        utc, status, lat, latd, lon, lond, speed, course, date = m.groups()
+        fix = self.fix
+        if utc:
+            fix.time = utc.decode()
+        if status:
+            fix.valid = status == b'A'
+        if fix.valid and lat and lon:
+            fix.lat = to_degrees(lat, latd)
+            fix.lon = to_degrees(lon, lond)
+        if speed:
+            fix.speed = float(speed) * KNOTS
+        if course:
+            fix.course = float(course)
+        if date:
+            fix.date = date.decode()
+        return False
+
+    def _vtg(self, body):
+        m = _VTG.match(body, 2)
+        if m is None:
+            raise ValueError("bad VTG")
+        course, knots, kmh = m.groups()
+        fix = self.fix
+        if course:
+            fix.course = float(course)
+        if kmh:
+            fix.speed = float(kmh) / 3.6
+        elif knots:
+            fix.speed = float(knots) * KNOTS
+        return False
+
+    def _gsa(self, body):
+        m = _GSA.match(body, 2)
+        if m is None:
+            raise ValueError("bad GSA")
+        fix_type, pdop, hzdil, vdop = m.groups()
+        fix = self.fix
+        if fix_type:
+            fix.fix_type = int(fix_type)
+        if pdop:
+            fix.pdop = float(pdop)
+        if hzdil:
+            fix.hzdil = float(hzdil)
+        if vdop:
+            fix.vdop = float(vdop)
+        return False
+
+    def stats(self):
+        return {'sentences': self.sentences, 'checksum_errors': self.checksum_errors,
+                'parse_errors': self.parse_errors, 'ignored': self.ignored}
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+1-wire bus master for the DS18B20s. Instead of every w1_slave read starting
+its own ~750ms conversion one after the other, one bulk conversion is
+triggered for every device on the master (therm_bulk_read) and each sensor
+then reads its result straight away.
+"""
+import os
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+W1_DEVICES = r'/sys/bus/w1/devices'
+"""
+DS18B20 conversion time (seconds) for each resolution in bits
+"""
+CONVERSION_TIMES = {9: 0.09375, 10: 0.1875, 11: 0.375, 12: 0.75}
+POLL_INTERVAL = 0.01
+
+
+class OneWireBus:
+    """
+    Shared by all the TemperatureSensors on one master. wait_for_conversion() is
+    called by each sensor before it reads: the first one in triggers a bulk
+    conversion and the others just pick up the same result. The lock only guards
+    the bookkeeping, the conversion and the wait for the period are done outside
+    it, and wake() (or a new period) cuts the waiting short.
+    """
+    def __init__(self, devices=W1_DEVICES, master='w1_bus_master1', resolution=12, period=None):
+        if resolution not in CONVERSION_TIMES:
+            raise ValueError("Resolution must be one of {} bits".format(sorted(CONVERSION_TIMES)))
+        self.devices = devices
+        self.master = os.path.join(devices, master)
+        self.resolution = resolution
+        """
+        Minimum time between bulk conversions, None converts back to back
+        """
+        self.period = period
+        self.generation = 0
+        self.conversions = 0
+        self._lastConversion = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._converting = False
+        self._ready = False
+        self.bulk = False
+
+    @property
+    def conversion_time(self):
+        return CONVERSION_TIMES[self.resolution]
+
+    def slaves(self):
+        """The device ids on this master"""
+        try:
+            with open(os.path.join(self.master, 'w1_master_slaves'), 'r') as file:
+                return [line.strip() for line in file if line.strip()]
+        except OSError:
+            return []
+
+    def setup(self):
+        """
+        Sets the resolution of every device and checks the kernel supports bulk reads.
+        Safe to call from every sensor, it only does anything once.
+        """
+        with self._lock:
+            if self._ready:
+                return
+            self.bulk = os.path.exists(os.path.join(self.master, 'therm_bulk_read'))
+            if not self.bulk:
+                LOG.warning("therm_bulk_read not available, sensors will convert one at a time")
+            for slave in self.slaves():
+                self._write_resolution(slave)
+            self._ready = True
+
+    def _write_resolution(self, slave):
+        try:
+            with open(os.path.join(self.devices, slave, 'resolution'), 'w') as file:
+                file.write('{}\n'.format(self.resolution))
+        except OSError:
+            LOG.warning("Could not set resolution of %s", slave)
+
+    def set_resolution(self, resolution):
+        """Changes the resolution of every device, trading conversion time for precision"""
+        if resolution not in CONVERSION_TIMES:
+            raise ValueError("Resolution must be one of {} bits".format(sorted(CONVERSION_TIMES)))
+        with self._lock:
+            self.resolution = resolution
+            for slave in self.slaves():
+                self._write_resolution(slave)
+
+    def _bulk_status(self):
+        """-1 while any device is still converting"""
+        with open(os.path.join(self.master, 'therm_bulk_read'), 'r') as file:
+            status = file.read().strip()
+        try:
+            return int(status)
+        except ValueError:
+            return 0
+
+    def set_period(self, period):
+        """Changes the minimum time between bulk conversions, taking effect straight away"""
+        self.period = period
+        self.wake()
+
+    def wake(self):
+        """
+        Wakes every sensor waiting for the period. Each wait is on the Event of the moment,
+        which is replaced rather than cleared so no waiter can miss it.
+        """
+        with self._lock:
+            wake, self._wake = self._wake, threading.Event()
+        wake.set()
+
+    def _delay(self):
+        """Seconds until the period allows the next conversion"""
+        if self.period is None or self._lastConversion is None:
+            return 0
+        return self._lastConversion + self.period - time.monotonic()
+
+    def wait_time(self, seen):
+        """
+        Roughly how long wait_for_conversion(seen) would wait for the period or for another
+        sensor's conversion, 0 if it would go straight on to converting (or return)
+        """
+        with self._lock:
+            if not self.bulk or self.generation > seen:
+                return 0
+            if self._converting:
+                return self.conversion_time
+            return max(0, self._delay())
+
+    def _convert(self):
+        with open(os.path.join(self.master, 'therm_bulk_read'), 'w') as file:
+            file.write('trigger\n')
+        time.sleep(self.conversion_time)
+        deadline = time.monotonic() + self.conversion_time
+        while self._bulk_status() == -1 and time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+        self.conversions += 1
+
+    def wait_for_conversion(self, seen, stopping=None):
+        """
+        Makes sure there is a conversion newer than generation 'seen' and returns
+        its generation, or None if stopping() says the sensor is stopping. Without
+        bulk read support this does nothing and w1_slave converts on read like before.
+        """
+        if not self.bulk:
+            return seen + 1
+        while True:
+            if stopping is not None and stopping():
+                return None
+            with self._lock:
+                if self.generation > seen:
+                    return self.generation
+                wake = self._wake
+                if self._converting:
+                    """
+                    Another sensor is converting, it wakes everyone when the result is ready
+                    """
+                    delay = 2 * self.conversion_time
+                else:
+                    delay = self._delay()
+                    if delay <= 0:
+                        self._converting = True
+                        self._lastConversion = time.monotonic()
+            if delay <= 0:
+                return self._converted()
+            wake.wait(delay)
+
+    def _converted(self):
+        """
+        Runs the conversion this thread claimed, then publishes the new generation
+        """
+        try:
+            self._convert()
+        except OSError:
+            logging.exception("1-wire bulk conversion error")
+            time.sleep(self.conversion_time)
+        finally:
+            with self._lock:
+                self.generation += 1
+                self._converting = False
+                generation = self.generation
+                wake, self._wake = self._wake, threading.Event()
+            wake.set()
+        return generation
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Binary science packet codec. The old science packet was an ASCII string that
+spent most of the radio payload on labels. A packet now holds a short time
+series of samples packed as fixed-point integers, each one delta encoded
+against the value before it (across packets too), with a bitmask per sample
+for missing fields. Every KEYFRAME_EVERY packets is a keyframe that does not
+depend on earlier packets, so the ground can pick up again after a lost packet.
+A packet that replaces one the downlink never sent is made a keyframe too.
+
+Packet layout:
+    B   version
+    B   flags (bit 0 keyframe)
+    H   packet sequence number
+    I   t0, unix seconds
+    B   number of samples
+    then per sample:
+        varint  time step in 0.1 s (from t0 for the first sample, from the previous sample after that)
+        B/H     bitmask of fields present (1 byte for up to 8 fields)
+        varint  zigzag delta for each field present, in field order
+
+The same module decodes packets on the ground.
+"""
+import struct
+import logging
+LOG = logging.getLogger(__name__)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VERSION = 1
+"""
+Fields in packet order with the fixed-point scale (value = integer * scale)
+"""
+SCHEMAS = {
+    1: [('alt', 0.1), ('altitude2', 0.1), ('temp2', 0.01), ('temp3', 0.01),
+        ('pressure', 0.01), ('uva', 0.01), ('uvb', 0.01)],
+}
+MAX_PACKET = 60
+MAX_SAMPLES = 16
+KEYFRAME_EVERY = 5
+FLAG_KEYFRAME = 0x01
+TIME_SCALE = 10
+_HEADER = struct.Struct('<BBHIB')
+
+
+def put_varint(out, value):
+    """Appends an unsigned LEB128 varint to a bytearray"""
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def get_varint(data, pos):
+    """Reads an unsigned LEB128 varint, returns (value, new position)"""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def zigzag(n):
+    return (n << 1) if n >= 0 else ((-n) << 1) - 1
+
+
+def unzigzag(n):
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+
+class PacketEncoder:
+    """
+    Collects samples with add() and packs as many of the newest ones as fit
+    into MAX_PACKET bytes with encode().
+    """
+    def __init__(self, version=VERSION, max_size=MAX_PACKET, max_samples=MAX_SAMPLES, keyframe_every=KEYFRAME_EVERY):
+        self.version = version
+        self.fields = SCHEMAS[version]
+        self.max_size = max_size
+        self.max_samples = max_samples
+        self.keyframe_every = keyframe_every
+        self.seq = 0
+        self._samples = []
+        self._reference = [0] * len(self.fields)
+        self._forceKeyframe = False
+        self._maskSize = 1 if len(self.fields) <= 8 else 2
+
+    def add(self, timestamp, values):
+        """Adds a sample. values is a dict of field name to value, None if missing."""
+        row = []
+        for name, scale in self.fields:
+            value = values.get(name)
+            if value is None or value != value:
+                row.append(None)
+            else:
+                row.append(int(round(value / scale)))
+        self._samples.append((timestamp, row))
+        if len(self._samples) > self.max_samples:
+            del self._samples[0]
+
+    def force_keyframe(self):
+        """
+        Makes the next packet a keyframe, e.g. after a restart or when the packet before
+        it was never sent. The sequence numbers carry on.
+        """
+        self._forceKeyframe = True
+
+    def _pack(self, samples, keyframe):
+        reference = [0] * len(self.fields) if keyframe else list(self._reference)
+        t0 = int(samples[0][0])
+        out = bytearray(_HEADER.pack(self.version, FLAG_KEYFRAME if keyframe else 0,
+                                     self.seq & 0xFFFF, t0, len(samples)))
+        last = t0 * TIME_SCALE
+        for timestamp, row in samples:
+            ticks = int(round(timestamp * TIME_SCALE))
+            put_varint(out, max(0, ticks - last))
+            last = max(last, ticks)
+            mask = 0
+            deltas = bytearray()
+            for i, value in enumerate(row):
+                if value is not None:
+                    mask |= 1 << i
+                    put_varint(deltas, zigzag(value - reference[i]))
+                    reference[i] = value
+            out += mask.to_bytes(self._maskSize, 'little')
+            out += deltas
+        return bytes(out), reference
+
+    def encode(self):
+        """
+        Returns the next packet, or None if there are no samples. Samples that
+        didn't fit (the oldest ones) are dropped.
+        """
+        if not self._samples:
+            return None
+        keyframe = self._forceKeyframe or self.seq % self.keyframe_every == 0
+        samples = self._samples
+        while True:
+            packet, reference = self._pack(samples, keyframe)
+            if len(packet) <= self.max_size or len(samples) == 1:
+                break
+            samples = samples[1:]
+        if len(packet) > self.max_size:
+            LOG.warning("Science packet is %d bytes, more than %d", len(packet), self.max_size)
+        self._reference = reference
+        self._forceKeyframe = False
+        self._samples = []
+        self.seq += 1
+        return packet
+
+
+class PacketDecoder:
+    """
+    Ground side decoder. Packets must be fed in the order they were sent; after
+    a missing packet, deltas can't be decoded until the next keyframe. The reference
+    and sequence number only move on once a packet has decoded, so a corrupt packet
+    counts as lost.
+    """
+    def __init__(self):
+        self._reference = {}
+        self._lastSeq = None
+        self.lost = 0
+        self.skipped = 0
+
+    def decode(self, packet):
+        """
+        Returns (timestamps, rows, fields) for one packet, rows being lists of
+        floats (None where missing). Returns None if the packet can't be decoded.
+        """
+        version, flags, seq, t0, count = _HEADER.unpack_from(packet)
+        fields = SCHEMAS.get(version)
+        if fields is None:
+            raise ValueError("Unknown science packet version {}".format(version))
+        keyframe = flags & FLAG_KEYFRAME
+        if self._lastSeq is not None and seq != (self._lastSeq + 1) & 0xFFFF:
+            self.lost += (seq - self._lastSeq - 1) & 0xFFFF
+            self._reference.pop(version, None)
+        if keyframe:
+            reference = [0] * len(fields)
+        elif version in self._reference:
+            reference = list(self._reference[version])
+        else:
+            self._lastSeq = seq
+            self.skipped += 1
+            return None
+        maskSize = 1 if len(fields) <= 8 else 2
+        pos = _HEADER.size
+        last = t0 * TIME_SCALE
+        timestamps = []
+        rows = []
+        for _ in range(count):
+            step, pos = get_varint(packet, pos)
+            last += step
+            timestamps.append(last / TIME_SCALE)
+            mask = int.from_bytes(packet[pos:pos + maskSize], 'little')
+            pos += maskSize
+            row = []
+            for i, (name, scale) in enumerate(fields):
+                if mask & (1 << i):
+                    delta, pos = get_varint(packet, pos)
+                    reference[i] += unzigzag(delta)
+                    row.append(reference[i] * scale)
+                else:
+                    row.append(None)
+            rows.append(row)
+        self._lastSeq = seq
+        self._reference[version] = reference
+        return timestamps, rows, [name for name, scale in fields]
+
+
+def decode_flight(packets):
+    """
+    Decodes a whole flight's received packets (in order) into one dict of
+    NumPy arrays: 'time' plus one array per field, NaN where missing.
+    Packets from different schema versions are merged by field name.
+    """
+    if np is None:
+        raise ImportError("numpy is needed to decode a flight")
+    decoder = PacketDecoder()
+    times = []
+    columns = {}
+    count = 0
+    for packet in packets:
+        try:
+            decoded = decoder.decode(packet)
+        except (ValueError, IndexError, struct.error):
+            LOG.warning("Could not decode science packet %r", bytes(packet[:8]))
+            continue
+        if decoded is None:
+            continue
+        timestamps, rows, names = decoded
+        for i, name in enumerate(names):
+            column = columns.setdefault(name, [float('nan')] * count)
+            column.extend(float('nan') if row[i] is None else row[i] for row in rows)
+        count += len(timestamps)
+        times.extend(timestamps)
+        for column in columns.values():
+            column.extend([float('nan')] * (count - len(column)))
+    out = {'time': np.array(times, dtype=np.float64)}
+    for name, column in columns.items():
+        out[name] = np.array(column, dtype=np.float64)
+    out['lost'] = decoder.lost
+    out['skipped'] = decoder.skipped
+    return out
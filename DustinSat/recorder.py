@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Flight recorder. Replaces the eleven per-field text logs with one binary file
+per flight: a header describing the columns followed by one fixed-width
+record per data tick (sequence number, timestamp, packed float32/float64
+columns with NaN where there was no reading, CRC32). Records are written by a
+write-behind thread. A torn tail after a power cut is found by the sequence
+numbers and CRCs and cut off by recover(). load() maps the file straight into
+NumPy arrays.
+
+Header layout (little endian):
+    4s   magic b'DSFR'
+    H    version
+    H    number of columns
+    I    record size in bytes
+    d    start time (unix seconds)
+    then per column: 16s name, 1s struct type code ('f' or 'd')
+
+Record layout: I seq, d time, the columns, I crc32 of everything before it.
+"""
+import os
+import struct
+import time
+import zlib
+from writebehind import WriteBehind
+import logging
+LOG = logging.getLogger(__name__)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'DSFR'
+VERSION = 2
+NAN = float('nan')
+_HEADER = struct.Struct('<4sHHId')
+_COLUMN = struct.Struct('<16s1s')
+TYPES = ('f', 'd')
+
+
+class Schema:
+    """
+    The column names and types of a recording. Every record starts with a
+    uint32 'seq' and a float64 'time' column and ends with a uint32 'crc', 
+    which are not listed in columns.
+    """
+    def __init__(self, columns):
+        for name, code in columns:
+            if code not in TYPES:
+                raise ValueError("Column {} must be one of {}".format(name, TYPES))
+            if len(name.encode()) > 16:
+                raise ValueError("Column name {} is longer than 16 bytes".format(name))
+        self.columns = list(columns)
+        self.names = [name for name, code in self.columns]
+        self.record = struct.Struct('<Id' + ''.join(code for name, code in self.columns) + 'I')
+        self.body = struct.Struct(self.record.format[:-1])
+
+    @property
+    def header_size(self):
+        return _HEADER.size + _COLUMN.size * len(self.columns)
+
+    def pack_header(self, start):
+        out = [_HEADER.pack(MAGIC, VERSION, len(self.columns), self.record.size, start)]
+        out += [_COLUMN.pack(name.encode(), code.encode()) for name, code in self.columns]
+        return b''.join(out)
+
+    def dtype(self):
+        """The matching NumPy record dtype (packed, no padding)"""
+        codes = {'f': '<f4', 'd': '<f8'}
+        return np.dtype([('seq', '<u4'), ('time', '<f8')] +
+                        [(name, codes[code]) for name, code in self.columns] + [('crc', '<u4')])
+
+    def valid(self, raw, seq=None):
+        """Checks a packed record's CRC (and that it has the expected sequence number)"""
+        body = raw[:-4]
+        if zlib.crc32(body) != struct.unpack_from('<I', raw, len(body))[0]:
+            return False
+        return seq is None or struct.unpack_from('<I', raw)[0] == seq
+
+
+def read_header(file):
+    """
+    Reads the header from an open file. Returns (schema, start time).
+    """
+    raw = file.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError("Not a flight recording, header is truncated")
+    magic, version, ncols, recsize, start = _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError("Not a flight recording")
+    if version != VERSION:
+        raise ValueError("Unsupported flight recording version {}".format(version))
+    columns = []
+    for _ in range(ncols):
+        name, code = _COLUMN.unpack(file.read(_COLUMN.size))
+        columns.append((name.rstrip(b'\0').decode(), code.decode()))
+    schema = Schema(columns)
+    if schema.record.size != recsize:
+        raise ValueError("Record size in header does not match the columns")
+    return schema, start
+
+
+def _valid_count(file, schema, count):
+    """
+    Number of good records at the start of the file, working back from the end
+    until a record has a good CRC and follows on from the one before it.
+    """
+    size = schema.record.size
+    while count > 0:
+        file.seek(schema.header_size + (count - 1) * size)
+        last = file.read(size)
+        if schema.valid(last):
+            if count == 1:
+                break
+            seq = struct.unpack_from('<I', last)[0]
+            file.seek(schema.header_size + (count - 2) * size)
+            if schema.valid(file.read(size), (seq - 1) & 0xFFFFFFFF):
+                break
+        count -= 1
+    return count
+
+
+def recover(path):
+    """
+    Cuts off a torn or corrupt tail (from a power cut mid-write) so the file can be
+    appended to again. Returns (schema, start time, number of records, next sequence number).
+    """
+    with open(path, 'r+b') as file:
+        schema, start = read_header(file)
+        size = os.path.getsize(path)
+        count = _valid_count(file, schema, (size - schema.header_size) // schema.record.size)
+        end = schema.header_size + count * schema.record.size
+        if end != size:
+            LOG.warning("Truncating %d bytes of torn data from %s", size - end, path)
+            file.truncate(end)
+        nextseq = 0
+        if count:
+            file.seek(end - schema.record.size)
+            nextseq = struct.unpack_from('<I', file.read(4))[0] + 1
+    return schema, start, count, nextseq
+
+
+class FlightRecorder:
+    """
+    Appends one record per tick to a flight recording. The writes are done by a
+    WriteBehind thread, see there for what the flush/fsync settings mean. With
+    resume=True an existing recording at path is recovered and appended to
+    (ValueError if its columns are different), the sequence numbers carry on.
+    """
+    def __init__(self, path, columns, start=None, flush_interval=5.0, flush_bytes=4096, fsync_interval=20.0,
+                 resume=False):
+        self.path = path
+        self.schema = Schema(columns)
+        self.records = 0
+        self.bytes = 0
+        self.seq = 0
+        self.resumed = None
+        self._index = {name: i for i, name in enumerate(self.schema.names)}
+        if resume and os.path.exists(path):
+            schema, start, count, nextseq = recover(path)
+            if schema.columns != self.schema.columns:
+                raise ValueError("{} has different columns, it can't be resumed".format(path))
+            self.seq = nextseq
+            self.resumed = count
+            LOG.info("Resuming %s after %d records", path, count)
+        else:
+            with open(path, 'wb') as file:
+                file.write(self.schema.pack_header(time.time() if start is None else start))
+                file.flush()
+                os.fsync(file.fileno())
+        self._writer = WriteBehind(path, flush_interval, flush_bytes, fsync_interval)
+
+    def pack(self, timestamp, values):
+        """
+        Packs one record with the next sequence number. values is a dict of column 
+        name to value (missing names and None are written as NaN).
+        """
+        row = [NAN] * len(self._index)
+        for name, value in values.items():
+            i = self._index.get(name)
+            if i is not None and value is not None:
+                row[i] = value
+        body = self.schema.body.pack(self.seq, timestamp, *row)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return body + struct.pack('<I', zlib.crc32(body))
+
+    def record(self, timestamp, values):
+        """Queues one record to be written"""
+        data = self.pack(timestamp, values)
+        self._writer.write(data)
+        self.records += 1
+        self.bytes += len(data)
+
+    def flush(self):
+        """Writes and fsyncs everything queued so far"""
+        self._writer.flush()
+
+    def stats(self):
+        return dict(self._writer.stats(), records=self.records)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def iter_records(path):
+    """
+    Yields records without needing NumPy. The first item yielded is the schema, 
+    then a (seq, time, values..., crc) tuple per complete record with a good CRC.
+    """
+    with open(path, 'rb') as file:
+        schema, start = read_header(file)
+        yield schema
+        size = schema.record.size
+        while True:
+            raw = file.read(size)
+            if len(raw) < size:
+                break
+            if schema.valid(raw):
+                yield schema.record.unpack(raw)
+
+
+def load(path):
+    """
+    Memory-maps a flight recording. Returns a dict of column name to NumPy array
+    (including 'seq', 'time' and 'crc'), plus the start time under 'start'. A torn 
+    tail is left out but the file isn't changed, use recover() for that.
+    """
+    if np is None:
+        raise ImportError("numpy is needed to load flight recordings")
+    with open(path, 'rb') as file:
+        schema, start = read_header(file)
+        count = (os.path.getsize(path) - schema.header_size) // schema.record.size
+        count = _valid_count(file, schema, count)
+    out = {'start': start}
+    if count <= 0:
+        dtype = schema.dtype()
+        for name in dtype.names:
+            out[name] = np.empty(0, dtype=dtype[name])
+        return out
+    records = np.memmap(path, dtype=schema.dtype(), mode='r',
+                        offset=schema.header_size, shape=(count,))
+    for name in records.dtype.names:
+        out[name] = records[name]
+    return out
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Per-sensor ring buffers. Every reading a sensor thread produces goes into a
+fixed size, preallocated array (no objects per reading) and into running
+min/max/mean/std/count aggregates for the current save window (Welford's
+method, so nothing has to be summed up at save time). Before this the loop
+only saw the latest value every 2 s and the rest were thrown away.
+"""
+import math
+import threading
+import time
+from array import array
+import logging
+LOG = logging.getLogger(__name__)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NAN = float('nan')
+
+
+class Window:
+    """
+    Aggregates for one save window, per field: count, mean, std, min and max.
+    Fields with no readings in the window have a count of 0 and NaN for the rest.
+    """
+    __slots__ = ('fields', 'samples', 'count', 'mean', 'std', 'min', 'max', 'start', 'end')
+
+    def __init__(self, fields, samples, count, mean, m2, low, high, start, end):
+        self.fields = fields
+        self.samples = samples
+        self.count = count
+        self.mean = [mean[i] if count[i] else NAN for i in range(len(fields))]
+        self.std = [math.sqrt(m2[i] / count[i]) if count[i] else NAN for i in range(len(fields))]
+        self.min = [low[i] if count[i] else NAN for i in range(len(fields))]
+        self.max = [high[i] if count[i] else NAN for i in range(len(fields))]
+        self.start = start
+        self.end = end
+
+    def as_values(self):
+        """
+        Flattened into a values dict: field (the mean), field_min, field_max, field_std.
+        Fields without readings are left out.
+        """
+        out = {}
+        for i, name in enumerate(self.fields):
+            if self.count[i]:
+                out[name] = self.mean[i]
+                out[name + '_min'] = self.min[i]
+                out[name + '_max'] = self.max[i]
+                out[name + '_std'] = self.std[i]
+        return out
+
+
+class RingBuffer:
+    """
+    The last capacity readings of a sensor with fields numeric fields each, plus the
+    monotonic time of each reading. One thread appends, any thread can take_window().
+    """
+    def __init__(self, fields, capacity=4096):
+        self.fields = tuple(fields)
+        self.width = len(self.fields)
+        self.capacity = capacity
+        self._data = array('d', [NAN]) * (capacity * self.width)
+        self._times = array('d', [NAN]) * capacity
+        self.total = 0
+        self._lock = threading.Lock()
+        self._reset(time.monotonic())
+
+    def _reset(self, now):
+        width = self.width
+        self._count = array('L', [0]) * width
+        self._mean = array('d', [0.0]) * width
+        self._m2 = array('d', [0.0]) * width
+        self._min = array('d', [math.inf]) * width
+        self._max = array('d', [-math.inf]) * width
+        self._samples = 0
+        self._windowStart = now
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, timestamp, values):
+        """Adds one reading, values in field order (None or NaN for missing)"""
+        with self._lock:
+            slot = self.total % self.capacity
+            self._times[slot] = timestamp
+            base = slot * self.width
+            count, mean, m2, low, high = self._count, self._mean, self._m2, self._min, self._max
+            for i, value in enumerate(values):
+                if value is None or value != value:
+                    self._data[base + i] = NAN
+                    continue
+                self._data[base + i] = value
+                n = count[i] + 1
+                count[i] = n
+                delta = value - mean[i]
+                mean[i] += delta / n
+                m2[i] += delta * (value - mean[i])
+                if value < low[i]:
+                    low[i] = value
+                if value > high[i]:
+                    high[i] = value
+            self._samples += 1
+            self.total += 1
+
+    def take_window(self, now=None):
+        """Returns the aggregates since the last call and starts a new window"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            window = Window(self.fields, self._samples, list(self._count), self._mean, self._m2,
+                            self._min, self._max, self._windowStart, now)
+            self._reset(now)
+        return window
+
+    def latest(self, n=None):
+        """
+        The last n readings (all that are kept if None), oldest first, as
+        (times, {field: values}). NumPy arrays if NumPy is there, lists otherwise.
+        """
+        with self._lock:
+            size = len(self) if n is None else min(n, len(self))
+            first = self.total - size
+            slots = [(first + k) % self.capacity for k in range(size)]
+            times = [self._times[slot] for slot in slots]
+            columns = {name: [self._data[slot * self.width + i] for slot in slots]
+                       for i, name in enumerate(self.fields)}
+        if np is not None:
+            return np.array(times), {name: np.array(column) for name, column in columns.items()}
+        return times, columns
+
+
+def buffered(sensor, buffer, extract):
+    """
+    Replaces sensor.read with a version that also appends every reading to the
+    buffer. extract turns a read() result into a tuple in the buffer's field order,
+    or None to leave it out (e.g. a repeat of the last reading). Returns the sensor.
+    """
+    read = sensor.read
+
+    def read_buffered():
+        value = read()
+        if value is not None:
+            try:
+                values = extract(value)
+                if values is not None:
+                    buffer.append(time.monotonic(), values)
+            except Exception:
+                logging.exception("Error buffering a reading")
+        return value
+    read_buffered.__wrapped__ = read
+    sensor.read = read_buffered
+    return sensor
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Timestamped samples. Each sensor's read() result is wrapped in a Sample with
+the monotonic time it was captured and a sequence number, so the loop knows
+how old every value is and whether it is new. Wall clock (UTC) time comes
+from one TimeAnchor, a (monotonic, UTC) pair taken from the system clock and
+corrected from GPS time once there is a fix, instead of calling datetime for
+every value.
+"""
+import calendar
+import time
+from datetime import datetime, timezone
+import logging
+LOG = logging.getLogger(__name__)
+
+"""
+GPS time only replaces the anchor if it disagrees by more than this (seconds),
+so serial jitter doesn't make the UTC time jump about
+"""
+RESYNC_THRESHOLD = 0.5
+
+
+class Sample:
+    __slots__ = ('value', 'monotonic', 'seq')
+
+    def __init__(self, value, monotonic, seq):
+        self.value = value
+        self.monotonic = monotonic
+        self.seq = seq
+
+    def age(self, now):
+        return now - self.monotonic
+
+    def __repr__(self):
+        return 'Sample({!r}, {:.3f}, {})'.format(self.value, self.monotonic, self.seq)
+
+
+def sampled(sensor):
+    """
+    Replaces sensor.read with a version returning a Sample (or None when read()
+    returns None), so sensor.data holds the last Sample. Returns the sensor.
+    read() has to return None when it has nothing new (e.g. the GPS without a new
+    fix), anything else gets a new capture time and sequence number.
+    """
+    read = sensor.read
+    seq = [0]
+
+    def read_sample():
+        value = read()
+        if value is None:
+            return None
+        seq[0] += 1
+        return Sample(value, time.monotonic(), seq[0])
+    read_sample.__wrapped__ = read
+    sensor.read = read_sample
+    return sensor
+
+
+def gps_epoch(date, hhmmss):
+    """
+    UTC seconds since the epoch from NMEA/UBX style date ('ddmmyy') and
+    time ('hhmmss' or 'hhmmss.ss') strings, None if they aren't usable
+    """
+    try:
+        day, month, year = int(date[0:2]), int(date[2:4]), 2000 + int(date[4:6])
+        hour, minute, second = int(hhmmss[0:2]), int(hhmmss[2:4]), float(hhmmss[4:])
+        return calendar.timegm((year, month, day, hour, minute, 0, 0, 0, 0)) + second
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class TimeAnchor:
+    """
+    Converts monotonic times to UTC. The anchor is replaced as a single tuple so
+    readers in other threads never see half an update.
+    """
+    def __init__(self):
+        self._anchor = (time.monotonic(), time.time())
+        self.source = 'system'
+        self.corrections = 0
+
+    def set(self, utc, monotonic, source):
+        self._anchor = (monotonic, utc)
+        self.source = source
+
+    def from_gps(self, utc, monotonic):
+        """Corrects the anchor from a GPS time taken at monotonic"""
+        error = utc - self.utc(monotonic)
+        if self.source != 'gps' or abs(error) > RESYNC_THRESHOLD:
+            if self.source == 'gps':
+                LOG.warning("GPS time is %.3f s off the clock, re-anchoring", error)
+            self.set(utc, monotonic, 'gps')
+            self.corrections += 1
+
+    def utc(self, monotonic):
+        anchorMono, anchorUTC = self._anchor
+        return anchorUTC + (monotonic - anchorMono)
+
+    def datetime(self, monotonic):
+        return datetime.fromtimestamp(self.utc(monotonic), timezone.utc)
+
+    def isoformat(self, monotonic):
+        return self.datetime(monotonic).strftime('%H:%M:%S.%fZ')
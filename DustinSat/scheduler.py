@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Deadline scheduler for the RUN loop. Periodic jobs are kept in a heap ordered
+by their next deadline and the scheduler sleeps until the earliest one is due.
+The readings are only used by the jobs, so the sensors don't wake it.
+"""
+import heapq
+import itertools
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    A periodic job. The next deadline is always worked out from the previous
+    deadline (not from when the job actually ran) so the schedule does not drift.
+    token is the counter of the job's current heap entry, any other entry is stale.
+    """
+    __slots__ = ('name', 'period', 'func', 'deadline', 'token', 'runs', 'missed',
+                 'lateness_total', 'lateness_max', 'last_run')
+
+    def __init__(self, name, period, func, deadline):
+        self.name = name
+        self.period = period
+        self.func = func
+        self.deadline = deadline
+        self.token = None
+        self.runs = 0
+        self.missed = 0
+        self.lateness_total = 0.0
+        self.lateness_max = 0.0
+        self.last_run = None
+
+    def stats(self):
+        return {'period': self.period,
+                'runs': self.runs,
+                'missed': self.missed,
+                'mean_lateness': self.lateness_total / self.runs if self.runs else 0.0,
+                'max_lateness': self.lateness_max}
+
+
+class Scheduler:
+    """
+    Runs periodic jobs from a deadline heap. run() blocks until stop() is called.
+    """
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._heap = []
+        self._jobs = {}
+        self._counter = itertools.count()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._on_wake = []
+        self.wakeups = 0
+
+    def add_job(self, name, period, func, delay=None):
+        """
+        Register func() to run every period seconds. The first run is after
+        delay seconds (defaults to one period, same as the old timers).
+        """
+        if delay is None:
+            delay = period
+        job = Job(name, period, func, self._clock() + delay)
+        self._jobs[name] = job
+        self._push(job)
+        self._wake.set()
+        return job
+
+    def _push(self, job):
+        job.token = next(self._counter)
+        heapq.heappush(self._heap, (job.deadline, job.token, job))
+
+    def set_period(self, name, period):
+        """
+        Change a job's period on the fly. The next deadline is pulled in if the
+        new period would make it sooner, to now if it would already be past.
+        """
+        job = self._jobs[name]
+        if period == job.period:
+            return
+        job.period = period
+        now = self._clock()
+        base = job.last_run if job.last_run is not None else now
+        if base + period < job.deadline:
+            job.deadline = max(base + period, now)
+            self._push(job)
+        self._wake.set()
+
+    def on_wake(self, func):
+        """func() is called every time the scheduler wakes, before any due jobs run."""
+        self._on_wake.append(func)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, token, job = heapq.heappop(self._heap)
+            if token != job.token:
+                # stale entry left behind by set_period()
+                continue
+            due.append(job)
+        return due
+
+    def _run_job(self, job, now):
+        lateness = now - job.deadline
+        if lateness >= job.period:
+            skipped = int(lateness // job.period)
+            job.missed += skipped
+            LOG.warning("Job %s missed %d deadline(s), %.3fs late", job.name, skipped, lateness)
+        else:
+            skipped = 0
+        job.runs += 1
+        job.lateness_total += lateness
+        if lateness > job.lateness_max:
+            job.lateness_max = lateness
+        job.last_run = now
+        try:
+            job.func()
+        except Exception:
+            logging.exception("Exception in scheduled job {}".format(job.name))
+        job.deadline += job.period * (skipped + 1)
+        self._push(job)
+
+    def run_pending(self):
+        """Runs every job that is due now. Returns the number of jobs run."""
+        now = self._clock()
+        for func in self._on_wake:
+            try:
+                func()
+            except Exception:
+                logging.exception("Exception in scheduler wake callback")
+        due = self._pop_due(now)
+        for job in due:
+            self._run_job(job, now)
+        return len(due)
+
+    def time_to_next(self):
+        """Seconds until the next deadline, or None if there are no jobs."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self._clock())
+
+    def run(self):
+        """Sleeps until the next deadline (or a job change) and runs the due jobs."""
+        while not self._stopped.is_set():
+            self._wake.wait(self.time_to_next())
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            self.wakeups += 1
+            self.run_pending()
+
+    def stats(self):
+        """Per job run/miss/lateness figures"""
+        return {name: job.stats() for name, job in self._jobs.items()}
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Hardware-in-the-loop simulator: fake SMBus (MS5611, VEML6075), serial port
+(GPS in NMEA or UBX) and 1-wire sysfs tree driven by a scripted flight profile,
+running RUN faster than real time on an ordinary Linux box.
+
+Run from the DustinSat folder:
+    python -m sim --duration 600 --speed 20
+"""
+from sim.clock import SimClock
+from sim.profile import FlightProfile
+from sim.runner import Simulation
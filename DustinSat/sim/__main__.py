@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Runs a simulated flight and prints what was recorded and sent
+"""
+import argparse
+
+from sim import Simulation, FlightProfile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the flight code against simulated hardware")
+    parser.add_argument('--duration', type=float, default=300.0, help="simulated seconds to run for")
+    parser.add_argument('--speed', type=float, default=10.0, help="how many times faster than real time")
+    parser.add_argument('--workdir', default=None, help="where the logs and data go (default a temp dir)")
+    parser.add_argument('--pad-time', type=float, default=60.0, help="seconds on the pad before launch")
+    parser.add_argument('--i2c-errors', type=float, default=0.0, help="chance of an I2C transaction failing")
+    parser.add_argument('--gps-corrupt', type=float, default=0.0, help="chance of a corrupt NMEA sentence")
+    parser.add_argument('--engine', choices=('threads', 'asyncio', 'processes'), default=None,
+                        help="acquisition engine (default the one set in __main__.py)")
+    parser.add_argument('--w1-crc-errors', type=float, default=0.0, help="chance of a 1-wire CRC error")
+    args = parser.parse_args(argv)
+
+    sim = Simulation(FlightProfile(pad_time=args.pad_time), speed=args.speed, workdir=args.workdir,
+                     engine=args.engine)
+    for device in sim.i2c.values():
+        device.error_rate = args.i2c_errors
+    sim.gps.corrupt_rate = args.gps_corrupt
+    sim.w1.crc_error_rate = args.w1_crc_errors
+    run = sim.run(args.duration)
+    from recorder import iter_records
+
+    print("Work directory: {}".format(sim.workdir))
+    print("Final state: {}".format(sim.profile.state(args.duration)))
+    records = list(iter_records(run.recorder.path))[1:]
+    print("Recorder: {} records in {}".format(len(records), run.recorder.path))
+    if records:
+        print("Last record: {}".format(records[-1]))
+    print("Scheduler: {}".format(run.scheduler.stats()))
+    print("Radio: {} telemetry, {} science packets".format(len(sim.radio.telemetry), len(sim.radio.packets)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Benchmarks the flight code against the simulator. Runs RUN for a simulated
+flight with timers wrapped around the sensor reads, the loop and the scheduled
+jobs, and counts what was written to disk. Results are JSON so runs from two
+commits can be compared:
+
+    python -m sim.bench --duration 600 --speed 20 --output before.json
+    (change something)
+    python -m sim.bench --duration 600 --speed 20 --output after.json --baseline before.json
+
+Latencies and rates are in simulated time, which is what they would be on the
+Pi as far as sleeps and device timings go. CPU times are real thread CPU time
+on the machine running the benchmark.
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+from sim import Simulation, FlightProfile
+
+"""
+(module, class, method) timed for each sensor, and the RUN methods timed
+"""
+SENSOR_METHODS = {'pressure': ('Pressure', 'PressureSensor', 'read'),
+                  'uv': ('UVSensor', 'UVSensor', 'readUV'),
+                  'gps': ('GPS', 'GPS', 'read'),
+                  'temperature': ('Temperature', 'TemperatureSensor', 'read_temperature')}
+RUN_METHODS = ('loop', 'save_data', 'save_log', 'send_telemetry', 'send_science', 'report')
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, int(round(q / 100.0 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+class Timer:
+    """Wall and CPU time of every call to one function"""
+    def __init__(self, name):
+        self.name = name
+        self.wall = []
+        self.cpu = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def wrap(self, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            cpu = time.thread_time()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                wall = time.perf_counter() - start
+                cpu = time.thread_time() - cpu
+                with self._lock:
+                    self.wall.append(wall)
+                    self.cpu.append(cpu)
+        return timed
+
+    def summary(self, duration):
+        wall = sorted(self.wall)
+        ms = lambda value: None if value is None else value * 1000.0
+        return {'calls': len(wall),
+                'errors': self.errors,
+                'rate_hz': len(wall) / duration if duration else 0.0,
+                'p50_ms': ms(percentile(wall, 50)),
+                'p95_ms': ms(percentile(wall, 95)),
+                'p99_ms': ms(percentile(wall, 99)),
+                'max_ms': ms(wall[-1] if wall else None),
+                'cpu_ms_per_call': 1000.0 * sum(self.cpu) / len(self.cpu) if self.cpu else None}
+
+
+class IOCounter:
+    """
+    Counts os.write/os.fsync calls (the flight recording) and, where Linux
+    provides /proc/self/io, every write syscall the process made (logs too).
+    """
+    def __init__(self):
+        self.writes = 0
+        self.write_bytes = 0
+        self.fsyncs = 0
+        self._saved = {}
+        self._proc = None
+
+    @staticmethod
+    def proc_io():
+        try:
+            with open('/proc/self/io') as file:
+                return {key: int(value) for key, value in (line.split(':') for line in file)}
+        except (OSError, ValueError):
+            return None
+
+    def install(self):
+        counter = self
+        self._saved = {'write': os.write, 'fsync': os.fsync, 'fdatasync': getattr(os, 'fdatasync', None)}
+
+        def write(fd, data):
+            written = counter._saved['write'](fd, data)
+            counter.writes += 1
+            counter.write_bytes += written
+            return written
+
+        def sync(name):
+            def synced(fd):
+                counter.fsyncs += 1
+                return counter._saved[name](fd)
+            return synced
+
+        os.write = write
+        os.fsync = sync('fsync')
+        if self._saved['fdatasync'] is not None:
+            os.fdatasync = sync('fdatasync')
+        self._proc = self.proc_io()
+
+    def uninstall(self):
+        for name, func in self._saved.items():
+            if func is not None:
+                setattr(os, name, func)
+        end = self.proc_io()
+        if self._proc is not None and end is not None:
+            self._proc = {key: end[key] - self._proc[key] for key in ('wchar', 'syscw') if key in end}
+        else:
+            self._proc = None
+
+    def summary(self, ticks):
+        out = {'os_write_calls': self.writes, 'os_write_bytes': self.write_bytes, 'fsyncs': self.fsyncs}
+        if self._proc:
+            out['process_write_syscalls'] = self._proc.get('syscw')
+            out['process_write_bytes'] = self._proc.get('wchar')
+            if ticks:
+                out['write_syscalls_per_tick'] = self._proc.get('syscw', 0) / ticks
+                out['write_bytes_per_tick'] = self._proc.get('wchar', 0) / ticks
+        return out
+
+
+def folder_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(duration=300.0, speed=10.0, profile=None, workdir=None, i2c_latency=0.0):
+    """Runs one simulated flight and returns the results as a dict"""
+    sim = Simulation(profile, speed=speed, workdir=workdir)
+    for device in sim.i2c.values():
+        device.latency = i2c_latency
+    flight = sim.load()
+    timers = {}
+    patched = []
+    for name, (module, cls, method) in SENSOR_METHODS.items():
+        target = getattr(sys.modules[module], cls)
+        timers[name] = Timer(name)
+        patched.append((target, method, getattr(target, method)))
+        setattr(target, method, timers[name].wrap(getattr(target, method)))
+    for method in RUN_METHODS:
+        timers[method] = Timer(method)
+        patched.append((flight.RUN, method, getattr(flight.RUN, method)))
+        setattr(flight.RUN, method, timers[method].wrap(getattr(flight.RUN, method)))
+
+    io = IOCounter()
+    io.install()
+    cpu = time.process_time()
+    real = sim.clock.elapsed() / sim.clock.speed
+    try:
+        run = sim.run(duration)
+    finally:
+        cpu = time.process_time() - cpu
+        real = sim.clock.elapsed() / sim.clock.speed - real
+        io.uninstall()
+        for target, method, func in patched:
+            setattr(target, method, func)
+
+    ticks = len(timers['loop'].wall)
+    return {'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'duration': duration,
+            'speed': speed,
+            'real_seconds': real,
+            'sensors': {name: timers[name].summary(duration) for name in SENSOR_METHODS},
+            'run': {name: timers[name].summary(duration) for name in RUN_METHODS},
+            'loop': {'ticks': ticks,
+                     'rate_hz': ticks / duration,
+                     'process_cpu_ms_per_tick': 1000.0 * cpu / ticks if ticks else None,
+                     'process_cpu_fraction': cpu / real if real else None},
+            'scheduler': run.scheduler.stats(),
+            'io': dict(io.summary(ticks),
+                       data_bytes=folder_size(os.path.join(sim.workdir, 'data')),
+                       log_bytes=folder_size(os.path.join(sim.workdir, 'logs'))),
+            'radio': {'telemetry': len(sim.radio.telemetry), 'science': len(sim.radio.packets),
+                      'science_bytes': sum(len(packet) for t, packet in sim.radio.packets)}}
+
+
+def compare(result, baseline, path=()):
+    """Yields (key, baseline, result, change %) for every number in both"""
+    for key, value in result.items():
+        if key not in baseline:
+            continue
+        if isinstance(value, dict) and isinstance(baseline[key], dict):
+            yield from compare(value, baseline[key], path + (key,))
+        elif isinstance(value, (int, float)) and isinstance(baseline[key], (int, float)) \
+                and not isinstance(value, bool):
+            old = baseline[key]
+            change = (value - old) * 100.0 / abs(old) if old else None
+            yield '.'.join(path + (key,)), old, value, change
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the flight code against simulated hardware")
+    parser.add_argument('--duration', type=float, default=300.0, help="simulated seconds to run for")
+    parser.add_argument('--speed', type=float, default=10.0, help="how many times faster than real time")
+    parser.add_argument('--pad-time', type=float, default=60.0, help="seconds on the pad before launch")
+    parser.add_argument('--i2c-latency', type=float, default=0.0, help="extra seconds per I2C transaction")
+    parser.add_argument('--workdir', default=None, help="where the logs and data go (default a temp dir)")
+    parser.add_argument('--output', default=None, help="JSON file for the results (default stdout)")
+    parser.add_argument('--baseline', default=None, help="earlier results to compare against")
+    args = parser.parse_args(argv)
+
+    result = benchmark(args.duration, args.speed, FlightProfile(pad_time=args.pad_time),
+                       workdir=args.workdir, i2c_latency=args.i2c_latency)
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        for key, old, new, change in compare(result, baseline):
+            if change is not None and abs(change) >= 5:
+                print("{:50s} {:>12.4g} -> {:<12.4g} {:+.1f}%".format(key, old, new, change), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
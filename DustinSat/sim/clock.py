@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Simulated clock. install() swaps time.sleep/monotonic/perf_counter/time, the
+timeout of threading.Event.wait and of the selectors asyncio waits on for versions that run speed times faster than
+real time, so the whole flight stack runs faster without any changes to it.
+It has to be installed before the flight code is imported, since some modules
+do 'from time import sleep'. datetime.now() is not affected.
+"""
+import selectors
+import threading
+import time
+
+_real_sleep = time.sleep
+_real_monotonic = time.monotonic
+_real_perf_counter = time.perf_counter
+_real_time = time.time
+_real_wait = threading.Event.wait
+_real_selector = selectors.DefaultSelector
+
+
+class SimClock:
+    def __init__(self, speed=1.0, start=None):
+        self.speed = float(speed)
+        self._realStart = _real_perf_counter()
+        self._wallStart = _real_time() if start is None else start
+        self._monoStart = _real_monotonic()
+        self.installed = False
+
+    def elapsed(self):
+        """Simulated seconds since the clock was created"""
+        return (_real_perf_counter() - self._realStart) * self.speed
+
+    def monotonic(self):
+        return self._monoStart + self.elapsed()
+
+    def perf_counter(self):
+        return self._realStart + self.elapsed()
+
+    def time(self):
+        return self._wallStart + self.elapsed()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            _real_sleep(seconds / self.speed)
+
+    def install(self):
+        clock = self
+
+        def wait(event, timeout=None):
+            if timeout is not None:
+                timeout = max(0.0, timeout) / clock.speed
+            return _real_wait(event, timeout)
+
+        class Selector(_real_selector):
+            def select(self, timeout=None):
+                if timeout is not None:
+                    timeout = max(0.0, timeout) / clock.speed
+                return super().select(timeout)
+
+        time.sleep = self.sleep
+        time.monotonic = self.monotonic
+        time.perf_counter = self.perf_counter
+        time.time = self.time
+        threading.Event.wait = wait
+        selectors.DefaultSelector = Selector
+        self.installed = True
+
+    def uninstall(self):
+        time.sleep = _real_sleep
+        time.monotonic = _real_monotonic
+        time.perf_counter = _real_perf_counter
+        time.time = _real_time
+        threading.Event.wait = _real_wait
+        selectors.DefaultSelector = _real_selector
+        self.installed = False
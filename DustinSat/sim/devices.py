@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Simulated hardware: register models of the MS5611 and VEML6075 behind a fake
+smbus.SMBus, the GPS behind a fake serial.Serial (NMEA, or UBX once it has been
+configured for it) and a fake SatRadio. Every device has a latency, an
+error_rate and a hang switch for fault injection. SensorBase stands in for
+tuppersat.sensor.SensorBase on machines without the flight package.
+"""
+import random
+import struct
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+"""
+The simulated hardware, set up by Simulation
+"""
+I2C_DEVICES = {}
+SERIAL_PORTS = {}
+RADIOS = []
+
+
+class Device:
+    """
+    Fault injection common to every simulated device. Call transfer() at the
+    start of every bus transaction.
+    """
+    def __init__(self, clock, profile, latency=0.0, error_rate=0.0):
+        self.clock = clock
+        self.profile = profile
+        self.latency = latency
+        self.error_rate = error_rate
+        self.transactions = 0
+        self.errors = 0
+        self._running = threading.Event()
+        self._running.set()
+
+    def hang(self):
+        """Every transaction blocks until release() is called"""
+        self._running.clear()
+
+    def release(self):
+        self._running.set()
+
+    def state(self):
+        return self.profile.state(self.clock.elapsed())
+
+    def transfer(self):
+        self.transactions += 1
+        self._running.wait()
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            raise OSError(121, 'Remote I/O error')
+
+
+class MS5611(Device):
+    """
+    Register model of the MS5611. Conversions take the datasheet time for the OSR
+    and the ADC reads 0 if it is read too early. The readings are the inverse
+    of the datasheet compensation for the profile's pressure and temperature.
+    """
+    OSR_TIMES = {0: 0.00060, 2: 0.00117, 4: 0.00228, 6: 0.00454, 8: 0.00904}
+
+    def __init__(self, clock, profile, prom=(0, 40127, 36924, 23317, 23282, 33464, 28312, 0), **kwargs):
+        super().__init__(clock, profile, **kwargs)
+        prom = list(prom)
+        prom[7] = (prom[7] & 0xFFF0) | self.crc4(prom)
+        self.prom = prom
+        self._conversion = None
+
+    @staticmethod
+    def crc4(prom):
+        """
+        PROM CRC from application note AN520. Worked out here rather than imported
+        from Pressure so the flight code isn't imported before the fakes are in place.
+        """
+        words = list(prom)
+        words[7] &= 0xFF00
+        remainder = 0
+        for i in range(16):
+            remainder ^= (words[i >> 1] & 0xFF) if i % 2 else (words[i >> 1] >> 8)
+            for _ in range(8):
+                remainder = (((remainder << 1) ^ 0x3000) if remainder & 0x8000 else remainder << 1) & 0xFFFF
+        return (remainder >> 12) & 0x0F
+
+    def raw(self, kind):
+        state = self.state()
+        C1, C2, C3, C4, C5, C6 = self.prom[1:7]
+        dT = (state.temp_int * 100 - 2000) * 2**23 / C6
+        if kind == 0x50:
+            return int(dT + C5 * 2**8)
+        OFF = C2 * 2**16 + C4 * dT / 2**7
+        SENS = C1 * 2**15 + C3 * dT / 2**8
+        return int((state.pressure * 100 * 2**15 + OFF) * 2**21 / SENS)
+
+    def write_byte(self, cmd):
+        if cmd == 0x1E:
+            self._conversion = None
+        elif cmd & 0xF0 in (0x40, 0x50) and cmd & 0x0F in self.OSR_TIMES:
+            self._conversion = (cmd & 0xF0, time.monotonic() + self.OSR_TIMES[cmd & 0x0F])
+        else:
+            raise OSError(121, 'Remote I/O error')
+
+    def read_block(self, reg, length):
+        if 0xA0 <= reg <= 0xAE:
+            word = self.prom[(reg - 0xA0) // 2]
+            return [word >> 8, word & 0xFF][:length]
+        if reg == 0x00:
+            value = 0
+            if self._conversion is not None and time.monotonic() >= self._conversion[1]:
+                value = self.raw(self._conversion[0])
+            self._conversion = None
+            return [(value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF][:length]
+        raise OSError(121, 'Remote I/O error')
+
+
+class VEML6075(Device):
+    """
+    Register model of the VEML6075. Counts scale with the integration time and
+    only update once an integration period has passed since power on.
+    """
+    def __init__(self, clock, profile, **kwargs):
+        super().__init__(clock, profile, **kwargs)
+        self.conf = 0x01
+        self._poweredAt = None
+
+    def write_byte_data(self, reg, value):
+        if reg != 0x00:
+            raise OSError(121, 'Remote I/O error')
+        if value & 0x01:
+            self._poweredAt = None
+        elif self._poweredAt is None or value & 0x04 or value != self.conf:
+            self._poweredAt = time.monotonic()
+        self.conf = value
+
+    def read_word(self, reg):
+        integration = 50 << ((self.conf >> 4) & 0x07)
+        if self._poweredAt is None or time.monotonic() - self._poweredAt < integration / 1000.0:
+            return 0
+        state = self.state()
+        scale = integration / 50
+        comp1, comp2 = 20.0, 10.0
+        if reg == 0x07:
+            counts = state.uva * 0.93 + 2.22 * comp1 + 1.33 * comp2
+        elif reg == 0x09:
+            counts = state.uvb * 2.10 + 3.66 * comp1 + 1.75 * comp2
+        elif reg == 0x0A:
+            counts = comp1
+        elif reg == 0x0B:
+            counts = comp2
+        else:
+            raise OSError(121, 'Remote I/O error')
+        return min(0xFFFF, int(counts * scale))
+
+
+class SMBus:
+    """Drop-in for smbus.SMBus, talking to the devices in I2C_DEVICES"""
+    def __init__(self, bus=None):
+        self.bus = bus
+        self.closed = False
+
+    def _device(self, addr):
+        device = I2C_DEVICES.get(addr)
+        if device is None or self.closed:
+            raise OSError(121, 'Remote I/O error')
+        device.transfer()
+        return device
+
+    def write_byte(self, addr, value):
+        self._device(addr).write_byte(value)
+
+    def read_byte(self, addr):
+        self._device(addr)
+        return 0
+
+    def write_byte_data(self, addr, reg, value):
+        self._device(addr).write_byte_data(reg, value)
+
+    def read_word_data(self, addr, reg):
+        return self._device(addr).read_word(reg)
+
+    def read_i2c_block_data(self, addr, reg, length=32):
+        return self._device(addr).read_block(reg, length)
+
+    def close(self):
+        self.closed = True
+
+
+class GPSDevice(Device):
+    """
+    The U-Blox7 on the far end of a serial port. Outputs GGA/RMC/VTG/GSA at 1Hz
+    until it is sent a CFG-PRT turning NMEA off, then NAV-PVT at the CFG-RATE rate.
+    corrupt_rate is the chance of a sentence with a bad checksum.
+    """
+    def __init__(self, clock, profile, corrupt_rate=0.0, **kwargs):
+        super().__init__(clock, profile, **kwargs)
+        self.corrupt_rate = corrupt_rate
+        self.ubx = False
+        self.rate = 1.0
+        self.received = bytearray()
+        self._out = bytearray()
+        self._lock = threading.Lock()
+        self._nextEpoch = time.monotonic()
+
+    def receive(self, data):
+        """Bytes written to the receiver. Only CFG-PRT and CFG-RATE are acted on."""
+        self.received += data
+        buf = self.received
+        while True:
+            start = buf.find(b'\xb5\x62')
+            if start < 0 or len(buf) < start + 8:
+                break
+            length = struct.unpack_from('<H', buf, start + 4)[0]
+            if len(buf) < start + 8 + length:
+                break
+            cls, msgid = buf[start + 2], buf[start + 3]
+            payload = bytes(buf[start + 6:start + 6 + length])
+            if (cls, msgid) == (0x06, 0x00) and length >= 20:
+                self.ubx = not struct.unpack_from('<H', payload, 14)[0] & 0x02
+            elif (cls, msgid) == (0x06, 0x08) and length >= 6:
+                self.rate = 1000.0 / max(1, struct.unpack_from('<H', payload)[0])
+            del buf[:start + 8 + length]
+
+    def _generate(self):
+        now = time.monotonic()
+        while self._nextEpoch <= now:
+            state = self.state()
+            self._out += self.ubx_epoch(state) if self.ubx else self.nmea_epoch(state)
+            self._nextEpoch += 1.0 / (self.rate if self.ubx else 1.0)
+
+    @staticmethod
+    def _sentence(body):
+        checksum = 0
+        for byte in body.encode():
+            checksum ^= byte
+        return '${}*{:02X}\r\n'.format(body, checksum).encode()
+
+    @staticmethod
+    def _nmea_angle(value, width):
+        value = abs(value)
+        degrees = int(value)
+        return '{:0{}d}{:08.5f}'.format(degrees, width, (value - degrees) * 60)
+
+    def nmea_epoch(self, state):
+        now = time.time()
+        utc = time.gmtime(now)
+        hhmmss = time.strftime('%H%M%S', utc) + '{:.2f}'.format(now % 1)[1:]
+        date = time.strftime('%d%m%y', utc)
+        lat = self._nmea_angle(state.lat, 2)
+        ns = 'N' if state.lat >= 0 else 'S'
+        lon = self._nmea_angle(state.lon, 3)
+        ew = 'E' if state.lon >= 0 else 'W'
+        knots = state.speed / 0.514444
+        out = [self._sentence('GPGGA,{},{},{},{},{},1,09,0.92,{:.1f},M,55.0,M,,'.format(hhmmss, lat, ns, lon, ew, state.alt)),
+               self._sentence('GPRMC,{},A,{},{},{},{},{:.3f},{:.2f},{},,,A'.format(hhmmss, lat, ns, lon, ew, knots, state.course, date)),
+               self._sentence('GPVTG,{:.2f},T,,M,{:.3f},N,{:.3f},K,A'.format(state.course, knots, state.speed * 3.6)),
+               self._sentence('GPGSA,A,3,01,03,08,11,14,17,22,28,31,,,,1.61,0.92,1.32')]
+        if self.corrupt_rate and random.random() < self.corrupt_rate:
+            i = random.randrange(len(out))
+            out[i] = out[i][:10] + b'X' + out[i][11:]
+        return b''.join(out)
+
+    def ubx_epoch(self, state):
+        utc = time.gmtime(time.time())
+        payload = struct.pack('<IHBBBBBBIiBBBBiiiiIIiiiiiIIH',
+                              0, utc.tm_year, utc.tm_mon, utc.tm_mday, utc.tm_hour, utc.tm_min, utc.tm_sec,
+                              0x07, 50, 0, 3, 0x01, 0, 9,
+                              int(state.lon * 1e7), int(state.lat * 1e7), int(state.alt * 1000 + 55000),
+                              int(state.alt * 1000), 2500, 4000, 0, 0, 0, int(state.speed * 1000),
+                              int(state.course * 1e5), 300, 50000, 161) + bytes(14)
+        body = struct.pack('<BBH', 0x01, 0x07, len(payload)) + payload
+        a = b = 0
+        for byte in body:
+            a = (a + byte) & 0xFF
+            b = (b + a) & 0xFF
+        return b'\xb5\x62' + body + bytes((a, b))
+
+    def pending(self):
+        with self._lock:
+            self._generate()
+            return len(self._out)
+
+    def take(self, size):
+        with self._lock:
+            self._generate()
+            data = bytes(self._out[:size])
+            del self._out[:size]
+            return data
+
+    def time_to_next(self):
+        return max(0.0, self._nextEpoch - time.monotonic())
+
+
+class SerialException(IOError):
+    pass
+
+
+class Serial:
+    """Drop-in for serial.Serial, connected to the device in SERIAL_PORTS"""
+    def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+        device = SERIAL_PORTS.get(port)
+        if device is None:
+            raise SerialException("could not open port {}: No such file or directory".format(port))
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.device = device
+        self.is_open = True
+        self._cancel = False
+
+    @property
+    def in_waiting(self):
+        return self.device.pending()
+
+    def read(self, size=1):
+        """Blocks until there is at least one byte, or the timeout runs out"""
+        if not self.is_open:
+            raise SerialException("Attempting to use a port that is not open")
+        self._cancel = False
+        self.device.transfer()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while self.is_open and not self.device.pending():
+            if self._cancel:
+                return b''
+            wait = self.device.time_to_next()
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return b''
+            time.sleep(max(wait, 0.001))
+        return self.device.take(size)
+
+    def readline(self):
+        out = bytearray()
+        while not out.endswith(b'\n'):
+            byte = self.read(1)
+            if not byte:
+                break
+            out += byte
+        return bytes(out)
+
+    def write(self, data):
+        self.device.transfer()
+        self.device.receive(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def cancel_read(self):
+        self._cancel = True
+
+    def close(self):
+        self.is_open = False
+
+
+class SatRadio:
+    """Drop-in for satradio.SatRadio that records what was sent"""
+    def __init__(self, port, address, callsign, latency=0.2):
+        self.port = port
+        self.address = address
+        self.callsign = callsign
+        self.latency = latency
+        self.telemetry = []
+        self.packets = []
+        self.running = False
+        RADIOS.append(self)
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def send_telemetry(self, **telemetry):
+        time.sleep(self.latency)
+        self.telemetry.append((time.time(), telemetry))
+
+    def send_data_packet(self, data):
+        time.sleep(self.latency)
+        self.packets.append((time.time(), bytes(data)))
+
+
+def set_airborne(path):
+    """Drop-in for airborne.set_airborne, sends CFG-NAV5 (airborne <1g) to the GPS"""
+    from ubx import message
+    nav5 = struct.pack('<HBBiIbBHHHHBBIII', 0x0001, 6, 3, 0, 10000, 5, 0, 250, 250, 100, 350, 0, 0, 0, 0, 0)
+    port = Serial(path)
+    port.write(message((0x06, 0x24), nav5))
+    port.close()
+
+
+class SensorBase:
+    """
+    Stand-in for tuppersat.sensor.SensorBase: start() runs setup(), then read() in a
+    loop until stop(), then teardown(), in a thread of its own. data is the last
+    reading that wasn't None.
+    """
+    def __init__(self, log=None):
+        self._log = LOG if log is None else log
+        self.data = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def setup(self):
+        pass
+
+    def read(self):
+        raise NotImplementedError
+
+    def teardown(self):
+        pass
+
+    def run(self):
+        self.setup()
+        try:
+            while not self._stopped.is_set():
+                value = self.read()
+                if value is not None:
+                    self.data = value
+        except Exception:
+            self._log.exception("%s stopped with an error", type(self).__name__)
+        finally:
+            self.teardown()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Scripted flight profile for the simulator: sits on the pad, climbs at a steady
+rate, optionally floats for a while, bursts, comes down under the parachute and lands. Pressure and outside
+temperature follow the standard atmosphere.
+"""
+import math
+from collections import namedtuple
+
+State = namedtuple('State', 't phase alt pressure temp_ext temp_int lat lon speed course uva uvb')
+
+
+def atmosphere(alt):
+    """
+    International Standard Atmosphere, returns (pressure mbar, temperature C)
+    """
+    if alt < 11000:
+        temp = 288.15 - 0.0065 * alt
+        pressure = 1013.25 * (temp / 288.15) ** 5.2559
+    elif alt < 20000:
+        temp = 216.65
+        pressure = 226.32 * math.exp(-(alt - 11000) / 6341.6)
+    else:
+        temp = 216.65 + 0.001 * (alt - 20000)
+        pressure = 54.749 * (temp / 216.65) ** -34.163
+    return pressure, temp - 273.15
+
+
+class FlightProfile:
+    def __init__(self, pad_time=120.0, ascent_rate=5.0, burst_alt=30000.0, descent_rate=10.0,
+                 ground_alt=50.0, lat=53.3498, lon=-6.2603, wind=10.0, wind_dir=90.0, float_time=0.0):
+        self.pad_time = pad_time
+        self.ascent_rate = ascent_rate
+        self.burst_alt = burst_alt
+        self.descent_rate = descent_rate
+        self.ground_alt = ground_alt
+        self.lat = lat
+        self.lon = lon
+        self.wind = wind
+        self.wind_dir = wind_dir
+        self.float_time = float_time
+
+    @property
+    def burst_time(self):
+        return self.pad_time + (self.burst_alt - self.ground_alt) / self.ascent_rate + self.float_time
+
+    @property
+    def landing_time(self):
+        return self.burst_time + (self.burst_alt - self.ground_alt) / self.descent_rate
+
+    def altitude(self, t):
+        if t < self.pad_time:
+            return self.ground_alt, 'pad'
+        if t < self.burst_time - self.float_time:
+            return self.ground_alt + (t - self.pad_time) * self.ascent_rate, 'ascent'
+        if t < self.burst_time:
+            return self.burst_alt, 'float'
+        if t < self.landing_time:
+            return self.burst_alt - (t - self.burst_time) * self.descent_rate, 'descent'
+        return self.ground_alt, 'landed'
+
+    def state(self, t):
+        """The simulated conditions t seconds into the run"""
+        alt, phase = self.altitude(t)
+        pressure, temp_ext = atmosphere(alt)
+        airborne = min(max(t - self.pad_time, 0.0), self.landing_time - self.pad_time)
+        drift = self.wind * airborne
+        heading = math.radians(self.wind_dir)
+        lat = self.lat + drift * math.cos(heading) / 111320.0
+        lon = self.lon + drift * math.sin(heading) / (111320.0 * math.cos(math.radians(self.lat)))
+        speed = self.wind if phase in ('ascent', 'float', 'descent') else 0.0
+        temp_int = 25.0 - 0.0004 * (alt - self.ground_alt)
+        uva = 500.0 + 0.05 * alt
+        uvb = 50.0 + 0.01 * alt
+        return State(t, phase, alt, pressure, temp_ext, temp_int, lat, lon, speed,
+                     self.wind_dir, uva, uvb)
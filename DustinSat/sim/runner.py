@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Runs the flight code in __main__.py against the simulated hardware. The fake
+smbus, serial, satradio and airborne modules are put in sys.modules and the
+simulated clock is installed before the flight code is imported, so none of
+it needs changing. Without the tuppersat package a stand-in SensorBase is
+used. DUSTINSAT_DIR and DUSTINSAT_W1 point the logs, the flight recording and
+the 1-wire sensors at a work directory.
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import types
+import logging
+LOG = logging.getLogger(__name__)
+
+from sim.clock import SimClock
+from sim.profile import FlightProfile
+from sim.w1 import W1Tree
+from sim import devices
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLIGHT_DIR = os.path.dirname(HERE)
+GPS_PORT = r'/dev/ttyACM0'
+PRESSURE_ADDR = 0x77
+UV_ADDR = 0x10
+
+
+class Simulation:
+    """
+    One simulated flight. The devices are created straight away so latency and
+    faults can be set on them (sim.i2c[0x77].error_rate=0.01, sim.gps.hang() etc.)
+    before or during run(). engine picks RUN's acquisition engine ('threads', 'asyncio' or 'processes').
+    """
+    def __init__(self, profile=None, speed=10.0, workdir=None, start=None, engine=None):
+        self.engine = engine
+        self.profile = FlightProfile() if profile is None else profile
+        self.clock = SimClock(speed, start=start)
+        self.workdir = tempfile.mkdtemp(prefix='dustinsat_sim_') if workdir is None else workdir
+        self.i2c = {PRESSURE_ADDR: devices.MS5611(self.clock, self.profile),
+                    UV_ADDR: devices.VEML6075(self.clock, self.profile)}
+        self.gps = devices.GPSDevice(self.clock, self.profile)
+        self.w1 = W1Tree(self.clock, self.profile, root=os.path.join(self.workdir, 'w1'))
+        self.flight = None
+        self.run_ = None
+        self.error = None
+
+    @property
+    def radio(self):
+        return devices.RADIOS[-1] if devices.RADIOS else None
+
+    def _install(self):
+        devices.I2C_DEVICES.clear()
+        devices.I2C_DEVICES.update(self.i2c)
+        devices.SERIAL_PORTS.clear()
+        devices.SERIAL_PORTS[GPS_PORT] = self.gps
+        del devices.RADIOS[:]
+        fakes = {'smbus': ['SMBus'], 'serial': ['Serial', 'SerialException'],
+                 'satradio': ['SatRadio'], 'airborne': ['set_airborne']}
+        for name, attrs in fakes.items():
+            module = types.ModuleType(name)
+            for attr in attrs:
+                setattr(module, attr, getattr(devices, attr))
+            sys.modules[name] = module
+        try:
+            import tuppersat.sensor
+        except ImportError:
+            package = types.ModuleType('tuppersat')
+            package.__path__ = []
+            package.sensor = types.ModuleType('tuppersat.sensor')
+            package.sensor.SensorBase = devices.SensorBase
+            sys.modules['tuppersat'] = package
+            sys.modules['tuppersat.sensor'] = package.sensor
+        for folder in ('logs', 'data'):
+            os.makedirs(os.path.join(self.workdir, folder), exist_ok=True)
+        os.environ['DUSTINSAT_DIR'] = os.path.join(self.workdir, '')
+        os.environ['DUSTINSAT_W1'] = self.w1.root
+        if FLIGHT_DIR not in sys.path:
+            sys.path.insert(0, FLIGHT_DIR)
+        self.clock.install()
+
+    def load(self):
+        """Imports __main__.py as the module 'dustinsat_main' and returns it"""
+        self._install()
+        self.w1.start()
+        """
+        Flight modules imported before (by tests, or an earlier Simulation) are imported again,
+        or defaults like Scheduler's clock would still be the clock they were imported with
+        """
+        for name, module in list(sys.modules.items()):
+            path = getattr(module, '__file__', None)
+            if path is not None and os.path.dirname(os.path.abspath(path)) == FLIGHT_DIR:
+                del sys.modules[name]
+        spec = importlib.util.spec_from_file_location('dustinsat_main', os.path.join(FLIGHT_DIR, '__main__.py'))
+        self.flight = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.flight)
+        if self.engine is not None:
+            self.flight.ENGINE = self.engine
+        return self.flight
+
+    def _target(self):
+        try:
+            self.run_.run()
+        except Exception as error:
+            self.error = error
+            logging.exception("Simulated flight stopped with an error")
+
+    def start(self):
+        """Loads the flight code and starts RUN in its own thread"""
+        if self.flight is None:
+            self.load()
+        self.run_ = self.flight.RUN()
+        self._thread = threading.Thread(target=self._target, name='sim-run', daemon=True)
+        self._thread.start()
+        while not hasattr(self.run_, 'scheduler') and self._thread.is_alive():
+            self.clock.sleep(0.01)
+        return self.run_
+
+    def stop(self):
+        if self.run_ is not None and hasattr(self.run_, 'scheduler'):
+            self.run_.scheduler.stop()
+        self._thread.join()
+        self.w1.stop()
+        self.clock.uninstall()
+
+    def run(self, duration):
+        """Runs RUN for duration simulated seconds, returns the RUN instance"""
+        run = self.start()
+        try:
+            self.clock.sleep(duration)
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+        return run
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Fake 1-wire sysfs tree in a temp directory, laid out like /sys/bus/w1/devices
+with a bus master (w1_master_slaves, therm_bulk_read) and one directory per
+DS18B20 (w1_slave, resolution). A background thread keeps the w1_slave files
+up to date from the flight profile, replacing them atomically so a reader
+never sees half a file. crc_error_rate is the chance of a reading with NO in
+the CRC line.
+"""
+import os
+import random
+import shutil
+import tempfile
+import threading
+import logging
+LOG = logging.getLogger(__name__)
+
+"""
+Which profile temperature each device reads
+"""
+DEVICES = {'28-0300a2796d64': 'temp_int', '28-0517c41b75ff': 'temp_ext'}
+
+
+class W1Tree:
+    def __init__(self, clock, profile, root=None, devices=DEVICES, master='w1_bus_master1',
+                 update_interval=0.25, crc_error_rate=0.0):
+        self.clock = clock
+        self.profile = profile
+        self.devices = dict(devices)
+        self.master = master
+        self.update_interval = update_interval
+        self.crc_error_rate = crc_error_rate
+        self._ownRoot = root is None
+        self.root = tempfile.mkdtemp(prefix='dustinsat_w1_') if root is None else root
+        self.updates = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def create(self):
+        master = os.path.join(self.root, self.master)
+        os.makedirs(master, exist_ok=True)
+        with open(os.path.join(master, 'w1_master_slaves'), 'w') as file:
+            file.write(''.join(slave + '\n' for slave in self.devices))
+        with open(os.path.join(master, 'therm_bulk_read'), 'w') as file:
+            file.write('1\n')
+        for slave in self.devices:
+            os.makedirs(os.path.join(self.root, slave), exist_ok=True)
+            with open(os.path.join(self.root, slave, 'resolution'), 'w') as file:
+                file.write('12\n')
+        self.update()
+        return self.root
+
+    @staticmethod
+    def _scratchpad(millidegrees, crc_ok):
+        raw = int(round(millidegrees / 62.5)) & 0xFFFF
+        data = '{:02x} {:02x} 4b 46 7f ff 0c 10 1c'.format(raw & 0xFF, raw >> 8)
+        return '{} : crc=1c {}\n{} t={}\n'.format(data, 'YES' if crc_ok else 'NO', data, millidegrees)
+
+    def update(self):
+        state = self.profile.state(self.clock.elapsed())
+        for slave, field in self.devices.items():
+            millidegrees = int(round(getattr(state, field) * 16)) * 1000 // 16
+            crc_ok = not (self.crc_error_rate and random.random() < self.crc_error_rate)
+            path = os.path.join(self.root, slave, 'w1_slave')
+            with open(path + '.tmp', 'w') as file:
+                file.write(self._scratchpad(millidegrees, crc_ok))
+            os.replace(path + '.tmp', path)
+        self.updates += 1
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.update()
+            except OSError:
+                LOG.exception("Could not update the fake 1-wire tree")
+            self._stopped.wait(self.update_interval)
+
+    def start(self):
+        self.create()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='sim-w1', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._ownRoot:
+            shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Startup orchestrator. Each device's bring-up (radio, GPS configuration,
+1-wire, I2C sensors) runs in its own thread so a slow or missing device
+doesn't hold up the others, and joins in whenever it is ready. A step that
+fails is tried again after a backoff until it works. Every step is timed for
+the startup report.
+"""
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+PENDING = 'pending'
+STARTING = 'starting'
+READY = 'ready'
+LATE = 'late'
+FAILED = 'failed'
+
+
+class Task:
+    __slots__ = ('name', 'func', 'timeout', 'after', 'state', 'started', 'finished', 'error', 'attempts', 'done')
+
+    def __init__(self, name, func, timeout, after):
+        self.name = name
+        self.func = func
+        self.timeout = timeout
+        self.after = tuple(after)
+        self.state = PENDING
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.attempts = 0
+        self.done = threading.Event()
+
+
+class Startup:
+    """
+    add() the bring-up steps and start() them all. A step can depend on others
+    ('after'), it then starts once their first attempt has finished (whether or
+    not it worked) or they have run out of time. A step that raises is tried
+    again after retry seconds, doubling up to max_retry, until it works or
+    stop() is called. mark() records other milestones, e.g. first samples.
+    """
+    def __init__(self, retry=2.0, max_retry=60.0):
+        self.began = time.monotonic()
+        self.retry = retry
+        self.max_retry = max_retry
+        self.tasks = {}
+        self.milestones = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def add(self, name, func, timeout=10.0, after=()):
+        self.tasks[name] = Task(name, func, timeout, after)
+
+    def _wait_for(self, task):
+        """Waits until task has finished or run out of time"""
+        while not task.done.wait(0.05):
+            if task.timeout is not None and task.started is not None \
+                    and time.monotonic() > task.started + task.timeout:
+                return
+
+    def _run(self, task):
+        for name in task.after:
+            self._wait_for(self.tasks[name])
+        task.started = time.monotonic()
+        delay = self.retry
+        while not self._stopped.is_set():
+            task.state = STARTING
+            task.attempts += 1
+            try:
+                task.func()
+            except Exception as error:
+                task.error = repr(error)
+                task.state = FAILED
+                if task.attempts == 1:
+                    logging.exception("Startup of {} failed".format(task.name))
+                else:
+                    LOG.warning("Startup of %s failed again: %s", task.name, task.error)
+            else:
+                late = task.timeout is not None and time.monotonic() - task.started > task.timeout
+                task.state = LATE if late else READY
+                if late:
+                    LOG.warning("%s came up late, after %.1f s", task.name, time.monotonic() - task.started)
+            task.finished = time.monotonic()
+            task.done.set()
+            if task.state != FAILED or self._stopped.wait(delay):
+                return
+            delay = min(2 * delay, self.max_retry)
+
+    def start(self):
+        for task in self.tasks.values():
+            threading.Thread(target=self._run, args=(task,), name='startup-' + task.name, daemon=True).start()
+
+    def stop(self):
+        """Stops retrying the steps that failed"""
+        self._stopped.set()
+
+    def mark(self, name, when=None):
+        """Records a milestone at monotonic time when (now by default), only the first time it is marked"""
+        when = time.monotonic() if when is None else when
+        with self._lock:
+            self.milestones.setdefault(name, when - self.began)
+
+    def report(self):
+        """Timing breakdown, seconds from the start of startup"""
+        out = {}
+        for name, task in self.tasks.items():
+            out[name] = {'state': task.state,
+                         'start': None if task.started is None else task.started - self.began,
+                         'duration': None if task.finished is None or task.started is None
+                         else task.finished - task.started,
+                         'attempts': task.attempts,
+                         'error': task.error}
+        return {'steps': out, 'milestones': dict(self.milestones)}
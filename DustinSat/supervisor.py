@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Sensor supervision. Each sensor's read() is wrapped so that a read that fails
+(raises or returns None) is retried after an exponential backoff instead of
+straight away, and after too many failures in a row the circuit opens: the
+device is torn down and left alone for a cool-down, then set up again and
+given one trial read. A watchdog (check(), run from the scheduler) catches
+reads that go past their deadline, interrupts them where the device allows it
+and has the device re-initialised once the read comes back.
+
+    ok -> backoff -> open -> trial -> ok
+"""
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+OK = 'ok'
+BACKOFF = 'backoff'
+OPEN = 'open'
+TRIAL = 'trial'
+
+
+class Supervisor:
+    """
+    Supervises one sensor instance. deadline is how long (seconds) a read() may take,
+    None for no limit; set_deadline() changes it from the next read on. threshold failures
+    in a row open the circuit, the backoff doubles from backoff up to max_backoff and the
+    cool-down from cooldown up to max_backoff. reset is called between teardown() and
+    setup() when the device is re-initialised (e.g. to reset a shared bus), interrupt
+    when a read hangs (defaults to the sensor's interrupt() if it has one).
+    """
+    def __init__(self, name, sensor, deadline=None, threshold=5, backoff=0.1, cooldown=2.0,
+                 max_backoff=30.0, reset=None, interrupt=None):
+        self.name = name
+        self.sensor = sensor
+        self.deadline = deadline
+        self.threshold = threshold
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.max_backoff = max_backoff
+        self.reset = reset
+        self.interrupt = getattr(sensor, 'interrupt', None) if interrupt is None else interrupt
+        self.state = OK
+        self.failures = 0
+        self.opens = 0
+        self.total_failures = 0
+        self.timeouts = 0
+        self.reinits = 0
+        self.last_error = None
+        self._retryAt = 0.0
+        self._started = None
+        self._deadlineAt = None
+        self._hung = False
+        self._reinit = False
+        self._down = False
+        self._wake = threading.Event()
+        self._stopping = False
+        self._wrap()
+
+    def _wrap(self):
+        read = self.sensor.read
+        stop = self.sensor.stop
+
+        def read_supervised():
+            if self._stopping:
+                return None
+            if self.state != OK:
+                delay = self._retryAt - time.monotonic()
+                if delay > 0 and (self._wake.wait(delay) or self._stopping):
+                    self._wake.clear()
+                    return None
+                if self.state == OPEN:
+                    self.state = TRIAL
+                    self._reinit = True
+            if self._reinit and not self.reinit():
+                return None
+            start = time.monotonic()
+            self._deadlineAt = None if self.deadline is None else start + self.deadline
+            self._started = start
+            try:
+                value = read()
+            except Exception as error:
+                self._started = None
+                self._failed(repr(error), exc_info=True)
+                return None
+            self._started = None
+            if self._hung:
+                self._hung = False
+                self._reinit = True
+                self._failed("read took {:.1f} s".format(time.monotonic() - start))
+            elif value is None:
+                if not self._stopping:
+                    self._failed("no reading")
+            elif self.state != OK:
+                self._recovered()
+            return value
+
+        def stop_supervised():
+            self._stopping = True
+            self._wake.set()
+            stop()
+
+        read_supervised.__wrapped__ = read
+        self.sensor.read = read_supervised
+        self.sensor.stop = stop_supervised
+
+    def _failed(self, reason, exc_info=False):
+        self.failures += 1
+        self.total_failures += 1
+        self.last_error = reason
+        now = time.monotonic()
+        if self.state == TRIAL or self.failures >= self.threshold:
+            if self.state != OPEN:
+                self.opens += 1
+            delay = min(self.cooldown * 2 ** (self.opens - 1), self.max_backoff)
+            LOG.warning("%s failing (%s, %d in a row), shutting it down for %.1f s",
+                        self.name, reason, self.failures, delay, exc_info=exc_info)
+            self.state = OPEN
+            self._shutdown()
+        else:
+            delay = min(self.backoff * 2 ** (self.failures - 1), self.max_backoff)
+            if self.failures == 1:
+                LOG.warning("%s read failed (%s), backing off", self.name, reason, exc_info=exc_info)
+            self.state = BACKOFF
+        self._retryAt = now + delay
+
+    def _recovered(self):
+        if self.state == TRIAL:
+            LOG.info("%s recovered after %d failures", self.name, self.failures)
+        self.state = OK
+        self.failures = 0
+        self.opens = 0
+
+    def _shutdown(self):
+        try:
+            self.sensor.teardown()
+        except Exception:
+            logging.exception("Error shutting down {}".format(self.name))
+        self._down = True
+        self._reinit = True
+
+    def reinit(self):
+        """
+        Tears the device down and sets it up again, from the sensor's own thread.
+        Returns False (counted as a failure) if setup() raised.
+        """
+        self.reinits += 1
+        LOG.info("Re-initialising %s", self.name)
+        if not self._down:
+            self._shutdown()
+        try:
+            if self.reset is not None:
+                self.reset()
+            self.sensor.setup()
+            self._down = False
+        except Exception as error:
+            self._failed("setup failed: {!r}".format(error), exc_info=True)
+            return False
+        self._reinit = False
+        return True
+
+    def set_deadline(self, deadline):
+        self.deadline = deadline
+
+    def check(self, now=None):
+        """
+        The watchdog: if the read in progress is past its deadline it is interrupted
+        (where the device allows it) and the device is re-initialised once it returns
+        """
+        now = time.monotonic() if now is None else now
+        deadline = self._deadlineAt
+        if self._started is None or deadline is None or now < deadline or self._hung:
+            return
+        self._hung = True
+        self.timeouts += 1
+        LOG.warning("%s read has hung for %.1f s", self.name, now - self._started)
+        if self.interrupt is not None:
+            try:
+                self.interrupt()
+            except Exception:
+                logging.exception("Error interrupting {}".format(self.name))
+
+    def stats(self):
+        return {'state': 'hung' if self._hung else self.state,
+                'failures': self.failures,
+                'total_failures': self.total_failures,
+                'opens': self.opens,
+                'timeouts': self.timeouts,
+                'reinits': self.reinits,
+                'last_error': self.last_error}
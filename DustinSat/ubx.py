@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+UBX binary protocol for the U-Blox7. Builds the CFG messages that switch the
+receiver to UBX-only output at a set rate, and parses NAV-PVT or
+NAV-POSLLH + NAV-SOL into the same Fix record as the NMEA parser.
+Everything is fixed layout so it is decoded with struct, no string parsing.
+"""
+import struct
+from nmea import Fix
+import logging
+LOG = logging.getLogger(__name__)
+
+SYNC = b'\xb5\x62'
+MAX_PAYLOAD = 512
+MAX_BUFFER = 4096
+
+"""
+Message class/ID pairs
+"""
+ACK_NAK = (0x05, 0x00)
+ACK_ACK = (0x05, 0x01)
+CFG_PRT = (0x06, 0x00)
+CFG_MSG = (0x06, 0x01)
+CFG_RATE = (0x06, 0x08)
+NAV_POSLLH = (0x01, 0x02)
+NAV_SOL = (0x01, 0x06)
+NAV_PVT = (0x01, 0x07)
+
+MESSAGE_SETS = {'pvt': (NAV_PVT,),
+                'posllh_sol': (NAV_POSLLH, NAV_SOL)}
+"""
+Every NMEA message the receiver might output, so they can be turned off explicitly
+"""
+NMEA_MESSAGES = [(0xF0, i) for i in range(0x0E)]
+
+USB_PORT = 3
+PROTO_UBX = 0x01
+PROTO_NMEA = 0x02
+
+_HEADER = struct.Struct('<2sBBH')
+_PVT = struct.Struct('<IHBBBBBBIiBBBBiiiiIIiiiiiIIH')
+_POSLLH = struct.Struct('<IiiiiII')
+_SOL = struct.Struct('<IihBBiiiIiiiIHBBI')
+_PRT = struct.Struct('<BBHIIHHHH')
+
+
+def fletcher(data):
+    """8 bit Fletcher checksum used by UBX (over class, id, length and payload)"""
+    a = b = 0
+    for byte in data:
+        a = (a + byte) & 0xFF
+        b = (b + a) & 0xFF
+    return a, b
+
+
+def message(msg, payload=b''):
+    """Builds a complete UBX message for a (class, id) pair"""
+    body = _HEADER.pack(SYNC, msg[0], msg[1], len(payload))[2:] + payload
+    ck_a, ck_b = fletcher(body)
+    return SYNC + body + bytes((ck_a, ck_b))
+
+
+def cfg_prt(out_mask, in_mask=PROTO_UBX | PROTO_NMEA, port=USB_PORT):
+    """CFG-PRT for the USB port, setting which protocols go in and out"""
+    return message(CFG_PRT, _PRT.pack(port, 0, 0, 0, 0, in_mask, out_mask, 0, 0))
+
+
+def cfg_rate(rate_hz):
+    """CFG-RATE, measurement rate in Hz (one navigation solution per measurement)"""
+    return message(CFG_RATE, struct.pack('<HHH', int(round(1000.0 / rate_hz)), 1, 1))
+
+
+def cfg_msg(msg, rate):
+    """CFG-MSG, output msg every rate navigation solutions on the current port (0 is off)"""
+    return message(CFG_MSG, struct.pack('<BBB', msg[0], msg[1], rate))
+
+
+def configure(rate_hz=1, messages='pvt'):
+    """
+    The messages that put the receiver into UBX-only mode: NMEA off,
+    the chosen NAV messages on, at rate_hz (1-5 Hz).
+    """
+    if messages not in MESSAGE_SETS:
+        raise ValueError("messages must be one of {}".format(sorted(MESSAGE_SETS)))
+    if not 1 <= rate_hz <= 5:
+        raise ValueError("UBX rate must be between 1 and 5 Hz")
+    out = [cfg_msg(msg, 0) for msg in NMEA_MESSAGES]
+    out += [cfg_msg(msg, 1) for msg in MESSAGE_SETS[messages]]
+    out.append(cfg_rate(rate_hz))
+    out.append(cfg_prt(PROTO_UBX))
+    return out
+
+
+def restore_nmea():
+    """Turns NMEA output back on (GGA/GSA/RMC/VTG at 1 Hz)"""
+    out = [cfg_prt(PROTO_UBX | PROTO_NMEA), cfg_rate(1)]
+    out += [cfg_msg((0xF0, i), 1) for i in (0x00, 0x02, 0x04, 0x05)]
+    return out
+
+
+class UBXParser:
+    """
+    Incremental UBX parser with the same feed()/fix/stats() interface as NMEAParser
+    """
+    def __init__(self, fix=None):
+        self.fix = Fix() if fix is None else fix
+        self._buffer = bytearray()
+        self._handlers = {NAV_PVT: self._pvt, NAV_POSLLH: self._posllh,
+                          NAV_SOL: self._sol}
+        self.messages = 0
+        self.checksum_errors = 0
+        self.ignored = 0
+        self.acks = 0
+        self.naks = 0
+
+    def feed(self, data):
+        """
+        Parses every complete message in data plus anything left over from last time.
+        Returns the number of new fixes (NAV-PVT or NAV-POSLLH with a valid position).
+        """
+        buf = self._buffer
+        buf += data
+        updated = 0
+        pos = 0
+        view = memoryview(buf)
+        try:
+            while True:
+                start = buf.find(SYNC, pos)
+                if start < 0:
+                    """
+                    keep a trailing 0xB5, it may be the start of the next sync
+                    """
+                    pos = len(buf) - 1 if buf.endswith(SYNC[:1]) else len(buf)
+                    break
+                if len(buf) < start + 6:
+                    pos = start
+                    break
+                _, cls, msgid, length = _HEADER.unpack_from(view, start)
+                if length > MAX_PAYLOAD:
+                    pos = start + 2
+                    continue
+                end = start + 6 + length
+                if len(buf) < end + 2:
+                    pos = start
+                    break
+                if fletcher(view[start + 2:end]) != (buf[end], buf[end + 1]):
+                    self.checksum_errors += 1
+                    pos = start + 2
+                    continue
+                pos = end + 2
+                self.messages += 1
+                if self.dispatch((cls, msgid), view[start + 6:end]):
+                    updated += 1
+        finally:
+            view.release()
+        del buf[:pos]
+        if len(buf) > MAX_BUFFER:
+            del buf[:]
+        return updated
+
+    def dispatch(self, msg, payload):
+        handler = self._handlers.get(msg)
+        if handler is not None:
+            if handler(payload):
+                self.fix.updates += 1
+                return True
+            return False
+        if msg == ACK_ACK:
+            self.acks += 1
+        elif msg == ACK_NAK:
+            self.naks += 1
+            LOG.warning("UBX NAK for message %s", bytes(payload[:2]).hex())
+        else:
+            self.ignored += 1
+        return False
+
+    def _pvt(self, payload):
+        if len(payload) < _PVT.size:
+            return False
+        (itow, year, month, day, hour, minute, sec, valid, tacc, nano, fix_type,
+         flags, flags2, sats, lon, lat, height, hmsl, hacc, vacc, veln, vele,
+         veld, gspeed, headmot, sacc, headacc, pdop) = _PVT.unpack_from(payload)
+        fix = self.fix
+        fix.fix_type = fix_type
+        fix.sats = sats
+        fix.valid = bool(flags & 0x01)
+        fix.pdop = pdop * 0.01
+        """
+        NAV-PVT has no horizontal dilution, so the position dilution stands in for it
+        """
+        fix.hzdil = fix.pdop
+        if valid & 0x03 == 0x03:
+            fix.time = '{:02d}{:02d}{:02d}'.format(hour, minute, sec)
+            fix.date = '{:02d}{:02d}{:02d}'.format(day, month, year % 100)
+        if fix.valid:
+            fix.lat = lat * 1e-7
+            fix.lon = lon * 1e-7
+            fix.alt = hmsl * 1e-3
+            fix.h_acc = hacc * 1e-3
+            fix.v_acc = vacc * 1e-3
+            fix.speed = gspeed * 1e-3
+            fix.course = headmot * 1e-5
+        return fix.valid
+
+    def _posllh(self, payload):
+        if len(payload) < _POSLLH.size:
+            return False
+        itow, lon, lat, height, hmsl, hacc, vacc = _POSLLH.unpack_from(payload)
+        fix = self.fix
+        if fix.valid is False:
+            return False
+        fix.lat = lat * 1e-7
+        fix.lon = lon * 1e-7
+        fix.alt = hmsl * 1e-3
+        fix.h_acc = hacc * 1e-3
+        fix.v_acc = vacc * 1e-3
+        return True
+
+    def _sol(self, payload):
+        if len(payload) < _SOL.size:
+            return False
+        sol = _SOL.unpack_from(payload)
+        fix = self.fix
+        fix.fix_type = sol[3]
+        fix.valid = bool(sol[4] & 0x01)
+        fix.pdop = sol[13] * 0.01
+        fix.hzdil = fix.pdop
+        fix.sats = sol[15]
+        """
+        NAV-SOL only says whether the fix is valid, the position comes in NAV-POSLLH
+        """
+        return False
+
+    def stats(self):
+        return {'messages': self.messages, 'checksum_errors': self.checksum_errors,
+                'ignored': self.ignored, 'acks': self.acks, 'naks': self.naks}
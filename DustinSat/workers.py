@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Multi-process acquisition (ENGINE='processes' in __main__). The sensors are
+split into groups (GPS, I2C, 1-wire) and each group runs in its own worker
+process forked from RUN, so parsing, formatting and logging in the main
+process never hold up a conversion and the groups can use the other cores.
+
+A worker publishes every reading into a SharedRing: fixed-size slots in
+multiprocessing.shared_memory, each guarded by a seqlock. The writer makes
+the slot's sequence word odd, writes the slot and then makes the word even
+again; the reader only takes a slot if it saw the same even word before and
+after unpacking it. Nothing is locked, pickled or sent through a pipe.
+
+Settings (set_period() etc.) go to the workers over a command queue and are
+replayed after a restart, the workers' logging comes back over a log queue.
+A worker that dies or stops beating is restarted after a backoff.
+"""
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+import logging
+LOG = logging.getLogger(__name__)
+
+NAN = float('nan')
+"""
+Seconds between a worker's heartbeats, and how long main waits for a worker to stop
+"""
+HEARTBEAT = 0.5
+STOP_TIMEOUT = 5.0
+"""
+Ring header: number of readings written, number of failed reads, monotonic time of the
+last failure and of the last heartbeat
+"""
+_HEAD = struct.Struct('<QQdd')
+_SEQ = struct.Struct('<Q')
+
+
+class SharedRing:
+    """
+    The last capacity readings of one sensor, width float64 values each plus the
+    monotonic start and end time of the read. One writer (the sensor's thread in the
+    worker), one reader (RUN). Slot layout: Q sequence word, d start, d end, d values.
+    """
+    def __init__(self, width, capacity=1024):
+        self.width = width
+        self.capacity = capacity
+        self._slot = struct.Struct('<Qdd' + 'd' * width)
+        self.shm = shared_memory.SharedMemory(create=True, size=_HEAD.size + capacity * self._slot.size)
+        self.buf = self.shm.buf
+        _HEAD.pack_into(self.buf, 0, 0, 0, NAN, NAN)
+        self.cursor = 0
+        self.lost = 0
+        self._errors = 0
+
+    def _offset(self, n):
+        return _HEAD.size + (n % self.capacity) * self._slot.size
+
+    def header(self):
+        """(written, errors, last error time, last heartbeat)"""
+        return _HEAD.unpack_from(self.buf, 0)
+
+    def publish(self, start, end, values):
+        """Writes one reading (None is stored as NaN), from the worker"""
+        written, errors, last_error, beat = _HEAD.unpack_from(self.buf, 0)
+        offset = self._offset(written)
+        _SEQ.pack_into(self.buf, offset, 2 * written + 1)
+        self._slot.pack_into(self.buf, offset, 2 * written + 1, start, end,
+                             *[NAN if value is None else value for value in values])
+        _SEQ.pack_into(self.buf, offset, 2 * written + 2)
+        _SEQ.pack_into(self.buf, 0, written + 1)
+
+    def error(self, when):
+        written, errors, last_error, beat = _HEAD.unpack_from(self.buf, 0)
+        struct.pack_into('<Qd', self.buf, 8, errors + 1, when)
+
+    def beat(self, now):
+        struct.pack_into('<d', self.buf, 24, now)
+
+    def read_new(self):
+        """
+        The readings written since the last call, oldest first, as (start, end, values)
+        with NaN turned back into None. Readings overwritten before they were read are counted in lost.
+        """
+        written = _SEQ.unpack_from(self.buf, 0)[0]
+        if written - self.cursor > self.capacity:
+            self.lost += written - self.capacity - self.cursor
+            self.cursor = written - self.capacity
+        out = []
+        while self.cursor < written:
+            n = self.cursor
+            offset = self._offset(n)
+            expected = 2 * n + 2
+            before = _SEQ.unpack_from(self.buf, offset)[0]
+            if before == expected:
+                fields = self._slot.unpack_from(self.buf, offset)
+                if _SEQ.unpack_from(self.buf, offset)[0] == expected:
+                    out.append((fields[1], fields[2], tuple(None if value != value else value for value in fields[3:])))
+                else:
+                    self.lost += 1
+            elif before < expected:
+                break
+            else:
+                self.lost += 1
+            self.cursor += 1
+        return out
+
+    def new_errors(self):
+        """Failed reads since the last call and the time of the last one"""
+        written, errors, last_error, beat = _HEAD.unpack_from(self.buf, 0)
+        count, self._errors = errors - self._errors, errors
+        return count, last_error
+
+    def close(self, unlink=True):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def published(sensor, ring, encode):
+    """
+    Replaces sensor.read (in the worker) with a version that also publishes every
+    reading into the ring. encode turns a read() result into a tuple of ring values,
+    or None to leave it out. Returns the sensor.
+    """
+    read = sensor.read
+
+    def read_published():
+        start = time.monotonic()
+        try:
+            value = read()
+        except Exception:
+            ring.error(time.monotonic())
+            raise
+        if value is not None:
+            values = encode(value)
+            if values is not None:
+                ring.publish(start, time.monotonic(), values)
+        return value
+    read_published.__wrapped__ = read
+    sensor.read = read_published
+    return sensor
+
+
+def _resolve(sensor, path):
+    """The object and attribute name a dotted path on the sensor points to"""
+    target = sensor
+    names = path.split('.')
+    for name in names[:-1]:
+        target = getattr(target, name)
+    return target, names[-1]
+
+
+def _worker_main(group, sensors, rings, encoders, wrap, commands, logs, parent):
+    """
+    Body of a worker process: logging goes back to RUN, the group's sensors are
+    published, wrapped and started, then commands are run until a None command comes
+    (or RUN is gone). The heartbeat and the supervisors' watchdog run on their own
+    thread, timed with an Event so they keep to the same clock as RUN.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(logs))
+    LOG.info("Worker %s started (pid %d)", group, os.getpid())
+    watch = []
+    for name, sensor in sensors.items():
+        published(sensor, rings[name], encoders[name])
+        if wrap is not None:
+            supervisor = wrap(name, sensor)
+            if supervisor is not None:
+                sensor.supervisor = supervisor
+                watch.append(supervisor)
+        sensor.start()
+    done = threading.Event()
+
+    def heartbeat():
+        while True:
+            if os.getppid() != parent:
+                commands.put(None)
+                return
+            now = time.monotonic()
+            for ring in rings.values():
+                ring.beat(now)
+            for supervisor in watch:
+                supervisor.check(now)
+            if done.wait(HEARTBEAT):
+                return
+    threading.Thread(target=heartbeat, name='heartbeat', daemon=True).start()
+    try:
+        while True:
+            command = commands.get()
+            if command is None:
+                break
+            name, path, args, setting = command
+            try:
+                target, attr = _resolve(sensors[name], path)
+                if setting:
+                    setattr(target, attr, args[0])
+                else:
+                    getattr(target, attr)(*args)
+            except Exception:
+                logging.exception("Worker {} command {}.{} failed".format(group, name, path))
+    finally:
+        done.set()
+        for sensor in sensors.values():
+            try:
+                sensor.stop()
+            except Exception:
+                logging.exception("Error stopping a sensor in worker {}".format(group))
+        LOG.info("Worker %s stopped", group)
+
+
+class WorkerSensor:
+    """
+    What RUN sees of a sensor run in a worker: start() and stop() start and stop its
+    group's worker, data is the last Sample drained from its ring, attributes are read
+    from RUN's own copy of the sensor and method calls run on both copies.
+    """
+    def __init__(self, pool, name, sensor):
+        self.pool = pool
+        self.name = name
+        self.sensor = sensor
+        self.data = None
+
+    def start(self):
+        self.pool.start_sensor(self.name)
+
+    def stop(self):
+        self.pool.stop_sensor(self.name)
+
+    def __getattr__(self, attr):
+        value = getattr(self.__dict__['sensor'], attr)
+        if attr.startswith('_') or not callable(value):
+            return value
+        pool, name = self.__dict__['pool'], self.__dict__['name']
+
+        def call(*args):
+            result = value(*args)
+            pool.call(name, attr, *args)
+            return result
+        return call
+
+
+class WorkerPool:
+    """
+    groups maps a group name to its sensors' names. sensors are the sensor objects
+    (not started in RUN), rings their SharedRings and encoders the functions turning
+    a read() result into ring values, run in the worker. wrap(name, sensor) is run in the
+    worker after publishing is set up, e.g. to supervise the sensor. A worker whose
+    heartbeat is older than timeout is restarted, after a backoff doubling up to max_backoff.
+    """
+    def __init__(self, groups, sensors, rings, encoders, wrap=None, timeout=5.0, backoff=1.0, max_backoff=30.0):
+        self.groups = groups
+        self.sensors = sensors
+        self.rings = rings
+        self.encoders = encoders
+        self.wrap = wrap
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._ctx = multiprocessing.get_context('fork')
+        self._groupOf = {name: group for group, names in groups.items() for name in names}
+        self._procs = {}
+        self._commands = {}
+        self._settings = {}
+        self._wanted = set()
+        self._restartAt = {}
+        self._lock = threading.Lock()
+        self.restarts = dict.fromkeys(groups, 0)
+
+    def stand_in(self, name):
+        return WorkerSensor(self, name, self.sensors[name])
+
+    def _forward_logs(self, proc, logs):
+        while True:
+            try:
+                record = logs.get(timeout=HEARTBEAT)
+            except queue.Empty:
+                if proc.exitcode is not None:
+                    return
+                continue
+            logging.getLogger(record.name).handle(record)
+
+    def _spawn(self, group):
+        """
+        Forks the group's worker. Every worker gets new queues, as one that was killed
+        can leave the old ones locked.
+        """
+        commands = self._commands[group] = self._ctx.Queue()
+        logs = self._ctx.Queue()
+        names = self.groups[group]
+        proc = self._ctx.Process(target=_worker_main, name='worker-' + group, daemon=True,
+                                 args=(group, {name: self.sensors[name] for name in names},
+                                       {name: self.rings[name] for name in names},
+                                       {name: self.encoders[name] for name in names},
+                                       self.wrap, commands, logs, os.getpid()))
+        proc.start()
+        threading.Thread(target=self._forward_logs, args=(proc, logs), name='worker-logs-' + group,
+                         daemon=True).start()
+        proc.started = time.monotonic()
+        self._procs[group] = proc
+        for (name, path), (args, setting) in self._settings.items():
+            if self._groupOf[name] == group:
+                commands.put((name, path, args, setting))
+
+    def start_sensor(self, name):
+        """Starts the sensor's group (once, the other sensors in it start too)"""
+        group = self._groupOf[name]
+        with self._lock:
+            self._wanted.add(group)
+            if group not in self._procs:
+                self._spawn(group)
+
+    def stop_sensor(self, name):
+        group = self._groupOf[name]
+        with self._lock:
+            self._wanted.discard(group)
+            proc = self._procs.pop(group, None)
+            commands = self._commands.get(group)
+        if proc is not None:
+            commands.put(None)
+            proc.join(STOP_TIMEOUT)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join(1)
+
+    def call(self, name, path, *args):
+        """Calls path (dotted, from the sensor) in the worker, again after every restart"""
+        self._command(name, path, args, False)
+
+    def set(self, name, path, value):
+        """Sets the attribute path (dotted, from the sensor) in the worker"""
+        self._command(name, path, (value,), True)
+
+    def _command(self, name, path, args, setting):
+        group = self._groupOf[name]
+        with self._lock:
+            self._settings[(name, path)] = (args, setting)
+            if group in self._procs:
+                self._commands[group].put((name, path, args, setting))
+
+    def check(self, now=None):
+        """
+        Restarts workers that have died or stopped beating, once their backoff is up
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for group in list(self._wanted):
+                proc = self._procs.get(group)
+                if proc is not None:
+                    beat = min(self.rings[name].header()[3] for name in self.groups[group])
+                    started = proc.started
+                    alive = proc.is_alive()
+                    if alive and (beat == beat and now - beat < self.timeout or now - started < self.timeout):
+                        if now - started > 60 * self.timeout:
+                            self.restarts[group] = 0
+                        continue
+                    LOG.warning("Worker %s %s, restarting", group,
+                                "died (exit code {})".format(proc.exitcode) if not alive else "stopped beating")
+                    if alive:
+                        proc.kill()
+                    proc.join(1)
+                    del self._procs[group]
+                    self._restartAt[group] = now + min(self.backoff * 2 ** self.restarts[group], self.max_backoff)
+                    self.restarts[group] += 1
+                if now >= self._restartAt.get(group, 0):
+                    self._spawn(group)
+
+    def drain(self):
+        """
+        Reads the new readings from every ring: {name: [(start, end, values), ...]}, plus
+        {name: (failed reads, time of the last)} for the sensors with new failures
+        """
+        readings = {}
+        errors = {}
+        for name, ring in self.rings.items():
+            readings[name] = ring.read_new()
+            count, last = ring.new_errors()
+            if count:
+                errors[name] = (count, last)
+        return readings, errors
+
+    def stop(self):
+        for name in list(self._groupOf):
+            self.stop_sensor(name)
+        for ring in self.rings.values():
+            ring.close()
+
+    def stats(self):
+        return {'workers': {group: {'running': group in self._procs and self._procs[group].is_alive(),
+                                    'pid': self._procs[group].pid if group in self._procs else None,
+                                    'restarts': self.restarts[group]}
+                            for group in self.groups},
+                'lost': {name: ring.lost for name, ring in self.rings.items()}}
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: david
+
+Write-behind file writer. Records are collected in memory and a background
+thread writes them out in batches, every flush_interval seconds or as soon as
+flush_bytes are waiting, and fsyncs on a slower group-commit schedule. That
+keeps SD card writes few and large while putting a bound on how much data a
+power cut can lose (roughly fsync_interval seconds' worth).
+"""
+import os
+import threading
+import time
+import logging
+LOG = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """
+    Appends to path from a background thread. write() never touches the disk.
+    """
+    def __init__(self, path, flush_interval=5.0, flush_bytes=4096, fsync_interval=20.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.fsync_interval = fsync_interval
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._pending = []
+        self._pendingBytes = 0
+        self._lock = threading.Lock()
+        self._writeLock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._lastSync = time.monotonic()
+        self._dirty = False
+        self.writes = 0
+        self.fsyncs = 0
+        self.bytes = 0
+        self.errors = 0
+        self.max_batch = 0
+        self._thread = threading.Thread(target=self._run, name='writebehind', daemon=True)
+        self._thread.start()
+
+    def write(self, data):
+        """Queues data to be appended to the file"""
+        with self._lock:
+            self._pending.append(data)
+            self._pendingBytes += len(data)
+            full = self._pendingBytes >= self.flush_bytes
+        if full:
+            self._wake.set()
+
+    def _take(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._pendingBytes = 0
+        return b''.join(batch)
+
+    def _flush(self, sync=False):
+        with self._writeLock:
+            self._write(sync)
+
+    def _write(self, sync):
+        data = self._take()
+        if data:
+            try:
+                view = memoryview(data)
+                while view:
+                    written = os.write(self._fd, view)
+                    view = view[written:]
+                self.writes += 1
+                self.bytes += len(data)
+                self.max_batch = max(self.max_batch, len(data))
+                self._dirty = True
+            except OSError:
+                self.errors += 1
+                logging.exception("Write-behind error writing {}".format(self.path))
+        if self._dirty and (sync or time.monotonic() - self._lastSync >= self.fsync_interval):
+            try:
+                os.fsync(self._fd)
+                self.fsyncs += 1
+                self._dirty = False
+            except OSError:
+                self.errors += 1
+                logging.exception("Write-behind error syncing {}".format(self.path))
+            self._lastSync = time.monotonic()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush()
+
+    def flush(self, sync=True):
+        """
+        Writes out everything queued so far from the calling thread (and fsyncs it by default)
+        """
+        self._flush(sync)
+
+    def close(self):
+        """Stops the thread, writes and fsyncs whatever is left and closes the file"""
+        if self._fd is None:
+            return
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+        self._flush(sync=True)
+        os.close(self._fd)
+        self._fd = None
+
+    def stats(self):
+        return {'writes': self.writes, 'bytes': self.bytes, 'fsyncs': self.fsyncs,
+                'errors': self.errors, 'max_batch': self.max_batch,
+                'pending': self._pendingBytes}
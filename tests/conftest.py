@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The flight code imports its modules flat, as it does when run from DustinSat/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'DustinSat'))
@@ -0,0 +1,22 @@
+from checkpoint import State, CLEAN_SHUTDOWN, resumable
+from flightphase import PHASES
+
+
+def state(phase, time, flags=0):
+    return State(1, flags, PHASES.index(phase), time, 'gps', 0, 0, {}, {}, 'flight.dsr')
+
+
+def test_in_flight_resumes_after_a_short_outage_or_with_the_clock_behind():
+    assert resumable(state('descent', 10000.0), 10090.0, 600, 1800)
+    assert resumable(state('ascent', 10000.0), 5000.0, 600, 1800)
+
+
+def test_old_in_flight_checkpoint_does_not_resume():
+    assert not resumable(state('descent', 10000.0), 10000.0 + 3 * 86400, 600, 1800)
+
+
+def test_ground_and_clean_shutdown():
+    assert resumable(state('pre_launch', 10000.0), 10300.0, 600, 1800)
+    assert not resumable(state('pre_launch', 10000.0), 11000.0, 600, 1800)
+    assert not resumable(state('pre_launch', 10000.0), 9000.0, 600, 1800)
+    assert not resumable(state('ascent', 10000.0, CLEAN_SHUTDOWN), 10010.0, 600, 1800)
@@ -0,0 +1,29 @@
+from nmea import NMEAParser, checksum
+
+
+def sentence(body):
+    return '${}*{:02X}\r\n'.format(body, checksum(body.encode())).encode()
+
+
+GGA_FIX = 'GPGGA,120000.00,5321.0000,N,00615.0000,W,1,09,0.92,352.5,M,55.0,M,,'
+GGA_NO_FIX = 'GPGGA,120001.00,,,,,0,00,99.99,,,,,,'
+RMC_VOID = 'GPRMC,120001.00,V,,,,,,,181026,,,N'
+
+
+def test_only_gga_with_a_position_is_a_new_fix():
+    parser = NMEAParser()
+    assert parser.feed(sentence(GGA_FIX)) == 1
+    assert parser.fix.alt == 352.5
+    assert parser.feed(sentence(GGA_NO_FIX) + sentence(RMC_VOID)) == 0
+    assert parser.fix.quality == 0
+    assert parser.fix.time == '120001.00'
+    assert (parser.fix.lat, parser.fix.alt) == (53.35, 352.5)
+    assert parser.fix.updates == 1
+    assert parser.parse_errors == 0
+
+
+def test_quality_zero_with_stale_fields_is_not_a_fix():
+    parser = NMEAParser()
+    stale = GGA_FIX.replace(',1,09,', ',0,09,').replace('352.5', '400.0')
+    assert parser.feed(sentence(stale)) == 0
+    assert parser.fix.alt is None
@@ -0,0 +1,46 @@
+import threading
+import time
+
+from onewire import OneWireBus
+
+
+def bus(tmp_path, resolution=10):
+    master = tmp_path / 'w1_bus_master1'
+    master.mkdir()
+    (master / 'w1_master_slaves').write_text('')
+    (master / 'therm_bulk_read').write_text('1\n')
+    bus = OneWireBus(str(tmp_path), resolution=resolution)
+    bus.setup()
+    return bus
+
+
+def test_conversion_does_not_hold_the_lock(tmp_path):
+    w1 = bus(tmp_path)
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(w1.wait_for_conversion(0)))
+               for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    w1.set_period(5)
+    assert time.monotonic() - started < 0.05
+    for reader in readers:
+        reader.join()
+    assert results == [1, 1]
+    assert w1.conversions == 1
+
+
+def test_period_wait_stops_when_stopping(tmp_path):
+    w1 = bus(tmp_path, resolution=9)
+    w1.set_period(30)
+    assert w1.wait_for_conversion(0) == 1
+    stopping = threading.Event()
+    results = []
+    reader = threading.Thread(target=lambda: results.append(w1.wait_for_conversion(1, stopping.is_set)))
+    reader.start()
+    time.sleep(0.05)
+    stopping.set()
+    w1.wake()
+    reader.join(1)
+    assert results == [None]
@@ -0,0 +1,37 @@
+from packet import PacketEncoder, PacketDecoder
+
+
+def sample(encoder, t, alt):
+    encoder.add(t, {'alt': alt, 'pressure': 1000.0 - alt / 10, 'temp2': 20.0})
+
+
+def test_forced_keyframe_decodes_after_a_dropped_packet():
+    encoder = PacketEncoder()
+    decoder = PacketDecoder()
+    sample(encoder, 1000.0, 100.0)
+    assert decoder.decode(encoder.encode()) is not None
+    sample(encoder, 1002.0, 120.0)
+    encoder.encode()  # replaced in the downlink before it was sent
+    sample(encoder, 1004.0, 140.0)
+    encoder.force_keyframe()
+    packet = encoder.encode()
+    timestamps, rows, fields = decoder.decode(packet)
+    assert rows[0][fields.index('alt')] == 140.0
+    assert decoder.lost == 1
+    assert encoder.seq == 3
+
+
+def test_truncated_packet_leaves_the_reference_alone():
+    encoder = PacketEncoder()
+    decoder = PacketDecoder()
+    sample(encoder, 1000.0, 100.0)
+    decoder.decode(encoder.encode())
+    sample(encoder, 1002.0, 120.0)
+    sample(encoder, 1004.0, 125.0)
+    packet = encoder.encode()
+    try:
+        decoder.decode(packet[:-2])
+    except IndexError:
+        pass
+    timestamps, rows, fields = decoder.decode(packet)
+    assert [row[fields.index('alt')] for row in rows] == [120.0, 125.0]
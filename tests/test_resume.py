@@ -0,0 +1,30 @@
+import math
+import os
+
+from checkpoint import Checkpoint
+from sim import Simulation, FlightProfile
+
+
+def no_fix(gps):
+    return lambda state: (gps._sentence('GPGGA,120001.00,,,,,0,00,99.99,,,,,,')
+                          + gps._sentence('GPRMC,120001.00,V,,,,,,,181026,,,N'))
+
+
+def test_resumed_run_sends_the_checkpointed_position(tmp_path):
+    workdir = str(tmp_path)
+    Simulation(FlightProfile(pad_time=10), speed=20, workdir=workdir).run(40)
+    checkpoint = Checkpoint(os.path.join(workdir, 'data', 'checkpoint.bin'))
+    state = checkpoint.load()
+    assert not math.isnan(state.readings['lat'])
+    # as if the power had gone instead of a clean shutdown
+    checkpoint.save(state._replace(flags=0))
+    checkpoint.close()
+
+    sim = Simulation(FlightProfile(pad_time=10), speed=20, workdir=workdir, start=state.time + 60)
+    sim.gps.nmea_epoch = no_fix(sim.gps)
+    run = sim.run(40)
+    assert run.recorder.path == state.recorder
+    sent = sim.radio.telemetry[0][1]
+    assert sent['lat_dec_deg'] == state.readings['lat']
+    assert sent['lon_dec_deg'] == state.readings['lon']
+    assert sent['alt'] == state.readings['alt']
@@ -0,0 +1,18 @@
+from samples import sampled
+
+
+class Sensor:
+    def __init__(self, readings):
+        self.readings = iter(readings)
+
+    def read(self):
+        return next(self.readings)
+
+
+def test_only_new_readings_are_numbered():
+    sensor = sampled(Sensor([None, (1.0,), None, None, (2.0,)]))
+    samples = [sensor.read() for _ in range(5)]
+    assert [s is None for s in samples] == [True, False, True, True, False]
+    assert [samples[1].seq, samples[4].seq] == [1, 2]
+    assert samples[4].value == (2.0,)
+    assert samples[4].monotonic >= samples[1].monotonic
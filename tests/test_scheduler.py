@@ -0,0 +1,64 @@
+from scheduler import Scheduler
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def run_until(scheduler, clock, end, step=0.1):
+    while clock.now < end:
+        clock.now = round(clock.now + step, 6)
+        scheduler.run_pending()
+
+
+def test_jobs_run_on_their_deadlines():
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    runs = []
+    scheduler.add_job('data', 2, lambda: runs.append(clock.now))
+    run_until(scheduler, clock, 1010)
+    assert runs == [1002.0, 1004.0, 1006.0, 1008.0, 1010.0]
+
+
+def test_set_period_mid_run_runs_each_deadline_once():
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    runs = []
+    scheduler.add_job('data', 10, lambda: runs.append(clock.now))
+    run_until(scheduler, clock, 1010.3)
+    assert runs == [1010.0]
+    scheduler.set_period('data', 2)
+    run_until(scheduler, clock, 1020.3)
+    assert runs == [1010.0, 1012.0, 1014.0, 1016.0, 1018.0, 1020.0]
+    assert scheduler.stats()['data']['missed'] == 0
+    scheduler.set_period('data', 10)
+    scheduler.set_period('data', 2)
+    run_until(scheduler, clock, 1024.3)
+    assert runs[6:] == [1022.0, 1024.0]
+
+
+def test_set_period_longer_keeps_next_deadline():
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    runs = []
+    scheduler.add_job('log', 5, lambda: runs.append(clock.now))
+    run_until(scheduler, clock, 1005.3)
+    scheduler.set_period('log', 30)
+    run_until(scheduler, clock, 1040.3)
+    assert runs == [1005.0, 1010.0, 1040.0]
+
+
+def test_set_period_shorter_than_time_since_last_run():
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    runs = []
+    scheduler.add_job('log', 30, lambda: runs.append(clock.now))
+    run_until(scheduler, clock, 1052.0)
+    scheduler.set_period('log', 5)
+    run_until(scheduler, clock, 1062.15)
+    assert runs == [1030.0, 1052.1, 1057.0, 1062.0]
+    assert scheduler.stats()['log']['missed'] == 0
@@ -0,0 +1,37 @@
+import time
+
+from startup import Startup, READY, FAILED
+
+
+def test_failed_step_is_tried_again_until_it_works():
+    attempts = []
+
+    def radio():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise IOError("no /dev/ttyAMA0")
+
+    startup = Startup(retry=0.01, max_retry=0.02)
+    startup.add('radio', radio)
+    startup.add('gps', lambda: None, after=['radio'])
+    startup.start()
+    startup.tasks['gps'].done.wait(1)
+    deadline = time.monotonic() + 1
+    while startup.tasks['radio'].state != READY and time.monotonic() < deadline:
+        time.sleep(0.01)
+    report = startup.report()['steps']
+    assert report['radio']['state'] == READY
+    assert report['radio']['attempts'] == 3
+    assert report['gps']['state'] == READY
+
+
+def test_stop_ends_the_retries():
+    startup = Startup(retry=0.01)
+    startup.add('radio', lambda: 1 / 0)
+    startup.start()
+    startup.tasks['radio'].done.wait(1)
+    startup.stop()
+    attempts = startup.tasks['radio'].attempts
+    time.sleep(0.05)
+    assert startup.tasks['radio'].attempts == attempts
+    assert startup.tasks['radio'].state == FAILED